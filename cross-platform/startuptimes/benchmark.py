@@ -0,0 +1,2194 @@
+#!/usr/bin/env python3
+
+#---------------------------------------------------------------------------------------------
+# Copyright (c) Bentley Systems, Incorporated. All rights reserved.
+# See LICENSE.md in the project root for license terms and full copyright notice.
+#---------------------------------------------------------------------------------------------
+# pylint: disable=too-many-lines
+
+'''
+Benchmarks for the startuptimes application. These only measure; the tests
+are in test_startuptimes.py.
+'''
+
+import argparse
+import asyncio
+import itertools
+import json
+import multiprocessing
+import os
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import textwrap
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+from datetime import datetime, timedelta, timezone
+from threading import Event
+from typing import Any, Callable, Iterator, TextIO
+
+from startuptimes import (
+    Profiler,
+    Record,
+    StartupTimesDB,
+    gen_distribution_stats,
+    gen_federated_report_rows,
+    gen_report_rows,
+    IngestCache,
+    ingest_files,
+    iter_log_entries,
+    iter_entries_file,
+    LOG_TITLE,
+    TextTable,
+    EXPORT_FORMATS,
+    StartupTimesQuery,
+    ReportCache
+)
+
+# The checkpoints recorded by the samples' ActivityTimer, in the order they are added.
+ACTIONS = [
+    'Before backend load',
+    'After backend load',
+    'Before frontend load',
+    'After frontend load',
+    'Webview load',
+    'Launch total'
+]
+
+# Timestamp of the first synthetic entry. Each following entry is one minute later.
+START_TIME = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+def iso_timestamp(value: datetime) -> str:
+    '''
+    Formats `value` the way ActivityTimer formats timestamps.
+    '''
+
+    return f'{value:%Y-%m-%dT%H:%M:%S}.{value.microsecond // 1000:03d}Z'
+
+def synthetic_entries(count: int, start: int = 0, seed: int = 0) -> Iterator[Record]:
+    '''
+    Generates `count` synthetic entries, each shaped like the JSON written by
+    ActivityTimer, starting with entry number `start`. The same `start` and
+    `seed` always generate the same entries.
+    '''
+
+    rand = random.Random(f'{seed}:{start}')
+    devices = [
+        {
+            'cpuCores': 6,
+            'memory': 4 << 30,
+            'model': 'iPad',
+            'modelID': f'iPad13,{i}',
+            'modelIDRefURL': 'https://www.theiphonewiki.com/wiki/Models',
+            'systemName': 'iPadOS',
+            'systemVersion': f'17.{i}'
+        }
+        for i in range(8)
+    ]
+    versions = [ '3.7.12', '4.0.5', '4.1.3', '4.2.0' ]
+    for i in range(start, start + count):
+        start_time = START_TIME + timedelta(minutes=i)
+        total = 0.0
+        checkpoints = []
+        for action in ACTIONS:
+            step = rand.uniform(0.05, 1.5)
+            total += step
+            checkpoints.append({
+                'action': action,
+                'timestamp': iso_timestamp(start_time + timedelta(seconds=total)),
+                'step': step,
+                'total': total
+            })
+        yield {
+            'checkpoints': checkpoints,
+            'device': devices[i % len(devices)],
+            'iTwinVersion': versions[(i // len(devices)) % len(versions)],
+            'timestamp': iso_timestamp(start_time + timedelta(seconds=total)),
+            'title': 'STARTUP TIMES',
+            'totalTime': total,
+            'usingRemoteServer': False
+        }
+
+# The devices used by generated_entries: the fields ActivityTimer records for each, followed by
+# how much slower than average the device starts up, and the OS versions it runs over the
+# generated period. iOS devices report a model and a modelID from uname. Android devices report a
+# modelID made of the manufacturer and model, and no model.
+GENERATED_DEVICES: list[tuple[Record, float, list[str]]] = [
+    (
+        {
+            'cpuCores': 6,
+            'memory': 3 << 30,
+            'model': 'iPad',
+            'modelID': 'iPad12,1',
+            'modelIDRefURL': 'https://www.theiphonewiki.com/wiki/Models',
+            'systemName': 'iPadOS'
+        },
+        1.5, [ '16.6', '17.2', '17.4' ]
+    ),
+    (
+        {
+            'cpuCores': 8,
+            'memory': 6 << 30,
+            'model': 'iPad',
+            'modelID': 'iPad8,9',
+            'modelIDRefURL': 'https://www.theiphonewiki.com/wiki/Models',
+            'systemName': 'iPadOS'
+        },
+        1.25, [ '16.6', '17.2', '17.4' ]
+    ),
+    (
+        {
+            'cpuCores': 8,
+            'memory': 8 << 30,
+            'model': 'iPad',
+            'modelID': 'iPad13,4',
+            'modelIDRefURL': 'https://www.theiphonewiki.com/wiki/Models',
+            'systemName': 'iPadOS'
+        },
+        0.85, [ '17.0', '17.2', '17.4' ]
+    ),
+    (
+        {
+            'cpuCores': 8,
+            'memory': 8 << 30,
+            'model': 'iPad',
+            'modelID': 'iPad14,3',
+            'modelIDRefURL': 'https://www.theiphonewiki.com/wiki/Models',
+            'systemName': 'iPadOS'
+        },
+        0.75, [ '17.1', '17.4' ]
+    ),
+    (
+        {
+            'cpuCores': 6,
+            'memory': 3 << 30,
+            'model': 'iPhone',
+            'modelID': 'iPhone12,8',
+            'modelIDRefURL': 'https://www.theiphonewiki.com/wiki/Models',
+            'systemName': 'iOS'
+        },
+        1.4, [ '16.7', '17.3' ]
+    ),
+    (
+        {
+            'cpuCores': 6,
+            'memory': 6 << 30,
+            'model': 'iPhone',
+            'modelID': 'iPhone14,2',
+            'modelIDRefURL': 'https://www.theiphonewiki.com/wiki/Models',
+            'systemName': 'iOS'
+        },
+        0.95, [ '17.0', '17.2', '17.4' ]
+    ),
+    (
+        {
+            'cpuCores': 6,
+            'memory': 8 << 30,
+            'model': 'iPhone',
+            'modelID': 'iPhone16,1',
+            'modelIDRefURL': 'https://www.theiphonewiki.com/wiki/Models',
+            'systemName': 'iOS'
+        },
+        0.8, [ '17.1', '17.4' ]
+    ),
+    (
+        {
+            'cpuCores': 8,
+            'memory': 7828516864,
+            'modelID': 'Google Pixel 7',
+            'modelIDRefURL': 'https://storage.googleapis.com/play_public/supported_devices.html',
+            'systemName': 'Android'
+        },
+        1.1, [ 'API 33', 'API 34' ]
+    ),
+    (
+        {
+            'cpuCores': 8,
+            'memory': 5794201600,
+            'modelID': 'Google Pixel 4a',
+            'modelIDRefURL': 'https://storage.googleapis.com/play_public/supported_devices.html',
+            'systemName': 'Android'
+        },
+        1.6, [ 'API 31', 'API 33' ]
+    ),
+    (
+        {
+            'cpuCores': 8,
+            'memory': 7673839616,
+            'modelID': 'samsung SM-X700',
+            'modelIDRefURL': 'https://storage.googleapis.com/play_public/supported_devices.html',
+            'systemName': 'Android'
+        },
+        1.0, [ 'API 33', 'API 34' ]
+    )
+]
+# The iTwin versions released over the generated period, in order, and how much each one scales
+# the time of each phase. 4.1.3 has a frontend load regression that 4.2.0 fixes.
+GENERATED_VERSIONS: list[tuple[str, dict[str, float]]] = [
+    ('3.7.12', {}),
+    ('4.0.5', { 'After backend load': 0.9 }),
+    ('4.1.3', { 'After backend load': 0.9, 'After frontend load': 1.2 }),
+    ('4.2.0', { 'After backend load': 0.9 }),
+    ('4.3.1', { 'After backend load': 0.85, 'Webview load': 0.9 })
+]
+# The median time in seconds of each phase (the step of each checkpoint in ACTIONS) on an average
+# device.
+PHASE_SECONDS = [ 0.15, 1.2, 0.05, 0.9, 0.6, 0.1 ]
+# The maximum number of entries written to each file by the 'generate' benchmark, so that files
+# stay under about 150 MB however many entries are generated.
+GENERATED_FILE_ENTRIES = 100000
+
+# Every random property of an entry is drawn here, in a fixed order, so that a seed always
+# generates the same entries.
+# pylint: disable-next=too-many-locals
+def generated_entries(count: int, seed: int = 0, days: float = 365.0) -> Iterator[Record]:
+    '''
+    Generates `count` realistic entries shaped like the JSON written by
+    ActivityTimer on iOS and Android, spread evenly over `days` days from
+    START_TIME. The same `count`, `seed`, and `days` always generate the same
+    entries.
+
+    Each entry comes from one of `GENERATED_DEVICES`, running the OS version
+    and (usually) the newest of `GENERATED_VERSIONS` current at its
+    timestamp. Phase times are log-normal around `PHASE_SECONDS`, scaled by
+    the device and iTwin version, with occasional slow cold starts. One in
+    ten entries used a remote server, which slows the webview load.
+    '''
+
+    rand = random.Random(seed)
+    interval = max(timedelta(days=days) / max(count, 1), timedelta(milliseconds=1))
+    for i in range(count):
+        (device, slowness, system_versions) = rand.choice(GENERATED_DEVICES)
+        progress = i / count
+        (itwin_version, version_scales) = GENERATED_VERSIONS[
+            max(int(progress * len(GENERATED_VERSIONS)) - (rand.random() < 0.1), 0)]
+        android = device['systemName'] == 'Android'
+        using_remote_server = rand.random() < 0.1
+        cold_start = 2.5 if rand.random() < 0.03 else 1.0
+        start_time = START_TIME + i * interval + rand.random() * interval / 2
+        total = 0.0
+        checkpoints = []
+        for (action, seconds) in zip(ACTIONS, PHASE_SECONDS):
+            step = (seconds * slowness * cold_start * version_scales.get(action, 1.0)
+                    * rand.lognormvariate(0.0, 0.15))
+            if using_remote_server and action == 'Webview load':
+                step *= 1.8
+            total += step
+            if android:
+                # The Android ActivityTimer measures in milliseconds.
+                (step, total) = (round(step, 3), round(total, 3))
+            checkpoints.append({
+                'action': action,
+                'step': step,
+                'timestamp': iso_timestamp(start_time + timedelta(seconds=total)),
+                'total': total
+            })
+        yield {
+            'checkpoints': checkpoints,
+            'device': {
+                **device,
+                'systemVersion': system_versions[int(progress * len(system_versions))]
+            },
+            'iTwinVersion': itwin_version,
+            'timestamp': iso_timestamp(start_time + timedelta(seconds=total)),
+            'title': LOG_TITLE,
+            'totalTime': total,
+            'usingRemoteServer': using_remote_server
+        }
+
+# pylint: disable-next=too-many-arguments,too-many-positional-arguments
+def write_generated_files(
+    directory: str,
+    count: int,
+    seed: int = 0,
+    days: float = 365.0,
+    jsonl: bool = False,
+    file_entries: int = GENERATED_FILE_ENTRIES
+) -> list[str]:
+    '''
+    Writes the entries from `generated_entries` into files of up to
+    `file_entries` entries per device model in `directory`, streaming them so
+    that any number of entries can be written. Like ActivityTimer, each entry
+    is pretty-printed with sorted keys (in the style of the platform that
+    recorded it) and followed by a blank line, but the files are named
+    <modelID>-<part>.json rather than .log, so that the add command finds them
+    in a directory. If `jsonl` is True, each entry is written on one line of a
+    .jsonl file instead.
+
+    Returns the filenames.
+    '''
+
+    filenames = []
+    # The open file of each device model, its part number, and the number of entries written to it.
+    files: dict[str, tuple[TextIO, int, int]] = {}
+    with ExitStack() as stack:
+        for entry in generated_entries(count, seed, days):
+            model_id = entry['device']['modelID']
+            (output_file, part, num_written) = files.get(model_id, (None, 0, 0))
+            if output_file is None or num_written >= file_entries:
+                if output_file is not None:
+                    output_file.close()
+                part += 1
+                filename = os.path.join(
+                    directory, f'{model_id}-{part:03d}.{"jsonl" if jsonl else "json"}')
+                filenames.append(filename)
+                output_file = stack.enter_context(open(filename, 'w', encoding='utf-8'))
+                num_written = 0
+            files[model_id] = (output_file, part, num_written + 1)
+            if jsonl:
+                output_file.write(json.dumps(entry, sort_keys=True) + '\n')
+            else:
+                # NSJSONSerialization puts a space before each colon. Android's JSONObject does not.
+                output_file.write(json.dumps(entry, indent=2, sort_keys=True, separators=(
+                    ',', ': ' if entry['device']['systemName'] == 'Android' else ' : ')))
+                output_file.write('\n\n')
+    return sorted(filenames)
+
+def generate_command(args) -> None:
+    '''
+    Handler for the 'generate' command line command. (See command help for
+    more info.)
+    '''
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    (filenames, seconds) = timed(lambda: write_generated_files(
+        args.output_dir, args.entries, args.seed, args.days, args.jsonl, args.file_entries))
+    size = sum(os.path.getsize(filename) for filename in filenames)
+    print(f'Wrote {args.entries} entries to {len(filenames)} files in {args.output_dir} '
+          f'({size / 1e6:.1f} MB) in {seconds:.3f}s.')
+
+def timed(func: Callable[[], Any]) -> tuple[Any, float]:
+    '''
+    Calls `func` and returns its result along with the elapsed time in seconds.
+    '''
+
+    start = time.perf_counter()
+    result = func()
+    return (result, time.perf_counter() - start)
+
+def legacy_report_rows(db: StartupTimesDB) -> list[Record]:
+    '''
+    Generates report rows the way `report` did before it used a single
+    aggregate query: one DISTINCT query, then two more queries per group with
+    the totals summed in Python. Only used for comparison.
+    '''
+
+    rows = []
+    cur = db.cursor()
+    groups = cur.execute('SELECT DISTINCT iTwinVersion, deviceID FROM EntryView').fetchall()
+    for (itwin_version, device_id) in groups:
+        cur.execute('SELECT * FROM Device WHERE id = ?', [ device_id ])
+        device = db.process_row(cur.fetchone(), cur.description)
+        cur.execute('SELECT * FROM EntryView WHERE iTwinVersion = ? AND deviceID = ?',
+                    [ itwin_version, device_id ])
+        entries = db.process_rows(cur.fetchall(), cur.description)
+        rows.append({
+            'modelID': device['modelID'],
+            'iTwinVersion': itwin_version,
+            'averageTime': sum(entry['totalTime'] for entry in entries) / len(entries),
+            'samples': len(entries)
+        })
+    return rows
+
+def report_benchmark(args) -> None:
+    '''
+    Handler for the 'report' command line command. (See command help for more
+    info.)
+    '''
+
+    print(f'{"Entries":>10} | {"Aggregate":>10} | {"Legacy":>10}')
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db = StartupTimesDB(os.path.join(temp_dir, 'StartupTimes.db'))
+        try:
+            num_entries = 0
+            for size in args.sizes:
+                db.insert_entries(synthetic_entries(size - num_entries, num_entries))
+                num_entries = size
+                (_, aggregate_time) = timed(lambda: list(gen_report_rows(db)))
+                (_, legacy_time) = timed(lambda: legacy_report_rows(db))
+                print(f'{size:>10} | {aggregate_time:>9.3f}s | {legacy_time:>9.3f}s')
+        finally:
+            db.close()
+
+# The number of distinct device models generated by `varied_entries`. Large enough that, as
+# in real data, each device has a small fraction of the entries.
+QUERY_MODELS = 64
+
+def varied_entries(count: int) -> Iterator[Record]:
+    '''
+    Generates `count` synthetic entries spread over `QUERY_MODELS` device
+    models, where every fourth entry has a different title and every tenth
+    used a remote server, so that every filter of StartupTimesQuery selects
+    a subset.
+    '''
+
+    for (i, entry) in enumerate(synthetic_entries(count)):
+        entry['device'] = dict(entry['device'], modelID=f'iPad13,{i % QUERY_MODELS}')
+        if i % 4 == 0:
+            entry['title'] = 'CAMERA SAMPLE'
+        entry['usingRemoteServer'] = i % 10 == 0
+        yield entry
+
+# Each filter timed by the 'query' benchmark: its name and a function that applies it to a query.
+QUERY_FILTERS: list[tuple[str, Callable[[StartupTimesQuery], StartupTimesQuery]]] = [
+    ('since', lambda query: query.since('2024-02-01')),
+    ('since, until', lambda query: query.since('2024-02-01').until('2024-02-02')),
+    ('model', lambda query: query.model_ids('iPad13,3', 'iPad13,9')),
+    ('system_version', lambda query: query.system_versions('17.2')),
+    ('title', lambda query: query.titles('CAMERA SAMPLE')),
+    ('remote', lambda query: query.using_remote_server(True)),
+    ('local', lambda query: query.using_remote_server(False)),
+    (
+        'combined',
+        lambda query: query.since('2024-02-01').model_ids('iPad13,3').using_remote_server(False)
+    )
+]
+
+def time_query_filters(db: StartupTimesDB, page_size: int) -> None:
+    '''
+    Prints the time taken to read the paged entries, report rows, and phase
+    rows of each of the `QUERY_FILTERS` from the database `db`.
+    '''
+
+    unfiltered = StartupTimesQuery(db)
+    for (name, apply) in QUERY_FILTERS:
+        query = apply(unfiltered)
+        (entries, entries_seconds) = timed(
+            lambda query=query: sum(1 for _ in query.entries(page_size)))
+        (_, report_seconds) = timed(lambda query=query: list(query.report_rows()))
+        (_, phase_seconds) = timed(lambda query=query: list(query.phase_rows()))
+        print(f'{name:>16} | {entries:>8} | {entries_seconds:>9.3f}s | '
+              f'{report_seconds:>9.3f}s | {phase_seconds:>9.3f}s')
+
+def query_benchmark(args) -> None:
+    '''
+    Handler for the 'query' command line command. (See command help for more
+    info.)
+    '''
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        filename = os.path.join(temp_dir, 'StartupTimes.db')
+        db = StartupTimesDB(filename)
+        try:
+            db.insert_entries(varied_entries(args.entries))
+        finally:
+            db.close()
+        for analyzed in [ False, True ]:
+            if analyzed:
+                connection = sqlite3.connect(filename)
+                try:
+                    connection.execute('ANALYZE')
+                finally:
+                    connection.close()
+            print(f'{"Statistics" if analyzed else "No statistics"}:')
+            print(f'{"Filter":>16} | {"Entries":>8} | {"Pages":>10} | {"Report":>10} | '
+                  f'{"Phases":>10}')
+            db = StartupTimesDB(filename, read_only=True)
+            try:
+                time_query_filters(db, args.page_size)
+            finally:
+                db.close()
+
+# The length of time covered by the 'trend' benchmark.
+TREND_YEARS = 5
+
+# Each trend timed by the 'trend' benchmark: the bucket, the filter arguments, and a function that
+# applies the same filters to a query. The last case filters on the only title, which selects every
+# entry but cannot be answered from EntryDaySummary.
+TREND_CASES: list[tuple[str, list[str], Callable[[StartupTimesQuery], StartupTimesQuery]]] = [
+    ('day', [], lambda query: query),
+    ('week', [], lambda query: query),
+    ('month', [], lambda query: query),
+    (
+        'week',
+        [ '--since', '2026-01-01', '--model', 'iPad13,3' ],
+        lambda query: query.since('2026-01-01').model_ids('iPad13,3')
+    ),
+    ('week', [ '--title', 'STARTUP TIMES' ], lambda query: query.titles('STARTUP TIMES'))
+]
+
+def spread_entries(count: int) -> Iterator[Record]:
+    '''
+    Generates `count` synthetic entries evenly spread over `TREND_YEARS`
+    years, with each iTwin version in use for an equal part of that time.
+    '''
+
+    interval = timedelta(days=365.25 * TREND_YEARS) / count
+    versions = [ '3.7.12', '4.0.5', '4.1.3', '4.2.0' ]
+    for (i, entry) in enumerate(synthetic_entries(count)):
+        entry['timestamp'] = iso_timestamp(START_TIME + i * interval)
+        entry['iTwinVersion'] = versions[i * len(versions) // count]
+        yield entry
+
+def run_trend(filename: str, trend_args: list[str]) -> float:
+    '''
+    Runs the trend command with `trend_args` on the database named `filename`
+    in a new process.
+
+    Returns the time taken.
+    '''
+
+    return timed(lambda: subprocess.run([
+        sys.executable,
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), 'startuptimes.py'),
+        '-d', filename,
+        'trend',
+        *trend_args
+    ], stdout=subprocess.DEVNULL, check=True))[1]
+
+def trend_benchmark(args) -> None:
+    '''
+    Handler for the 'trend' command line command. (See command help for more
+    info.)
+    '''
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        filename = os.path.join(temp_dir, 'StartupTimes.db')
+        print(f'Creating a database with {args.entries} entries over {TREND_YEARS} years...')
+        db = StartupTimesDB(filename)
+        try:
+            (_, insert_seconds) = timed(lambda: db.insert_entries(spread_entries(args.entries)))
+        finally:
+            db.close()
+        print(f'Inserted in {insert_seconds:.3f}s.')
+        print(f'{"Bucket":>6} | {"Filters":<34} | {"Rows":>6} | {"Command":>10} | {"Query":>10}')
+        db = StartupTimesDB(filename, read_only=True)
+        try:
+            for (bucket, trend_args, apply) in TREND_CASES:
+                command_seconds = run_trend(filename, [ '--bucket', bucket, *trend_args ])
+                query = apply(StartupTimesQuery(db))
+                (rows, query_seconds) = timed(
+                    lambda query=query, bucket=bucket: list(query.trend_rows(bucket)))
+                print(f'{bucket:>6} | {" ".join(trend_args) or "(none)":<34} | {len(rows):>6} | '
+                      f'{command_seconds:>9.3f}s | {query_seconds:>9.3f}s')
+        finally:
+            db.close()
+
+def disjoint_shard_entries(count: int, num_shards: int) -> list[list[Record]]:
+    '''
+    Generates `count` entries (see `generated_entries`) for each of
+    `num_shards` databases, dropping the rare entries whose device and
+    timestamp collide with those of an entry in another database, so that
+    the databases have no entries in common.
+    '''
+
+    seen: set[tuple[str, str, str]] = set()
+    shards = []
+    for index in range(num_shards):
+        entries = []
+        for entry in generated_entries(count, index):
+            key = (entry['device']['modelID'], entry['device']['systemVersion'], entry['timestamp'])
+            if key not in seen:
+                seen.add(key)
+                entries.append(entry)
+        shards.append(entries)
+    return shards
+
+def merge_benchmark(args) -> None:
+    '''
+    Handler for the 'merge' command line command. (See command help for more
+    info.)
+    '''
+
+    shard_entries = disjoint_shard_entries(args.entries, args.shards)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        shard_filenames = [
+            os.path.join(temp_dir, f'Shard{index}.db') for index in range(args.shards)
+        ]
+        print(f'Creating {args.shards} databases with {args.entries} entries each...')
+        insert_seconds = 0.0
+        for (entries, shard_filename) in zip(shard_entries, shard_filenames):
+            db = StartupTimesDB(shard_filename)
+            try:
+                (_, seconds) = timed(lambda db=db, entries=entries: db.insert_entries(entries))
+                insert_seconds += seconds
+            finally:
+                db.close()
+        total = sum(map(len, shard_entries))
+        print(f'Inserting the entries took {insert_seconds:.3f}s ({total / insert_seconds:.0f} '
+              f'entries/s).')
+        merged_filename = os.path.join(temp_dir, 'Merged.db')
+        db = StartupTimesDB(merged_filename)
+        try:
+            merge_seconds = 0.0
+            for shard_filename in shard_filenames:
+                (_, seconds) = timed(
+                    lambda shard_filename=shard_filename: db.merge(shard_filename))
+                merge_seconds += seconds
+            print(f'Merging them took {merge_seconds:.3f}s ({total / merge_seconds:.0f} entries/s, '
+                  f'{insert_seconds / merge_seconds:.1f}x faster).')
+            (_, seconds) = timed(lambda: db.merge(shard_filenames[0]))
+            print(f'Merging the first database again took {seconds:.3f}s.')
+        finally:
+            db.close()
+
+        db = StartupTimesDB(shard_filenames[0], read_only=True)
+        try:
+            (_, attach_seconds) = timed(lambda: [
+                db.attach_shard(shard_filename) for shard_filename in shard_filenames[1:]
+            ])
+            (_, report_seconds) = timed(lambda: list(gen_federated_report_rows(db)))
+            print(f'The federated report took {attach_seconds:.3f}s to attach the databases and '
+                  f'{report_seconds:.3f}s to compute.')
+        finally:
+            db.close()
+
+# The date before which the compact benchmark compacts entries, about 300 days into the year of
+# generated entries.
+COMPACT_BEFORE = '2024-10-27'
+
+def database_size(db: StartupTimesDB) -> int:
+    '''
+    Returns the size in bytes of the database file of `db`, after
+    checkpointing its write-ahead log.
+    '''
+
+    db.cursor().execute('PRAGMA wal_checkpoint(TRUNCATE)').fetchall()
+    return os.path.getsize(db.filename)
+
+def time_legacy_vacuum(filename: str, entries: list[Record], chunk_size: int) -> None:
+    '''
+    Creates a database named `filename` with `entries` that does not use
+    incremental auto vacuum, like a database created before compaction
+    existed, compacts it `chunk_size` entries at a time, and prints the time
+    taken by the vacuum that converts it.
+    '''
+
+    db = StartupTimesDB(filename)
+    try:
+        db.insert_entries(entries)
+        cur = db.cursor()
+        cur.execute('PRAGMA auto_vacuum = NONE')
+        cur.execute('VACUUM')
+        old_size = database_size(db)
+        db.compact(COMPACT_BEFORE, chunk_size)
+        (_, seconds) = timed(db.vacuum)
+        new_size = database_size(db)
+        print(f'Converting a database without auto vacuum took {seconds:.3f}s. It shrank from '
+              f'{old_size:,} to {new_size:,} bytes.')
+    finally:
+        db.close()
+
+def compact_benchmark(args) -> None:
+    '''
+    Handler for the 'compact' command line command. (See command help for
+    more info.)
+    '''
+
+    entries = list(generated_entries(args.entries))
+    num_old = sum(1 for entry in entries if entry['timestamp'] < COMPACT_BEFORE)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        filename = os.path.join(temp_dir, 'StartupTimes.db')
+        print(f'Creating a database with {args.entries} entries, {num_old} of them from before '
+              f'{COMPACT_BEFORE}...')
+        db = StartupTimesDB(filename)
+        try:
+            db.insert_entries(entries)
+            old_size = database_size(db)
+
+            class Interrupted(Exception):
+                '''
+                Stops the first compaction once about half of the old entries are compacted.
+                '''
+
+            def interrupt(num_entries: int, _: int) -> None:
+                if num_entries >= num_old // 2:
+                    raise Interrupted()
+
+            try:
+                db.compact(COMPACT_BEFORE, args.chunk_size, interrupt)
+            except Interrupted:
+                pass
+            ((num_resumed, _), compact_seconds) = timed(
+                lambda: db.compact(COMPACT_BEFORE, args.chunk_size))
+            print(f'Compacting the remaining {num_resumed} entries and their checkpoints took '
+                  f'{compact_seconds:.3f}s after resuming ({num_resumed / compact_seconds:.0f} '
+                  'entries/s).')
+            (_, vacuum_seconds) = timed(db.vacuum)
+            new_size = database_size(db)
+            print(f'The incremental vacuum took {vacuum_seconds:.3f}s. The database shrank from '
+                  f'{old_size:,} to {new_size:,} bytes ({new_size / old_size:.0%}).')
+            (_, seconds) = timed(lambda: db.compact(COMPACT_BEFORE, args.chunk_size))
+            print(f'Compacting again took {seconds:.3f}s.')
+            (_, seconds) = timed(db.rebuild_summaries)
+            print(f'Rebuilding the summaries took {seconds:.3f}s.')
+            (_, seconds) = timed(lambda: db.insert_entries(entries))
+            print(f'Adding all of the entries again took {seconds:.3f}s.')
+        finally:
+            db.close()
+
+        time_legacy_vacuum(os.path.join(temp_dir, 'Legacy.db'), entries, args.chunk_size)
+
+# The report commands run by the cache benchmark.
+CACHE_CASES = [
+    [ 'report' ],
+    [
+        'report', '-c', 'modelID,osVersion,iTwinVersion,medianTime,p90Time,ciLowTime,ciHighTime',
+        '--seed', '1'
+    ],
+    [ 'phases', '--since', '2024-06-01', '--model', 'iPhone14,2' ],
+    [ 'trend', '--bucket', 'day' ],
+    [ 'regressions', '--title', LOG_TITLE ]
+]
+
+def run_report(filename: str, command: list[str]) -> float:
+    '''
+    Runs startuptimes.py with the command line `command` on the database
+    named `filename` in a new process, discarding its output. The exit
+    status is ignored, since the regressions command fails when it finds
+    regressions.
+
+    Returns the time taken.
+    '''
+
+    return timed(lambda: subprocess.run([
+        sys.executable,
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), 'startuptimes.py'),
+        '-d', filename,
+        *command
+    ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=False))[1]
+
+def cache_benchmark(args) -> None:
+    '''
+    Handler for the 'cache' command line command. (See command help for more
+    info.)
+    '''
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        filename = os.path.join(temp_dir, 'StartupTimes.db')
+        print(f'Creating a database with {args.entries} entries...')
+        db = StartupTimesDB(filename)
+        try:
+            db.insert_entries(generated_entries(args.entries))
+        finally:
+            db.close()
+        print(f'{"Command":<32} | {"No cache":>9} | {"Miss":>9} | {"Hit":>9} | {"Lookup":>9}')
+        for command in CACHE_CASES:
+            no_cache_seconds = run_report(filename, [ '--no_cache', *command ])
+            miss_seconds = run_report(filename, command)
+            hit_seconds = run_report(filename, command)
+            cache = ReportCache(filename)
+            try:
+                key = next(key for (key,) in sqlite3.connect(f'{filename}.reportcache').execute(
+                    'SELECT key FROM Report ORDER BY lastUsed DESC LIMIT 1'))
+                (_, lookup_seconds) = timed(
+                    lambda cache=cache, key=key: cache.get(key, ReportCache.change_token(filename)))
+            finally:
+                cache.close()
+            print(f'{" ".join(command)[:32]:<32} | {no_cache_seconds:>8.3f}s | '
+                  f'{miss_seconds:>8.3f}s | {hit_seconds:>8.3f}s | {lookup_seconds * 1000:>7.2f}ms')
+
+TABLE_COLUMNS = [
+    ('modelID', 'Device'),
+    ('osVersion', 'OS Ver'),
+    ('iTwinVersion', 'iTwin Ver'),
+    ('averageTime', 'Average Time'),
+    ('medianTime', 'Median'),
+    ('samples', 'Samples')
+]
+TABLE_FORMATTERS = [ None, None, None, TextTable.elapsed_string, TextTable.elapsed_string, None ]
+TABLE_WIDTHS = [ 10, 12, 9, 8, 8, 7 ]
+
+def synthetic_table_rows(count: int) -> Iterator[Record]:
+    '''
+    Generates `count` rows shaped like report rows.
+    '''
+
+    rng = random.Random(0)
+    for index in range(count):
+        yield {
+            'modelID': f'iPad{index % 97},{index % 7}',
+            'osVersion': f'iPadOS {16 + index % 3}.{index % 10}',
+            'iTwinVersion': f'4.{index % 11}.{index % 5}',
+            'averageTime': rng.uniform(1, 20),
+            'medianTime': rng.uniform(1, 20),
+            'samples': rng.randrange(1, 100000)
+        }
+
+def legacy_table_string(data: list[Record]) -> str:
+    '''
+    Renders `data` the way `TextTable` did before it could stream: every value
+    is formatted once to find the column widths and again for output, and
+    the result is built by repeated concatenation. Only used for comparison.
+    '''
+
+    def value_string(value: Any) -> str:
+        return f'{value:.3f}' if isinstance(value, float) else str(value)
+
+    formatters = [ formatter or value_string for formatter in TABLE_FORMATTERS ]
+    header_row = [ title for (_, title) in TABLE_COLUMNS ]
+    max_lengths = list(map(len, header_row))
+    data_values = []
+    for row in data:
+        row_values = [ row[key] for (key, _) in TABLE_COLUMNS ]
+        data_values.append(row_values)
+        for (i, length) in enumerate(max_lengths):
+            max_lengths[i] = max(length, len(formatters[i](row_values[i])))
+
+    def format_row(values: list, use_formatters: bool, separator = ' | ', pad = ' ') -> str:
+        strings = []
+        for (i, value) in enumerate(values):
+            string = formatters[i](value) if use_formatters else value_string(value)
+            just = string.rjust if isinstance(value, (int, float)) else string.ljust
+            strings.append(just(max_lengths[i], pad))
+        return separator.join(strings) + '\n'
+
+    result = ''
+    result = result + format_row(header_row, False)
+    result = result + format_row(len(header_row) * [ '' ], False, '-+-', '-')
+    for row_values in data_values:
+        result = result + format_row(row_values, True)
+    return result
+
+def table_benchmark(args) -> None:
+    '''
+    Handler for the 'table' command line command. (See command help for more
+    info.)
+    '''
+
+    rows = list(synthetic_table_rows(args.rows))
+    table = TextTable(rows, TABLE_COLUMNS, TABLE_FORMATTERS)
+    (text, string_time) = timed(lambda: str(table))
+    (_, legacy_time) = timed(lambda: legacy_table_string(rows))
+    print(f'Rendered {args.rows} rows ({len(text) / 1e6:.1f} MB):')
+    print(f'  Legacy str():             {legacy_time:>7.3f}s')
+    print(f'  str():                    {string_time:>7.3f}s')
+    with tempfile.TemporaryDirectory() as temp_dir:
+        filename = os.path.join(temp_dir, 'table.txt')
+        with open(filename, 'w', encoding='utf-8') as output:
+            (_, write_time) = timed(lambda: table.write(output))
+        print(f'  write() to a file:        {write_time:>7.3f}s')
+        fixed_table = TextTable(
+            synthetic_table_rows(args.rows), TABLE_COLUMNS, TABLE_FORMATTERS, TABLE_WIDTHS)
+        with open(filename, 'w', encoding='utf-8') as output:
+            (_, fixed_time) = timed(lambda: fixed_table.write(output))
+        (_, generate_time) = timed(lambda: sum(1 for _ in synthetic_table_rows(args.rows)))
+        print(f'  Fixed-width write() of a generator, including generating the rows: '
+              f'{fixed_time:.3f}s ({generate_time:.3f}s to generate the rows alone)')
+
+def create_legacy_db(filename: str, num_entries: int) -> None:
+    '''
+    Creates a database named `filename` that uses the original (1.0) schema
+    and fills it with `num_entries` synthetic entries, the way the original
+    version of startuptimes stored them.
+    '''
+
+    db = StartupTimesDB(filename, migrate=False)
+    try:
+        cur = db.cursor()
+        device_ids: dict[tuple, int] = {}
+        entry_rows = []
+        checkpoint_rows = []
+
+        def flush() -> None:
+            cur.executemany('''
+                INSERT INTO Entry(id, iTwinVersion, title, timestamp, totalTime, usingRemoteServer,
+                    deviceID) VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', entry_rows)
+            cur.executemany('''
+                INSERT INTO Checkpoint(entryID, arrayIndex, action, timestamp, step, total)
+                    VALUES (?, ?, ?, ?, ?, ?)
+            ''', checkpoint_rows)
+            db.commit()
+            entry_rows.clear()
+            checkpoint_rows.clear()
+
+        for (entry_id, entry) in enumerate(synthetic_entries(num_entries), 1):
+            key = IngestCache.device_key(entry['device'])
+            if key not in device_ids:
+                device_ids[key] = db.insert_record('Device', entry['device'])
+            entry_rows.append((
+                entry_id,
+                entry['iTwinVersion'],
+                entry['title'],
+                entry['timestamp'],
+                entry['totalTime'],
+                entry['usingRemoteServer'],
+                device_ids[key]
+            ))
+            for (index, checkpoint) in enumerate(entry['checkpoints']):
+                checkpoint_rows.append((
+                    entry_id,
+                    index,
+                    checkpoint['action'],
+                    checkpoint['timestamp'],
+                    checkpoint['step'],
+                    checkpoint['total']
+                ))
+            if len(entry_rows) >= 10000:
+                flush()
+        flush()
+    finally:
+        db.close()
+
+def count_rows(filename: str) -> tuple[int, int, int]:
+    '''
+    Returns the number of rows in the Device, Entry, and Checkpoint tables of
+    the database named `filename`.
+    '''
+
+    connection = sqlite3.connect(filename)
+    try:
+        return tuple(
+            connection.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+            for table in ('Device', 'Entry', 'Checkpoint'))
+    finally:
+        connection.close()
+
+def migrate_benchmark(args) -> None:
+    '''
+    Handler for the 'migrate' command line command. (See command help for
+    more info.)
+    '''
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        filename = os.path.join(temp_dir, 'StartupTimes.db')
+        print(f'Creating a version 1.0 database with {args.entries} entries...')
+        create_legacy_db(filename, args.entries)
+        print(f'Database size: {os.path.getsize(filename) / 1e6:.1f} MB')
+        db = StartupTimesDB(filename, migrate=False)
+        try:
+            (_, backup_seconds) = timed(lambda: db.backup(f'{filename}.bak'))
+            print(f'Backup took {backup_seconds:.3f}s.')
+            db.migrate(
+                backup=False,
+                on_applied=lambda migration, seconds:
+                    print(f'  {migration.version}: {migration.description} ({seconds:.3f}s)'))
+            (_, check_seconds) = timed(db.check_summaries)
+        finally:
+            db.close()
+        print(f'Summary check took {check_seconds:.3f}s.')
+
+# Equivalent queries over the schema before (1.4) and after (1.5) the iTwin versions and checkpoint
+# actions were moved into dictionary tables. Each tuple holds a name, the 1.4 query, and the 1.5
+# query. The 1.5 queries return the same names as the 1.4 queries.
+STORAGE_QUERIES = [
+    (
+        'GROUP BY phases',
+        '''
+            SELECT Entry.deviceID, Entry.iTwinVersion, Checkpoint.action, COUNT(*), AVG(step)
+                FROM Checkpoint JOIN Entry ON Checkpoint.entryID = Entry.id
+                GROUP BY Entry.deviceID, Entry.iTwinVersion, Checkpoint.action
+        ''',
+        '''
+            SELECT deviceID, Version.name, Action.name, count, average FROM (
+                SELECT Entry.deviceID, Entry.versionID, Checkpoint.actionID, COUNT(*) AS count,
+                    AVG(step) AS average
+                FROM Checkpoint JOIN Entry ON Checkpoint.entryID = Entry.id
+                GROUP BY Entry.deviceID, Entry.versionID, Checkpoint.actionID
+            ) AS Phase
+            JOIN Version ON Version.id = Phase.versionID
+            JOIN Action ON Action.id = Phase.actionID
+        '''
+    ),
+    (
+        'Sorted totalTime',
+        'SELECT deviceID, iTwinVersion, totalTime FROM Entry '
+        'ORDER BY deviceID, iTwinVersion, totalTime',
+        'SELECT deviceID, versionID, totalTime FROM Entry ORDER BY deviceID, versionID, totalTime'
+    ),
+    (
+        'Sorted phase steps',
+        '''
+            SELECT Entry.deviceID, Entry.iTwinVersion, Checkpoint.action, Checkpoint.step
+                FROM Entry JOIN Checkpoint ON Checkpoint.entryID = Entry.id
+                ORDER BY Entry.deviceID, Entry.iTwinVersion, Checkpoint.action, Checkpoint.step
+        ''',
+        '''
+            SELECT Entry.deviceID, Entry.versionID, Checkpoint.actionID, Checkpoint.step
+                FROM Entry JOIN Checkpoint ON Checkpoint.entryID = Entry.id
+                ORDER BY Entry.deviceID, Entry.versionID, Checkpoint.actionID, Checkpoint.step
+        '''
+    )
+]
+
+def vacuumed_size(filename: str) -> int:
+    '''
+    Vacuums the database named `filename` and returns its size in bytes.
+    '''
+
+    connection = sqlite3.connect(filename)
+    try:
+        connection.execute('VACUUM')
+    finally:
+        connection.close()
+    return os.path.getsize(filename)
+
+def time_queries(filename: str, index: int) -> list[float]:
+    '''
+    Runs query number `index` of each of the `STORAGE_QUERIES` against the
+    database named `filename`, reading all of the rows.
+
+    Returns the number of seconds each query took.
+    '''
+
+    connection = sqlite3.connect(filename)
+    try:
+        return [
+            timed(lambda sql=queries[index]: connection.execute(sql).fetchall())[1]
+            for queries in STORAGE_QUERIES
+        ]
+    finally:
+        connection.close()
+
+def storage_benchmark(args) -> None:
+    '''
+    Handler for the 'storage' command line command. (See command help for
+    more info.)
+    '''
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        filename = os.path.join(temp_dir, 'StartupTimes.db')
+        print(f'Creating a database with {args.entries} entries...')
+        create_legacy_db(filename, args.entries)
+        db = StartupTimesDB(filename, migrate=False)
+        try:
+            db.migrate(backup=False, target='1.4')
+        finally:
+            db.close()
+        before_size = vacuumed_size(filename)
+        before_times = time_queries(filename, 1)
+        db = StartupTimesDB(filename, migrate=False)
+        try:
+            (_, migrate_seconds) = timed(lambda: db.migrate(backup=False))
+            (report_rows, report_seconds) = timed(lambda: list(gen_report_rows(db)))
+        finally:
+            db.close()
+        after_size = vacuumed_size(filename)
+        after_times = time_queries(filename, 2)
+        print(f'Migration to {StartupTimesDB.SCHEMA_VERSION} took {migrate_seconds:.3f}s.')
+        print(f'{"":>20} | {"Before":>10} | {"After":>10}')
+        print(f'{"File size (MB)":>20} | {before_size / 1e6:>10.1f} | {after_size / 1e6:>10.1f}')
+        for (queries, before, after) in zip(STORAGE_QUERIES, before_times, after_times):
+            print(f'{queries[0]:>20} | {before:>9.3f}s | {after:>9.3f}s')
+        print(f'Summary report: {len(report_rows)} rows in {report_seconds:.3f}s.')
+
+def run_startuptimes(filename: str, command: list[str]) -> tuple[float, int]:
+    '''
+    Runs startuptimes.py with the command line `command` on the database
+    named `filename` in a new process, discarding its output.
+
+    Returns the time taken and the peak resident memory of the process (and
+    any worker processes it started) in bytes.
+    '''
+
+    start = time.perf_counter()
+    with subprocess.Popen([
+        sys.executable,
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), 'startuptimes.py'),
+        '-d', filename,
+        *command
+    ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL) as process:
+        (_, status, usage) = os.wait4(process.pid, 0)
+        seconds = time.perf_counter() - start
+        process.returncode = os.waitstatus_to_exitcode(status)
+    if process.returncode != 0:
+        raise RuntimeError(f'{command[0]} failed with status {process.returncode}.')
+    # ru_maxrss is in bytes on macOS, and in kilobytes elsewhere.
+    return (seconds, usage.ru_maxrss * (1 if sys.platform == 'darwin' else 1024))
+
+def run_export(filename: str, export_format: str, output: str) -> tuple[float, int]:
+    '''
+    Exports the checkpoints in the database named `filename` to `output` in
+    `export_format` by running startuptimes.py in a new process.
+
+    Returns the time taken and the peak resident memory of the process in
+    bytes.
+    '''
+
+    return run_startuptimes(
+        filename, [ 'export', 'checkpoints', '--format', export_format, '--output', output ])
+
+def fill_export_db(filename: str, start: int, count: int) -> int:
+    '''
+    Adds `count` synthetic entries starting at `start` to the database named
+    `filename`.
+
+    Returns the number of checkpoints in the database.
+    '''
+
+    db = StartupTimesDB(filename)
+    try:
+        db.insert_entries(synthetic_entries(count, start))
+        return db.cursor().execute('SELECT COUNT(*) FROM Checkpoint').fetchone()[0]
+    finally:
+        db.close()
+
+def export_benchmark(args) -> None:
+    '''
+    Handler for the 'export' command line command. (See command help for
+    more info.)
+    '''
+
+    print(f'{"Rows":>10} | {"Format":>8} | {"Time":>9} | {"Rows/s":>9} | {"Size (MB)":>9} | '
+          f'{"Peak RSS (MB)":>13}')
+    # The database is filled in a worker process. On Linux, the peak memory of each export process
+    # includes the size of this process when it was started, so this process must stay small.
+    with tempfile.TemporaryDirectory() as temp_dir, ProcessPoolExecutor(1) as executor:
+        filename = os.path.join(temp_dir, 'StartupTimes.db')
+        output = os.path.join(temp_dir, 'export')
+        num_entries = 0
+        for size in args.sizes:
+            num_rows = executor.submit(
+                fill_export_db, filename, num_entries, size - num_entries).result()
+            num_entries = size
+            for export_format in EXPORT_FORMATS:
+                (seconds, peak_memory) = run_export(filename, export_format, output)
+                print(f'{num_rows:>10} | {export_format:>8} | {seconds:>8.3f}s | '
+                      f'{num_rows / seconds:>9.0f} | {os.path.getsize(output) / 1e6:>9.1f} | '
+                      f'{peak_memory / 1e6:>13.1f}')
+                os.remove(output)
+
+# The startuptimes.py commands timed by the 'scale' benchmark at each size, after 'add'. Each
+# renders its results as a text table. They bypass the report cache, so that repeated runs compute
+# their reports.
+SCALE_STAGES: list[tuple[str, list[str]]] = [
+    ('report', [ '--no_cache', 'report' ]),
+    (
+        'percentiles',
+        [
+            '--no_cache', 'report', '--columns',
+            'modelID,osVersion,iTwinVersion,medianTime,p90Time,p99Time,samples'
+        ]
+    ),
+    ('phases', [ '--no_cache', 'phases' ]),
+    ('trend', [ '--no_cache', 'trend', '--bucket', 'day' ])
+]
+# Differences from the baseline smaller than these are treated as noise by the 'scale' benchmark.
+SCALE_MIN_SECONDS = 0.05
+SCALE_MIN_BYTES = 4 << 20
+
+def compare_to_baseline(
+    results: dict[str, dict[str, Any]],
+    baseline: dict[str, dict[str, Any]],
+    tolerance: float
+) -> list[str]:
+    '''
+    Compares the time and peak memory of each stage in `results` with the
+    same stage at the same size in `baseline`, ignoring stages that are not
+    in both.
+
+    Returns a description of each measurement that is more than `tolerance`
+    (a fraction) worse than the baseline.
+    '''
+
+    regressions = []
+    for (size, stages) in results.items():
+        for (stage, result) in stages.items():
+            old = baseline.get(size, {}).get(stage)
+            if not isinstance(result, dict) or not isinstance(old, dict):
+                continue
+            for (key, minimum, unit, scale) in [
+                ('seconds', SCALE_MIN_SECONDS, 's', 1),
+                ('peakRSS', SCALE_MIN_BYTES, ' MB', 1e6)
+            ]:
+                if result[key] > old[key] * (1 + tolerance) and result[key] - old[key] > minimum:
+                    regressions.append(
+                        f'{stage} with {size} entries: {key} {result[key] / scale:.3f}{unit}, '
+                        f'baseline {old[key] / scale:.3f}{unit} '
+                        f'(+{(result[key] / old[key] - 1) * 100:.0f}%)')
+    return regressions
+
+def time_scale_stages(
+    input_dir: str,
+    filename: str,
+    size: int,
+    repeat: int,
+    baseline_stages: dict[str, Any]
+) -> dict[str, Any]:
+    '''
+    Times each stage of the 'scale' benchmark, adding the `size` entries in
+    `input_dir` to a new database named `filename` and then reading them,
+    `repeat` times. Prints a row for each stage, comparing its time with the
+    same stage in `baseline_stages`.
+
+    Returns the time and peak memory of the fastest run of each stage, and
+    the size of the database.
+    '''
+
+    stages: dict[str, Any] = {}
+    for (stage, command) in [ ('add', [ 'add', input_dir ]), *SCALE_STAGES ]:
+        runs = []
+        for _ in range(repeat):
+            if stage == 'add':
+                for suffix in [ '', '-wal', '-shm' ]:
+                    if os.path.exists(filename + suffix):
+                        os.remove(filename + suffix)
+            runs.append(run_startuptimes(filename, command))
+        # The fastest run is the one least disturbed by the rest of the system.
+        (seconds, peak_memory) = min(runs)
+        stages[stage] = { 'seconds': seconds, 'peakRSS': peak_memory }
+        old = baseline_stages.get(stage)
+        old_seconds = f'{old["seconds"]:>8.3f}s' if old is not None else f'{"-":>9}'
+        print(f'{size:>10} | {stage:>11} | {seconds:>8.3f}s | {size / seconds:>10.0f} | '
+              f'{peak_memory / 1e6:>13.1f} | {old_seconds}', flush=True)
+    stages['dbSize'] = os.path.getsize(filename)
+    return stages
+
+def scale_benchmark(args) -> None:
+    '''
+    Handler for the 'scale' command line command. (See command help for more
+    info.)
+    '''
+
+    baseline = None
+    if args.baseline is not None:
+        with open(args.baseline, encoding='utf-8') as baseline_file:
+            baseline = json.load(baseline_file)
+    results: dict[str, dict[str, Any]] = {}
+    print(f'{"Entries":>10} | {"Stage":>11} | {"Time":>9} | {"Entries/s":>10} | '
+          f'{"Peak RSS (MB)":>13} | {"Baseline":>9}')
+    # Files are generated in a worker process. On Linux, the peak memory of each startuptimes.py
+    # process includes the size of this process when it was started, so this process must stay
+    # small.
+    with ProcessPoolExecutor(1) as executor:
+        for size in args.sizes:
+            with tempfile.TemporaryDirectory() as temp_dir:
+                input_dir = os.path.join(temp_dir, 'entries')
+                os.mkdir(input_dir)
+                executor.submit(write_generated_files, input_dir, size, args.seed).result()
+                results[str(size)] = time_scale_stages(
+                    input_dir,
+                    os.path.join(temp_dir, 'StartupTimes.db'),
+                    size,
+                    args.repeat,
+                    (baseline or {}).get('results', {}).get(str(size), {}))
+    if args.output is not None:
+        with open(args.output, 'w', encoding='utf-8') as output_file:
+            json.dump({
+                'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+                'python': sys.version.split()[0],
+                'sqlite': sqlite3.sqlite_version,
+                'platform': sys.platform,
+                'cpus': os.cpu_count(),
+                'seed': args.seed,
+                'results': results
+            }, output_file, indent=2)
+            output_file.write('\n')
+        print(f'Results written to {args.output}.')
+    if baseline is not None:
+        regressions = compare_to_baseline(results, baseline.get('results', {}), args.tolerance)
+        for regression in regressions:
+            print(f'REGRESSED: {regression}')
+        if len(regressions) > 0:
+            sys.exit(1)
+        print(f'No stage is more than {args.tolerance * 100:.0f}% slower or larger than '
+              f'{args.baseline}.')
+
+def profile_commands(temp_dir: str) -> list[list[str]]:
+    '''
+    Returns the command lines timed by the 'profile' benchmark, which add the
+    entries in the 'entries' directory in `temp_dir` and then read them.
+    '''
+
+    return [
+        [ 'add', os.path.join(temp_dir, 'entries') ],
+        [ 'report', '-c', 'modelID,medianTime,p90Time' ],
+        [ 'trend', '-b', 'day' ],
+        [ 'export', 'entries', '-o', os.path.join(temp_dir, 'entries.csv') ]
+    ]
+
+def time_disabled_phase(iterations: int = 1000000) -> float:
+    '''
+    Times `iterations` phases of a `Profiler` that is disabled, the cost of
+    the instrumentation that add and the reports pay by default.
+
+    Returns the time taken by each phase, in seconds.
+    '''
+
+    profiler = Profiler()
+
+    def bare_loop() -> None:
+        for _ in range(iterations):
+            pass
+
+    def phase_loop() -> None:
+        for _ in range(iterations):
+            with profiler.phase('x'):
+                pass
+
+    (_, bare_seconds) = timed(bare_loop)
+    (_, phase_seconds) = timed(phase_loop)
+    return (phase_seconds - bare_seconds) / iterations
+
+def time_profiled_command(
+    filename: str,
+    profile_filename: str,
+    command_args: list[str],
+    repeat: int
+) -> dict[bool, float]:
+    '''
+    Runs startuptimes.py with the command line `command_args` on the
+    database named `filename` `repeat` times with --profile_output
+    `profile_filename` and `repeat` times without, alternating between the
+    two. The database is deleted before each run of add.
+
+    Returns the fastest time without (False) and with (True) profiling.
+    '''
+
+    times: dict[bool, float] = {}
+    for profiled in [ False, True ] * repeat:
+        if command_args[0] == 'add':
+            for suffix in [ '', '-wal', '-shm' ]:
+                if os.path.exists(filename + suffix):
+                    os.remove(filename + suffix)
+        profile_args = [ '--profile_output', profile_filename ] if profiled else []
+        # Cached reports would skip the work being profiled.
+        (seconds, _) = run_startuptimes(filename, [ '--no_cache', *profile_args, *command_args ])
+        times[profiled] = min(seconds, times.get(profiled, seconds))
+    return times
+
+def profile_benchmark(args) -> None:
+    '''
+    Handler for the 'profile' command line command. (See command help for
+    more info.)
+    '''
+
+    print(f'Disabled phase: {time_disabled_phase() * 1e9:.0f}ns each, at most 7 per batch of '
+          f'entries added.')
+    print(f'{"Command":>8} | {"Plain":>8} | {"Profiled":>8} | {"Overhead":>8} | Largest phase')
+    with tempfile.TemporaryDirectory() as temp_dir:
+        input_dir = os.path.join(temp_dir, 'entries')
+        os.mkdir(input_dir)
+        write_generated_files(input_dir, args.entries, 0)
+        filename = os.path.join(temp_dir, 'StartupTimes.db')
+        profile_filename = os.path.join(temp_dir, 'profile.json')
+        for command_args in profile_commands(temp_dir):
+            command = command_args[0]
+            times = time_profiled_command(filename, profile_filename, command_args, args.repeat)
+            with open(profile_filename, encoding='utf-8') as profile_file:
+                summary = json.load(profile_file)
+            (largest, phase) = max(summary['phases'].items(), key=lambda item: item[1]['seconds'])
+            overhead = (times[True] - times[False]) / times[False]
+            print(f'{command:>8} | {times[False]:>7.3f}s | {times[True]:>7.3f}s | '
+                  f'{overhead * 100:>+7.1f}% | {largest} ({phase["seconds"]:.3f}s)')
+
+def write_entry_files(directory: str, num_files: int, entries_per_file: int) -> list[str]:
+    '''
+    Writes `num_files` files of `entries_per_file` synthetic entries each into
+    `directory`, formatted the way ActivityTimer logs them (pretty-printed
+    JSON separated by blank lines).
+
+    Returns the filenames.
+    '''
+
+    filenames = []
+    for i in range(num_files):
+        filename = os.path.join(directory, f'device{i}.json')
+        with open(filename, 'w', encoding='utf-8') as output_file:
+            for entry in synthetic_entries(entries_per_file, i * entries_per_file):
+                output_file.write(json.dumps(entry, indent=2))
+                output_file.write('\n\n')
+        filenames.append(filename)
+    return filenames
+
+def ingest_benchmark(args) -> None:
+    '''
+    Handler for the 'ingest' command line command. (See command help for
+    more info.)
+    '''
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        filenames = write_entry_files(temp_dir, args.files, args.entries)
+        num_entries = args.files * args.entries
+        print(f'{"Parser":>12} | {"Time":>9} | {"Entries/s":>10}')
+        runs = [ ('serial', 0) ] + [ (f'{jobs} jobs', jobs) for jobs in args.jobs ]
+        for (name, jobs) in runs:
+            db = StartupTimesDB(os.path.join(temp_dir, f'{name}.db'))
+            try:
+                if jobs == 0:
+                    (_, seconds) = timed(lambda db=db: db.insert_entries(
+                        entry for filename in filenames
+                        for entry in iter_entries_file(filename, False)))
+                else:
+                    (_, seconds) = timed(
+                        lambda db=db, jobs=jobs: ingest_files(db, filenames, jobs=jobs))
+            finally:
+                db.close()
+            print(f'{name:>12} | {seconds:>8.3f}s | {num_entries / seconds:>10.0f}')
+
+def write_log_file(filename: str, size: int, num_entries: int) -> None:
+    '''
+    Writes a log file named `filename` of about `size` bytes, made of
+    logcat-style noise lines with `num_entries` synthetic entries logged by
+    ActivityTimer spread evenly through it.
+    '''
+
+    noise = ''.join(
+        f'01-01 12:00:00.{i % 1000:03d}  1234  1250 I ITMLogger: [Info] Loading tile {i} of model\n'
+        for i in range(1000))
+    chunk_size = max(len(noise), size // max(num_entries, 1))
+    with open(filename, 'w', encoding='utf-8') as output_file:
+        written = 0
+        for entry in synthetic_entries(num_entries):
+            text = noise * max(1, chunk_size // len(noise))
+            output_file.write(text)
+            output_file.write(f'{LOG_TITLE}:\n{json.dumps(entry, indent=2)}\n')
+            written += len(text)
+        while written < size:
+            output_file.write(noise)
+            written += len(noise)
+
+def scan_lines(filename: str) -> int:
+    '''
+    Counts the lines containing the log title by reading `filename` one line
+    at a time, for comparison with `iter_log_entries`.
+    '''
+
+    marker = f'{LOG_TITLE}:'
+    with open(filename, encoding='utf-8') as input_file:
+        return sum(1 for line in input_file if marker in line)
+
+def logs_benchmark(args) -> None:
+    '''
+    Handler for the 'logs' command line command. (See command help for more
+    info.)
+    '''
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        filename = os.path.join(temp_dir, 'device.log')
+        write_log_file(filename, args.megabytes << 20, args.entries)
+        size = os.path.getsize(filename) / 1e6
+        (entries, scan_seconds) = timed(lambda: list(iter_log_entries(filename)))
+        (num_lines, lines_seconds) = timed(lambda: scan_lines(filename))
+        print(f'Log size: {size:.1f} MB')
+        print(f'iter_log_entries: {len(entries)} entries in {scan_seconds:.3f}s '
+              f'({size / scan_seconds:.0f} MB/s)')
+        print(f'Line-by-line search only: {num_lines} titles in {lines_seconds:.3f}s '
+              f'({size / lines_seconds:.0f} MB/s)')
+
+def stress_writer(filename: str, index: int, num_entries: int, batch_size: int) -> tuple[int, int]:
+    '''
+    Adds `num_entries` synthetic entries to the database named `filename`.
+    The first half are the same for every writer, so the writers race to add
+    the same devices and entries, and the rest are unique to writer `index`.
+
+    Returns the number of entries inserted and skipped.
+    '''
+
+    shared = num_entries // 2
+    own = num_entries - shared
+    entries = itertools.chain(
+        synthetic_entries(shared),
+        synthetic_entries(own, shared + index * own))
+    db = StartupTimesDB(filename)
+    try:
+        stats = db.insert_entries(entries, batch_size)
+    finally:
+        db.close()
+    return (stats.inserted, stats.skipped)
+
+def stress_reader(filename: str, done: Event) -> int:
+    '''
+    Repeatedly opens the database named `filename` read-only and generates
+    the report rows and distribution statistics, until `done` is set.
+
+    Returns the number of reports generated.
+    '''
+
+    num_reports = 0
+    while not done.is_set():
+        try:
+            db = StartupTimesDB(filename, read_only=True)
+        except ValueError:
+            # The writers have not finished creating the database yet.
+            time.sleep(0.01)
+            continue
+        try:
+            list(gen_report_rows(db))
+            gen_distribution_stats(db)
+            num_reports += 1
+        finally:
+            db.close()
+    return num_reports
+
+def stress_benchmark(args) -> None:
+    '''
+    Handler for the 'stress' command line command. (See command help for
+    more info.)
+    '''
+
+    with tempfile.TemporaryDirectory() as temp_dir, multiprocessing.Manager() as manager:
+        filename = os.path.join(temp_dir, 'StartupTimes.db')
+        done = manager.Event()
+        with ProcessPoolExecutor(args.writers + args.readers) as executor:
+            readers = [
+                executor.submit(stress_reader, filename, done) for _ in range(args.readers)
+            ]
+            start = time.perf_counter()
+            writers = [
+                executor.submit(stress_writer, filename, index, args.entries, args.batch_size)
+                for index in range(args.writers)
+            ]
+            inserted = sum(writer.result()[0] for writer in writers)
+            seconds = time.perf_counter() - start
+            done.set()
+            num_reports = sum(reader.result() for reader in readers)
+    print(f'{args.writers} writers inserted {inserted} entries in {seconds:.3f}s '
+          f'({inserted / seconds:.0f} entries/s) while {args.readers} readers ran '
+          f'{num_reports} reports.')
+
+async def http_request(
+    reader: asyncio.StreamReader,
+    writer: asyncio.StreamWriter,
+    method: str,
+    path: str,
+    body: bytes = b'') -> tuple[int, dict[str, str], bytes]:
+    '''
+    Sends one HTTP/1.1 request on a keep-alive connection and reads the
+    response.
+
+    Returns the status, the headers with lowercase names, and the body.
+    '''
+
+    writer.write(
+        f'{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n'
+        f'Content-Length: {len(body)}\r\n\r\n'.encode('latin-1') + body)
+    head = (await reader.readuntil(b'\r\n\r\n')).decode('latin-1').split('\r\n')
+    status = int(head[0].split()[1])
+    headers = {}
+    for line in head[1:]:
+        if ':' in line:
+            (name, value) = line.split(':', 1)
+            headers[name.strip().lower()] = value.strip()
+    response_body = await reader.readexactly(int(headers.get('content-length', 0)))
+    return (status, headers, response_body)
+
+async def serve_client(
+    host: str,
+    port: int,
+    bodies: list[bytes],
+    counts: dict[str, int]) -> None:
+    '''
+    Posts each of `bodies` to /entries on one keep-alive connection, waiting
+    for the time given by Retry-After and trying again whenever the server
+    rejects a body with 503. Adds the number of each response status to
+    `counts`.
+    '''
+
+    (reader, writer) = await asyncio.open_connection(host, port)
+    try:
+        for body in bodies:
+            while True:
+                (status, headers, _) = await http_request(reader, writer, 'POST', '/entries', body)
+                counts[str(status)] = counts.get(str(status), 0) + 1
+                if status != 503:
+                    break
+                await asyncio.sleep(float(headers.get('retry-after', 1)))
+    finally:
+        writer.close()
+
+async def get_metrics(host: str, port: int) -> dict[str, float]:
+    '''
+    Fetches /metrics from the server and returns the values by name.
+    '''
+
+    (reader, writer) = await asyncio.open_connection(host, port)
+    try:
+        (_, _, body) = await http_request(reader, writer, 'GET', '/metrics')
+    finally:
+        writer.close()
+    metrics = {}
+    for line in body.decode().splitlines():
+        if line != '' and not line.startswith('#'):
+            (name, value) = line.rsplit(' ', 1)
+            metrics[name] = float(value)
+    return metrics
+
+async def run_serve_benchmark(args, filename: str) -> None:
+    '''
+    Starts the server on the database named `filename`, runs the clients
+    against it, and then stops it.
+    '''
+
+    entries = list(synthetic_entries(args.entries))
+    bodies = [
+        '\n'.join(json.dumps(entry) for entry in entries[index:index + args.per_request]).encode()
+        for index in range(0, len(entries), args.per_request)
+    ]
+    server = await asyncio.create_subprocess_exec(
+        sys.executable,
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), 'startuptimes.py'),
+        '-d', filename,
+        'serve',
+        '--port', '0',
+        '--queue_size', str(args.queue_size),
+        stdout=asyncio.subprocess.PIPE)
+    try:
+        assert server.stdout is not None
+        line = (await server.stdout.readline()).decode()
+        if not line.startswith('Serving on http://'):
+            raise RuntimeError(f'Server failed to start: {line!r}')
+        port = int(line.split('/')[2].rsplit(':', 1)[1])
+        host = '127.0.0.1'
+        counts: dict[str, int] = {}
+        start = time.perf_counter()
+        await asyncio.gather(*(
+            serve_client(host, port, bodies[index::args.clients], counts)
+            for index in range(args.clients)
+        ))
+        accept_seconds = time.perf_counter() - start
+        while True:
+            metrics = await get_metrics(host, port)
+            if (metrics['startuptimes_entries_inserted_total']
+                + metrics['startuptimes_entries_skipped_total']
+                + metrics['startuptimes_entries_failed_total'] >= args.entries):
+                break
+            await asyncio.sleep(0.01)
+        write_seconds = time.perf_counter() - start
+        accepted = counts.get('202', 0)
+        responses = ', '.join(f'{count} x {status}' for (status, count) in sorted(counts.items()))
+        print(f'{args.clients} clients submitted {len(bodies)} requests ({args.entries} entries) '
+              f'in {accept_seconds:.3f}s ({accepted / accept_seconds:.0f} accepted requests/s, '
+              f'{args.entries / accept_seconds:.0f} entries/s).')
+        print(f'Responses: {responses}.')
+        print(f'All entries were written {write_seconds:.3f}s after the start '
+              f'({args.entries / write_seconds:.0f} entries/s) in '
+              f'{metrics["startuptimes_batches_total"]:.0f} batches, taking '
+              f'{metrics["startuptimes_write_seconds_total"]:.3f}s of writer time.')
+    finally:
+        if server.returncode is None:
+            server.terminate()
+        await server.wait()
+
+def serve_benchmark(args) -> None:
+    '''
+    Handler for the 'serve' command line command. (See command help for
+    more info.)
+    '''
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        asyncio.run(run_serve_benchmark(args, os.path.join(temp_dir, 'StartupTimes.db')))
+
+# Each benchmark and option is one add_parser or add_argument statement.
+# pylint: disable-next=too-many-locals,too-many-statements
+def main() -> None:
+    '''
+    The benchmark main program.
+    '''
+
+    parser = argparse.ArgumentParser(
+        description='Benchmarks for the startuptimes script. The tests are in '
+                    'test_startuptimes.py.')
+    sub_parsers = parser.add_subparsers(title='Benchmarks', metavar='', required=True)
+
+    parser_generate = sub_parsers.add_parser(
+        'generate',
+        help='Write realistic synthetic entries to files, for testing at scale.',
+        description=textwrap.dedent('''
+            Writes entries shaped like the JSON that ActivityTimer records on iOS
+            and Android to files in the output directory, formatted the way
+            ActivityTimer logs them, ready to load with the startuptimes add
+            command. The entries come from a mix of iPads, iPhones, and Android
+            devices over several OS and iTwin versions (including one with a
+            frontend load regression), with log-normal phase times, occasional cold
+            starts, and some remote server runs.
+
+            The entries of each device model are split into files of at most
+            --file_entries entries (up to about 150 MB with the default), so large runs
+            do not produce huge files. The same --entries, --seed, --days, and
+            --file_entries always produce the same files. Entries are streamed to
+            the files, so any number can be written.
+            '''),
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser_generate.set_defaults(func=generate_command)
+    parser_generate.add_argument(
+        '-e',
+        '--entries',
+        dest='entries',
+        type=int,
+        default=10000,
+        help='Number of entries. Default is 10000.')
+    parser_generate.add_argument(
+        '-o',
+        '--output_dir',
+        dest='output_dir',
+        required=True,
+        help='Directory to write the files to. It is created if necessary.')
+    parser_generate.add_argument(
+        '--seed',
+        dest='seed',
+        type=int,
+        default=0,
+        help='Random seed. Default is 0.')
+    parser_generate.add_argument(
+        '--days',
+        dest='days',
+        type=float,
+        default=365.0,
+        help='Number of days the entries are spread over. Default is 365.')
+    parser_generate.add_argument(
+        '--jsonl',
+        dest='jsonl',
+        action='store_true',
+        help='Write one entry per line to .jsonl files (use add --jsonl to load them).')
+    parser_generate.add_argument(
+        '--file_entries',
+        dest='file_entries',
+        type=int,
+        default=GENERATED_FILE_ENTRIES,
+        help=f'Maximum number of entries per file. Default is {GENERATED_FILE_ENTRIES}.')
+
+    parser_scale = sub_parsers.add_parser(
+        'scale',
+        help='Time and measure the memory of add and the reports at increasing sizes.',
+        description=textwrap.dedent('''
+            For each size, generates that many entries (see the generate command)
+            into a temporary directory, then runs startuptimes.py to add them to a
+            new database and to render the report, a report with percentiles, the
+            phases report, and a daily trend, each in a new process. Prints the
+            time taken and peak resident memory of the fastest of --repeat runs of
+            each.
+
+            Use --output to save the results as a baseline, and --baseline to
+            compare with one saved earlier on the same machine. Exits with status
+            1 if any stage is more than --tolerance slower or larger than in the
+            baseline, ignoring differences of under 0.05s or 4 MB.
+
+            Sizes from 1000 up to 10000000 entries work. The generated files hold
+            at most 100000 entries each, and add streams them in batches, so no
+            stage needs memory in proportion to a file. What does grow is the set
+            of entry timestamps that add keeps per device to skip duplicates: add
+            peaks at about 180 MB with 1000000 entries, and needs about 130 bytes
+            more per entry beyond that (roughly 1.4 GB at 10000000). Each million
+            entries also take about 1.4 GB of disk space while they are added.
+            '''),
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser_scale.set_defaults(func=scale_benchmark)
+    parser_scale.add_argument(
+        '-s',
+        '--sizes',
+        dest='sizes',
+        type=lambda value: sorted(map(int, value.split(','))),
+        default=[ 1000, 10000, 100000 ],
+        help='Comma-separated list of entry counts. Default is 1000,10000,100000.')
+    parser_scale.add_argument(
+        '-r',
+        '--repeat',
+        dest='repeat',
+        type=int,
+        default=3,
+        help='Number of times each stage is run. Default is 3.')
+    parser_scale.add_argument(
+        '--seed',
+        dest='seed',
+        type=int,
+        default=0,
+        help='Random seed for the generated entries. Default is 0.')
+    parser_scale.add_argument(
+        '-o',
+        '--output',
+        dest='output',
+        help='Write the results to this JSON file.',
+        required=False)
+    parser_scale.add_argument(
+        '-b',
+        '--baseline',
+        dest='baseline',
+        help='Compare the results with this JSON file, written by --output.',
+        required=False)
+    parser_scale.add_argument(
+        '-t',
+        '--tolerance',
+        dest='tolerance',
+        type=float,
+        default=0.25,
+        help=(
+            'Fraction by which a stage may be slower or larger than the baseline. '
+            'Default is 0.25.'))
+
+    parser_profile = sub_parsers.add_parser(
+        'profile',
+        help='Measure the overhead of --profile.',
+        description=textwrap.dedent('''
+            Measures the cost of the profiling instrumentation when it is
+            disabled. Then generates entries (see the generate command) and runs
+            add, a report with percentiles, a daily trend, and an export of the
+            entries with and without --profile_output, each in a new process,
+            printing the fastest of --repeat runs of each and the largest phase of
+            each profile.
+            '''),
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser_profile.set_defaults(func=profile_benchmark)
+    parser_profile.add_argument(
+        '-e',
+        '--entries',
+        dest='entries',
+        type=int,
+        default=20000,
+        help='Number of entries to generate. Default is 20000.')
+    parser_profile.add_argument(
+        '-r',
+        '--repeat',
+        dest='repeat',
+        type=int,
+        default=3,
+        help='Number of times each command is run with and without profiling. Default is 3.')
+
+    parser_report = sub_parsers.add_parser(
+        'report',
+        help='Time report generation for increasing numbers of entries.',
+        description=textwrap.dedent('''
+            Fills a temporary database with synthetic entries and times the report
+            query at each of the given sizes, along with the per-group queries
+            that report used to run, to show how each scales with entry count.
+            '''),
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser_report.set_defaults(func=report_benchmark)
+    parser_report.add_argument(
+        '-s',
+        '--sizes',
+        dest='sizes',
+        type=lambda value: sorted(map(int, value.split(','))),
+        default=[ 1000, 10000, 100000 ],
+        help='Comma-separated list of entry counts. Default is 1000,10000,100000.')
+
+    parser_query = sub_parsers.add_parser(
+        'query',
+        help='Time reading each StartupTimesQuery filter.',
+        description=textwrap.dedent('''
+            Fills a temporary database with synthetic entries that vary in device,
+            title, and remote server use, then prints the time taken to read the
+            paged entries, report rows, and phase rows for each filter, both before
+            and after ANALYZE.
+            '''),
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser_query.set_defaults(func=query_benchmark)
+    parser_query.add_argument(
+        '-e',
+        '--entries',
+        dest='entries',
+        type=int,
+        default=100000,
+        help='Number of entries in the database. Default is 100000.')
+    parser_query.add_argument(
+        '-p',
+        '--page_size',
+        dest='page_size',
+        type=int,
+        default=1000,
+        help='Number of entries in each page. Default is 1000.')
+
+    parser_trend = sub_parsers.add_parser(
+        'trend',
+        help='Time the trend command over five years of entries.',
+        description=textwrap.dedent('''
+            Fills a temporary database with synthetic entries spread evenly over
+            five years, then times the trend command (in a new process, including
+            startup) and its query for each bucket size, with filters that can be
+            answered from the daily summaries and with one that has to read the
+            entries.
+            '''),
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser_trend.set_defaults(func=trend_benchmark)
+    parser_trend.add_argument(
+        '-e',
+        '--entries',
+        dest='entries',
+        type=int,
+        default=1000000,
+        help='Number of entries in the database. Default is 1000000.')
+
+    parser_merge = sub_parsers.add_parser(
+        'merge',
+        help='Time merging databases and reporting across them.',
+        description=textwrap.dedent('''
+            Creates several databases of generated entries (see the generate
+            command), then times merging them into a new database, compared with
+            inserting their entries, merging the first database again, and a
+            federated report across them.
+            '''),
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser_merge.set_defaults(func=merge_benchmark)
+    parser_merge.add_argument(
+        '-e',
+        '--entries',
+        dest='entries',
+        type=int,
+        default=100000,
+        help='Number of entries in each database. Default is 100000.')
+    parser_merge.add_argument(
+        '-s',
+        '--shards',
+        dest='shards',
+        type=int,
+        default=3,
+        help='Number of databases. Default is 3.')
+
+    parser_compact = sub_parsers.add_parser(
+        'compact',
+        help='Time compacting old entries and vacuuming the database.',
+        description=textwrap.dedent(f'''
+            Creates a database of a year of generated entries (see the generate
+            command), then compacts the entries from before {COMPACT_BEFORE},
+            interrupting the compaction once about half of them are compacted and
+            timing resuming it, and times vacuuming the database, compacting
+            again, rebuilding the summary tables, and adding all of the entries
+            again (which skips them all). Also times converting a database
+            without auto vacuum.
+            '''),
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser_compact.set_defaults(func=compact_benchmark)
+    parser_compact.add_argument(
+        '-e',
+        '--entries',
+        dest='entries',
+        type=int,
+        default=100000,
+        help='Number of entries in the database. Default is 100000.')
+    parser_compact.add_argument(
+        '--chunk_size',
+        dest='chunk_size',
+        type=int,
+        default=10000,
+        help='Number of entries to compact in each transaction. Default is 10000.')
+
+    parser_cache = sub_parsers.add_parser(
+        'cache',
+        help='Time cached reports.',
+        description=textwrap.dedent('''
+            Creates a database of generated entries (see the generate command),
+            then times each of several report commands in a new process with
+            --no_cache, with an empty report cache, and with the report in the
+            cache, along with the lookup itself.
+            '''),
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser_cache.set_defaults(func=cache_benchmark)
+    parser_cache.add_argument(
+        '-e',
+        '--entries',
+        dest='entries',
+        type=int,
+        default=200000,
+        help='Number of entries in the database. Default is 200000.')
+
+    parser_table = sub_parsers.add_parser(
+        'table',
+        help='Time rendering a very large text table.',
+        description=textwrap.dedent('''
+            Renders a table of synthetic report rows with TextTable, both as a
+            string and written to a temporary file, and compares the time taken
+            with the way TextTable used to render tables. Also times writing a
+            fixed-width table straight from a generator of rows, which never holds
+            all of the rows in memory.
+            '''),
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser_table.set_defaults(func=table_benchmark)
+    parser_table.add_argument(
+        '-r',
+        '--rows',
+        dest='rows',
+        type=int,
+        default=1000000,
+        help='Number of rows. Default is 1000000.')
+
+    parser_migrate = sub_parsers.add_parser(
+        'migrate',
+        help='Time migrating a large database from the original schema.',
+        description=textwrap.dedent('''
+            Creates a temporary database with the original (1.0) schema filled with
+            synthetic entries, then backs it up and migrates it to the current
+            schema, timing the backup, each migration, and a check of the summary
+            tables.
+            '''),
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser_migrate.set_defaults(func=migrate_benchmark)
+    parser_migrate.add_argument(
+        '-e',
+        '--entries',
+        dest='entries',
+        type=int,
+        default=100000,
+        help='Number of entries in the database. Default is 100000.')
+
+    parser_storage = sub_parsers.add_parser(
+        'storage',
+        help='Compare file size and query times before and after interning strings.',
+        description=textwrap.dedent('''
+            Creates a temporary database filled with synthetic entries using the
+            schema in which every Entry and Checkpoint row stores its iTwin version
+            and action as text (1.4), then migrates it to the current schema, in
+            which they are stored once in the Version and Action tables. Prints the
+            vacuumed file size and the time taken by equivalent grouping and
+            sorting queries under each schema. Each entry has six checkpoints, so
+            the default creates 10M checkpoints.
+            '''),
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser_storage.set_defaults(func=storage_benchmark)
+    parser_storage.add_argument(
+        '-e',
+        '--entries',
+        dest='entries',
+        type=int,
+        default=1666667,
+        help='Number of entries in the database. Default is 1666667.')
+
+    parser_export = sub_parsers.add_parser(
+        'export',
+        help='Time exporting checkpoints in each format and check peak memory.',
+        description=textwrap.dedent('''
+            Fills a temporary database with synthetic entries, then exports all of
+            the checkpoints in each format at each of the given sizes. Each export
+            runs in its own process, and its time, output size, and peak resident
+            memory are printed, to show that memory does not grow with the number
+            of rows. Each entry has six checkpoints.
+            '''),
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser_export.set_defaults(func=export_benchmark)
+    parser_export.add_argument(
+        '-s',
+        '--sizes',
+        dest='sizes',
+        type=lambda value: sorted(map(int, value.split(','))),
+        default=[ 100000, 1000000 ],
+        help='Comma-separated list of entry counts. Default is 100000,1000000.')
+
+    parser_ingest = sub_parsers.add_parser(
+        'ingest',
+        help='Time adding many files with and without parallel parsing.',
+        description=textwrap.dedent('''
+            Writes synthetic entry files to a temporary directory, then adds them
+            all to a new database, first parsing the files one at a time in this
+            process, and then with each number of parse processes given with
+            --jobs, printing the throughput of each.
+            '''),
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser_ingest.set_defaults(func=ingest_benchmark)
+    parser_ingest.add_argument(
+        '-f',
+        '--files',
+        dest='files',
+        type=int,
+        default=1000,
+        help='Number of files. Default is 1000.')
+    parser_ingest.add_argument(
+        '-e',
+        '--entries',
+        dest='entries',
+        type=int,
+        default=100,
+        help='Number of entries in each file. Default is 100.')
+    parser_ingest.add_argument(
+        '-j',
+        '--jobs',
+        dest='jobs',
+        type=lambda value: list(map(int, value.split(','))),
+        default=sorted({ 1, os.cpu_count() or 1 }),
+        help='Comma-separated list of parse process counts. Default is 1 and the number of CPUs.')
+
+    parser_logs = sub_parsers.add_parser(
+        'logs',
+        help='Time extracting entries from a large raw log file.',
+        description=textwrap.dedent('''
+            Writes a large temporary log file of noise lines with synthetic entries
+            logged the way ActivityTimer logs them, then times extracting the
+            entries with iter_log_entries. For comparison, also times simply
+            reading the file one line at a time looking for the title.
+            '''),
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser_logs.set_defaults(func=logs_benchmark)
+    parser_logs.add_argument(
+        '-m',
+        '--megabytes',
+        dest='megabytes',
+        type=int,
+        default=500,
+        help='Approximate size of the log file in MB. Default is 500.')
+    parser_logs.add_argument(
+        '-e',
+        '--entries',
+        dest='entries',
+        type=int,
+        default=100,
+        help='Number of entries in the log file. Default is 100.')
+
+    parser_stress = sub_parsers.add_parser(
+        'stress',
+        help='Run concurrent writer and reader processes against one database.',
+        description=textwrap.dedent('''
+            Starts writer processes that all add synthetic entries to the same new
+            database file, half of them the same for every writer, while reader
+            processes repeatedly open it read-only and generate reports. Prints
+            the combined write throughput and the number of reports generated.
+            '''),
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser_stress.set_defaults(func=stress_benchmark)
+    parser_stress.add_argument(
+        '-w',
+        '--writers',
+        dest='writers',
+        type=int,
+        default=8,
+        help='Number of writer processes. Default is 8.')
+    parser_stress.add_argument(
+        '-r',
+        '--readers',
+        dest='readers',
+        type=int,
+        default=8,
+        help='Number of reader processes. Default is 8.')
+    parser_stress.add_argument(
+        '-e',
+        '--entries',
+        dest='entries',
+        type=int,
+        default=10000,
+        help='Number of entries added by each writer. Default is 10000.')
+    parser_stress.add_argument(
+        '-b',
+        '--batch_size',
+        dest='batch_size',
+        type=int,
+        default=100,
+        help='Number of entries each writer inserts per transaction. Default is 100.')
+
+    parser_serve = sub_parsers.add_parser(
+        'serve',
+        help='Load test the serve command with many concurrent clients.',
+        description=textwrap.dedent('''
+            Starts the startuptimes serve command on a new temporary database and
+            runs concurrent keep-alive clients that POST synthetic entries to it,
+            retrying whenever the server applies backpressure with 503. Prints the
+            rate at which requests were accepted and entries were written, then
+            stops the server with SIGTERM.
+            '''),
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser_serve.set_defaults(func=serve_benchmark)
+    parser_serve.add_argument(
+        '-c',
+        '--clients',
+        dest='clients',
+        type=int,
+        default=50,
+        help='Number of concurrent clients. Default is 50.')
+    parser_serve.add_argument(
+        '-e',
+        '--entries',
+        dest='entries',
+        type=int,
+        default=20000,
+        help='Total number of entries to submit. Default is 20000.')
+    parser_serve.add_argument(
+        '-p',
+        '--per_request',
+        dest='per_request',
+        type=int,
+        default=1,
+        help='Number of entries in each request, sent as NDJSON. Default is 1.')
+    parser_serve.add_argument(
+        '-q',
+        '--queue_size',
+        dest='queue_size',
+        type=int,
+        default=100000,
+        help='Queue size passed to the server. Use a small value to test backpressure. '
+             'Default is 100000.')
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == '__main__':
+    main()
@@ -5,19 +5,49 @@
 # See LICENSE.md in the project root for license terms and full copyright notice.
 #---------------------------------------------------------------------------------------------
 
+# pylint: disable=too-many-lines
+
 '''
 Application to maintain a database of startup times for the iTwin Mobile SDK
 samples.
 '''
 
 import argparse
+import asyncio
+import bisect
+import cProfile
+import csv
+import glob
+import hashlib
+import heapq
+import itertools
+import math
+import mmap
+import multiprocessing
+import os
+import random
+import signal
 import sqlite3
 import json
+import statistics
 import sys
 import textwrap
-from typing import Any, Callable, Sequence, TextIO, Union
-from io import TextIOWrapper
+import time
+from datetime import date, datetime, timedelta, timezone
+from typing import (
+    Any, BinaryIO, Callable, Generator, Iterable, Iterator, NamedTuple, Sequence, TextIO, TypeVar,
+    Union
+)
+from array import array
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import (
+    AbstractContextManager, contextmanager, nullcontext, redirect_stderr, redirect_stdout
+)
+from http import HTTPStatus
+from io import StringIO, TextIOWrapper
 from functools import partial
+from pathlib import Path
+from queue import Empty
 
 Record = dict[str, Any]
 Records = Sequence[Record]
@@ -26,22 +56,65 @@ ColumnDef = Union[str, tuple[str, str]]
 ColumnDefs = Sequence[ColumnDef]
 Formatters = Sequence[Callable[[Any], str] | None]
 SQLiteDescription = tuple[tuple[str, None, None, None, None, None, None], ...] | Any
+T = TypeVar('T')
+
+# Number of characters read from the input at a time by iter_json_entries.
+READ_CHUNK_SIZE = 1 << 16
+# Number of entries inserted per transaction by StartupTimesDB.insert_entries.
+DEFAULT_BATCH_SIZE = 1000
+# The number of entries rolled up and deleted per transaction by the compact command.
+DEFAULT_COMPACT_CHUNK_SIZE = 10000
+# Maximum number of reports kept in the report cache of a database.
+DEFAULT_REPORT_CACHE_SIZE = 64
+# Number of rows fetched from a cursor at a time when streaming large query results.
+FETCH_SIZE = 10000
+# Number of seconds a connection waits for another connection to release a lock.
+DEFAULT_BUSY_TIMEOUT = 30.0
+# Number of times StartupTimesDB.retry tries an operation that fails because the database is busy,
+# and the delay in seconds before the first retry. The delay doubles after each retry.
+BUSY_RETRIES = 5
+BUSY_RETRY_DELAY = 0.1
+# Number of parsed batches per worker process that may wait for the database writer in
+# ingest_files, and the number of seconds it waits for a batch before checking that the workers are
+# still running.
+PARSE_AHEAD = 4
+PARSE_POLL_INTERVAL = 1.0
+# Minimum number of seconds between progress updates printed by the add command.
+PROGRESS_INTERVAL = 1.0
+# The default port, maximum number of queued entries, and maximum request header and body sizes in
+# bytes of the serve command.
+DEFAULT_PORT = 8765
+DEFAULT_QUEUE_SIZE = 100000
+MAX_HEADER_SIZE = 1 << 16
+MAX_REQUEST_SIZE = 16 << 20
+# The extensions of the files that are ingested when the add command is given a directory.
+INPUT_EXTENSIONS = ('.json', '.jsonl')
+# The extensions of the files that are scanned when the add command is given a directory with
+# --logs.
+LOG_EXTENSIONS = ('.log', '.txt')
+# The title that the samples pass to ActivityTimer.logTimes.
+LOG_TITLE = 'STARTUP TIMES'
+# Number of bytes after a title in a log first decoded when looking for an entry. This is doubled
+# until the entry fits, up to MAX_LOG_ENTRY_SIZE.
+LOG_WINDOW_SIZE = 1 << 14
+MAX_LOG_ENTRY_SIZE = 1 << 20
 
 class TextTable:
     '''
     Object for generating a text table.
     '''
 
-    __data: Records
-    __column_defs: ColumnDefs
-    __formatters: Formatters | None
-    __max_lengths: list[int]
+    __data: Iterable[Record]
+    __column_defs: list[tuple[str, str]]
+    __formatters: list[Callable[[Any], str]]
+    __widths: list[int] | None
 
     def __init__(
         self,
-        data: Records,
+        data: Iterable[Record],
         column_defs: ColumnDefs,
-        formatters: Formatters | None = None
+        formatters: Formatters | None = None,
+        widths: Sequence[int] | None = None
     ) -> None:
         '''
         Creates an text table containing data, which is a sequence of dict values.
@@ -52,11 +125,30 @@ class TextTable:
         is used to look up values in each `Record` in `data`. If the value in
         `columns` is a tuple, then the second element of the tuple is used as the
         column title. Otherwise, the key is used as the column title.
+
+        If `widths` is given, each column has the corresponding fixed width (or
+        the width of its title, if that is longer), and `data` is only iterated
+        once while writing, so it can be a generator producing more rows than
+        fit in memory. Values longer than their column's width are not
+        truncated. Otherwise, every value is formatted before writing the
+        table to find the widest value in each column.
         '''
 
         self.__data = data
-        self.__column_defs = column_defs
-        self.__formatters = formatters
+        self.__column_defs = [
+            column_def if isinstance(column_def, tuple) else (column_def, column_def)
+            for column_def in column_defs
+        ]
+        self.__formatters = [
+            (formatters[i] if formatters is not None else None) or TextTable.__value_string
+            for i in range(len(self.__column_defs))
+        ]
+        if widths is None:
+            self.__widths = None
+        else:
+            self.__widths = [
+                max(width, len(title)) for (width, (_, title)) in zip(widths, self.__column_defs)
+            ]
 
     @staticmethod
     def __value_string(value: Any) -> str:
@@ -79,94 +171,1167 @@ class TextTable:
         Converts `value` into a string with an 's' suffix and returns it.
 
         Uses `value_string()` to convert the value into a string, then adds the 's'
-        suffix.
+        suffix. None (a statistic that is not available) becomes '-'.
         '''
 
+        if value is None:
+            return '-'
         return f'{TextTable.__value_string(value)}s'
 
-    def __format_value(self, pad, value, max_length, formatter = None) -> str:
-        if formatter is not None:
-            short_string = formatter(value)
-        else:
-            short_string = TextTable.__value_string(value)
-        if isinstance(value, (int, float)):
-            just = short_string.rjust
-        else:
-            just = short_string.ljust
-        return just(max_length, pad)
+    def __format_columns(self, rows: Sequence[Record]) -> list[tuple[list[str], list[bool]]]:
+        '''
+        Formats the values in `rows` one column at a time, formatting each
+        value once.
 
-    def __format_row(
-        self,
-        row: list,
-        use_formatters = False,
+        Returns the cell strings of each column, along with whether each cell
+        should be right-justified (numbers are, everything else is
+        left-justified).
+        '''
+
+        columns = []
+        for ((key, _), formatter) in zip(self.__column_defs, self.__formatters):
+            values = [row[key] for row in rows]
+            columns.append((
+                list(map(formatter, values)),
+                [isinstance(value, (int, float)) for value in values]))
+        return columns
+
+    @staticmethod
+    def __format_lines(
+        columns: Sequence[tuple[list[str], list[bool]]],
+        widths: Sequence[int],
         separator = ' | ',
         pad = ' ') -> str:
         '''
-        Formats the values in row and produces a string where each column in row
-        has a length determined by the corresponding entry in max_lengths, with
-        separator used to separate columns, and pad used to pad the columns to
-        correct length.
+        Produces the lines of a table from the cells in `columns` (see
+        `__format_columns`), where each column has a length determined by the
+        corresponding entry in `widths`, with separator used to separate
+        columns, and pad used to pad the columns to correct length.
+
+        Returns the lines, each with a line feed on the end.
+        '''
+
+        justified = [
+            [
+                cell.rjust(width, pad) if right else cell.ljust(width, pad)
+                for (cell, right) in zip(cells, rights)
+            ]
+            for ((cells, rights), width) in zip(columns, widths)
+        ]
+        return '\n'.join(map(separator.join, zip(*justified))) + '\n'
+
+    def write(self, file: TextIO) -> None:
+        '''
+        Writes the table to `file`, in chunks of `FETCH_SIZE` rows.
 
-        Returns a string representation of row, with a line feed on the end.
+        Nothing is written if there are no rows or no columns.
         '''
 
-        map_args = [ partial(self.__format_value, pad), row, self.__max_lengths ]
-        if use_formatters and self.__formatters is not None:
-            map_args.append(self.__formatters)
-        return separator.join(map(*map_args)) + '\n'
+        if len(self.__column_defs) == 0:
+            return
+        chunks: Iterator[list[tuple[list[str], list[bool]]]]
+        if self.__widths is None:
+            rows = self.__data if isinstance(self.__data, Sequence) else list(self.__data)
+            if len(rows) == 0:
+                return
+            columns = self.__format_columns(rows)
+            widths = [
+                max(len(title), *map(len, cells))
+                for ((_, title), (cells, _)) in zip(self.__column_defs, columns)
+            ]
+            chunks = (
+                [(cells[start:start + FETCH_SIZE], rights[start:start + FETCH_SIZE])
+                 for (cells, rights) in columns]
+                for start in range(0, len(rows), FETCH_SIZE)
+            )
+        else:
+            iterator = iter(self.__data)
+            chunks = map(self.__format_columns,
+                         iter(lambda: list(itertools.islice(iterator, FETCH_SIZE)), []))
+            widths = self.__widths
+        header_written = False
+        for chunk in chunks:
+            if not header_written:
+                file.write(TextTable.__format_lines(
+                    [([title], [False]) for (_, title) in self.__column_defs], widths))
+                file.write(TextTable.__format_lines(
+                    [([''], [False])] * len(widths), widths, '-+-', '-'))
+                header_written = True
+            file.write(TextTable.__format_lines(chunk, widths))
 
     def __str__(self) -> str:
         '''
         Creates an text table based on parameters to the constuctor.
         '''
 
-        if len(self.__data) == 0 or len(self.__column_defs) == 0:
-            return ''
-
-        for i, column_def in enumerate(self.__column_defs):
-            if not isinstance(column_def, tuple):
-                self.__column_defs[i] = (column_def, column_def)
-        header_row = [column_def[1] for column_def in self.__column_defs]
-        self.__max_lengths = list(map(len, header_row))
-        line_row = len(self.__column_defs) * ['']
-        data_values = []
-        for row in self.__data:
-            row_values = []
-            for (key, _) in self.__column_defs:
-                row_values.append(row[key])
-            data_values.append(row_values)
-            for i, length in enumerate(self.__max_lengths):
-                self.__max_lengths[i] = max(length, len(TextTable.__value_string(row_values[i])))
-        result = ''
-        result = result + self.__format_row(header_row)
-        result = result + self.__format_row(line_row, False, '-+-', '-')
-        for row_values in data_values:
-            result = result + self.__format_row(row_values, self.__formatters is not None)
-        return result
+        output = StringIO()
+        self.write(output)
+        return output.getvalue()
+
+# The characters used by sparkline, from the smallest value to the largest.
+SPARKLINE_CHARS = '_.-=+*#@'
+
+def sparkline(values: Sequence[float | None]) -> str:
+    '''
+    Draws `values` as one ASCII character each, scaled from the first of
+    `SPARKLINE_CHARS` for the smallest value to the last for the largest,
+    with a space for each value that is None.
+
+    Returns the line.
+    '''
+
+    present = [value for value in values if value is not None]
+    if len(present) == 0:
+        return ' ' * len(values)
+    (low, high) = (min(present), max(present))
+    top = len(SPARKLINE_CHARS) - 1
+    return ''.join(
+        ' ' if value is None
+        else SPARKLINE_CHARS[round((value - low) / (high - low) * top) if high > low else top // 2]
+        for value in values)
+
+class IngestStats:
+    '''
+    Counts of the work done by `StartupTimesDB.insert_entries`.
+    '''
+
+    inserted: int
+    skipped: int
+    checkpoints: int
+    devices: int
+    seconds: float
+
+    def __init__(self) -> None:
+        self.inserted = 0
+        self.skipped = 0
+        self.checkpoints = 0
+        self.devices = 0
+        self.seconds = 0.0
+
+    def add(self, inserted: int, skipped: int, checkpoints: int, devices: int) -> None:
+        '''
+        Adds the counts for a batch of entries.
+        '''
+
+        self.inserted += inserted
+        self.skipped += skipped
+        self.checkpoints += checkpoints
+        self.devices += devices
+
+    def __str__(self) -> str:
+        '''
+        Creates a one-line summary of the ingestion.
+        '''
+
+        rate = self.inserted / self.seconds if self.seconds > 0 else 0.0
+        return (f'{self.inserted} entries ({self.checkpoints} checkpoints, {self.devices} new '
+                f'devices) inserted in {self.seconds:.3f}s ({rate:.0f} entries/s).')
+
+def statement_keyword(statement: str) -> str:
+    '''
+    Returns the first keyword of the SQL `statement` in upper case, skipping
+    any leading comment lines. Returns '' if `statement` is only comments,
+    which is how SQLite traces the statements that it runs internally.
+    '''
+
+    for line in statement.splitlines():
+        line = line.strip()
+        if len(line) > 0 and not line.startswith('--'):
+            return line.split(None, 1)[0].rstrip(';').upper()
+    return ''
+
+# pylint: disable-next=too-many-instance-attributes
+class Profiler:
+    '''
+    Records where the time goes in a startuptimes command: the wall time spent
+    in each named phase, counts of work done (SQL statements, rows, entries),
+    and optionally a trace of the SQL statements.
+
+    Phases do not overlap: when a phase starts while another one is running,
+    the outer phase is paused until the inner one ends, so the phase times add
+    up to at most the total. Time outside of any phase is reported as 'other'.
+
+    A disabled Profiler (the default) does nothing: `phase` returns a shared
+    no-op context manager, `timed_iter` returns its argument, and no SQLite
+    trace callback is installed, so instrumented code costs next to nothing.
+    '''
+
+    enabled: bool
+    seconds: dict[str, float]
+    calls: dict[str, int]
+    counts: dict[str, int]
+    statements: dict[str, int]
+    __trace_file: TextIO | None
+    __start: float
+    __stack: list[str]
+    __phase: str | None
+    __phase_start: float
+
+    NULL_PHASE: AbstractContextManager = nullcontext()
+
+    def __init__(self, enabled: bool = False, trace_file: TextIO | None = None) -> None:
+        '''
+        Creates a Profiler, which records nothing unless `enabled` is True. If
+        `trace_file` is given, every SQL statement run by a traced connection
+        is also written to it, with its parameter values bound.
+        '''
+
+        self.enabled = enabled
+        self.seconds = {}
+        self.calls = {}
+        self.counts = {}
+        self.statements = {}
+        self.__trace_file = trace_file
+        self.__start = time.perf_counter()
+        self.__stack = []
+        self.__phase = None
+        self.__phase_start = self.__start
+
+    def __enter(self, name: str) -> None:
+        now = time.perf_counter()
+        if self.__phase is not None:
+            self.seconds[self.__phase] += now - self.__phase_start
+        self.__stack.append(self.__phase or '')
+        self.__phase = name
+        self.__phase_start = now
+        self.seconds.setdefault(name, 0.0)
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+    def __exit(self) -> None:
+        now = time.perf_counter()
+        assert self.__phase is not None
+        self.seconds[self.__phase] += now - self.__phase_start
+        self.__phase = self.__stack.pop() or None
+        self.__phase_start = now
+
+    @contextmanager
+    def __timed(self, name: str) -> Iterator[None]:
+        self.__enter(name)
+        try:
+            yield
+        finally:
+            self.__exit()
+
+    def phase(self, name: str) -> AbstractContextManager:
+        '''
+        Returns a context manager that adds the time spent inside it to the
+        phase named `name`.
+        '''
+
+        return self.__timed(name) if self.enabled else Profiler.NULL_PHASE
+
+    def timed_iter(self, name: str, items: Iterable[T], counter: str | None = None) -> Iterable[T]:
+        '''
+        Returns an iterable producing the items of `items`, adding the time
+        spent waiting for each item to the phase named `name`, and counting
+        the items in the counter named `counter` (if given). This is how the
+        time spent in a lazy producer, such as a parser or a query, is
+        separated from the time spent by its consumer.
+        '''
+
+        if not self.enabled:
+            return items
+        return self.__gen_timed(name, items, counter)
+
+    def __gen_timed(self, name: str, items: Iterable[T], counter: str | None) -> Iterator[T]:
+        iterator = iter(items)
+        while True:
+            self.__enter(name)
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                self.__exit()
+            if counter is not None:
+                self.count(counter)
+            yield item
+
+    def count(self, name: str, amount: int = 1) -> None:
+        '''
+        Adds `amount` to the counter named `name`.
+        '''
+
+        if self.enabled:
+            self.counts[name] = self.counts.get(name, 0) + amount
+
+    def __trace(self, statement: str) -> None:
+        keyword = statement_keyword(statement)
+        if len(keyword) > 0:
+            self.statements[keyword] = self.statements.get(keyword, 0) + 1
+        if self.__trace_file is not None:
+            print(statement.strip(), file=self.__trace_file)
+
+    def trace(self, connection: sqlite3.Connection) -> None:
+        '''
+        Counts the SQL statements run by `connection`, by kind, and writes them
+        to the trace file (if any).
+        '''
+
+        if self.enabled:
+            connection.set_trace_callback(self.__trace)
+
+    def summary(self) -> Record:
+        '''
+        Returns the recorded times and counts as a JSON-compatible `Record`.
+        '''
+
+        total = time.perf_counter() - self.__start
+        phases = {
+            name: { 'seconds': seconds, 'calls': self.calls[name] }
+            for (name, seconds) in self.seconds.items()
+        }
+        phases['other'] = { 'seconds': max(total - sum(self.seconds.values()), 0.0), 'calls': 1 }
+        return {
+            'totalSeconds': total,
+            'phases': phases,
+            'statements': dict(self.statements),
+            'counts': dict(self.counts)
+        }
+
+    def write(self, file: TextIO) -> None:
+        '''
+        Writes the summary as text tables to `file`.
+        '''
+
+        summary = self.summary()
+        total = summary['totalSeconds']
+        rows = [
+            {
+                'phase': name,
+                'seconds': phase['seconds'],
+                'percent': f'{100 * phase["seconds"] / total:.1f}%' if total > 0 else '',
+                'calls': phase['calls']
+            }
+            for (name, phase) in summary['phases'].items()
+        ]
+        rows.append({ 'phase': 'total', 'seconds': total, 'percent': '100.0%', 'calls': '' })
+        print('Profile:', file=file)
+        TextTable(
+            rows,
+            [ ('phase', 'Phase'), ('seconds', 'Time'), ('percent', 'Share'), ('calls', 'Calls') ],
+            [ None, TextTable.elapsed_string, None, None ]).write(file)
+        counts = [
+            { 'name': f'{keyword} statements', 'count': count }
+            for (keyword, count) in sorted(summary['statements'].items())
+        ] + [{ 'name': name, 'count': count } for (name, count) in summary['counts'].items()]
+        if len(counts) > 0:
+            print(file=file)
+            TextTable(counts, [ ('name', 'Counter'), ('count', 'Count') ]).write(file)
+
+DeviceKey = tuple[int, int, str, str]
+
+class IngestCache:
+    '''
+    In-memory caches used by `StartupTimesDB.insert_entries` to avoid running
+    lookup queries for every entry.
+
+    The caches are seeded lazily from the database: the device ids and the
+    ids of the names in each dictionary table are all loaded the first time
+    one is looked up, and the timestamps of the existing entries for a device
+    are loaded the first time an entry for that device is seen. After that,
+    they are kept in sync as rows are inserted.
+    '''
+
+    devices: dict[DeviceKey, int] | None
+    entry_timestamps: dict[int, set[str]]
+    names: dict[str, dict[str, int]]
+
+    def __init__(self) -> None:
+        self.devices = None
+        self.entry_timestamps = {}
+        self.names = {}
+
+    @staticmethod
+    def device_key(device: Record) -> DeviceKey:
+        '''
+        Returns the tuple that uniquely identifies `device` in the Device
+        table.
+        '''
+
+        return (device['cpuCores'], device['memory'], device['modelID'], device['systemVersion'])
+
+    def find_device_id(self, db: 'StartupTimesDB', device: Record) -> int:
+        '''
+        Returns the id of `device`, adding it to `db` (without committing) if
+        it is not already present.
+        '''
+
+        if self.devices is None:
+            cur = db.cursor()
+            cur.execute('SELECT cpuCores, memory, modelID, systemVersion, id FROM Device')
+            self.devices = { row[:4]: row[4] for row in cur }
+        key = IngestCache.device_key(device)
+        device_id = self.devices.get(key)
+        if device_id is None:
+            device_id = db.find_device_id(device, False)
+            self.devices[key] = device_id
+        return device_id
+
+    def timestamps(self, db: 'StartupTimesDB', device_id: int) -> set[str]:
+        '''
+        Returns the set of timestamps of the entries in `db` that belong to the
+        device with the given id.
+        '''
+
+        timestamps = self.entry_timestamps.get(device_id)
+        if timestamps is None:
+            cur = db.cursor()
+            cur.execute('SELECT timestamp FROM Entry WHERE deviceID = ?', [ device_id ])
+            timestamps = { row[0] for row in cur }
+            self.entry_timestamps[device_id] = timestamps
+        return timestamps
+
+    def intern(self, db: 'StartupTimesDB', table_name: str, name: str) -> int:
+        '''
+        Returns the id of `name` in the dictionary table named `table_name`
+        (Version or Action), adding it to `db` (without committing) if it is
+        not already present.
+        '''
+
+        ids = self.names.get(table_name)
+        if ids is None:
+            cur = db.cursor()
+            cur.execute(f'SELECT name, id FROM {table_name}')
+            ids = dict(cur.fetchall())
+            self.names[table_name] = ids
+        name_id = ids.get(name)
+        if name_id is None:
+            cur = db.cursor()
+            cur.execute(f'INSERT OR IGNORE INTO {table_name}(name) VALUES (?)', [ name ])
+            cur.execute(f'SELECT id FROM {table_name} WHERE name = ?', [ name ])
+            name_id = ids[name] = cur.fetchone()[0]
+        return name_id
+
+# Adds the totalTime statistics of the Entry rows matching {where} to EntrySummary.
+SUMMARIZE_ENTRIES_SQL = '''
+    INSERT INTO EntrySummary(deviceID, versionID, count, sum, sumSquares, min, max)
+        SELECT
+            deviceID,
+            versionID,
+            COUNT(*),
+            SUM(totalTime),
+            SUM(totalTime * totalTime),
+            MIN(totalTime),
+            MAX(totalTime)
+        FROM Entry
+        WHERE {where}
+        GROUP BY deviceID, versionID
+    ON CONFLICT(deviceID, versionID) DO UPDATE SET
+        count = count + excluded.count,
+        sum = sum + excluded.sum,
+        sumSquares = sumSquares + excluded.sumSquares,
+        min = MIN(min, excluded.min),
+        max = MAX(max, excluded.max)
+'''
+
+# Adds the step statistics of the Checkpoint rows matching {where} to CheckpointSummary.
+SUMMARIZE_CHECKPOINTS_SQL = '''
+    INSERT INTO CheckpointSummary(
+        deviceID, versionID, actionID, firstIndex, count, sum, sumSquares, min, max
+    )
+        SELECT
+            Entry.deviceID,
+            Entry.versionID,
+            Checkpoint.actionID,
+            MIN(Checkpoint.arrayIndex),
+            COUNT(*),
+            SUM(Checkpoint.step),
+            SUM(Checkpoint.step * Checkpoint.step),
+            MIN(Checkpoint.step),
+            MAX(Checkpoint.step)
+        FROM Checkpoint JOIN Entry ON Checkpoint.entryID = Entry.id
+        WHERE {where}
+        GROUP BY Entry.deviceID, Entry.versionID, Checkpoint.actionID
+    ON CONFLICT(deviceID, versionID, actionID) DO UPDATE SET
+        firstIndex = MIN(firstIndex, excluded.firstIndex),
+        count = count + excluded.count,
+        sum = sum + excluded.sum,
+        sumSquares = sumSquares + excluded.sumSquares,
+        min = MIN(min, excluded.min),
+        max = MAX(max, excluded.max)
+'''
+
+# Adds the totalTime statistics of the Entry rows matching {where} to EntryDaySummary, grouped by
+# UTC day. Entries whose timestamp cannot be parsed (so epochMillis is NULL) are left out.
+SUMMARIZE_ENTRY_DAYS_SQL = '''
+    INSERT INTO EntryDaySummary(deviceID, versionID, day, count, sum, sumSquares, min, max)
+        SELECT
+            deviceID,
+            versionID,
+            epochMillis / 86400000 AS day,
+            COUNT(*),
+            SUM(totalTime),
+            SUM(totalTime * totalTime),
+            MIN(totalTime),
+            MAX(totalTime)
+        FROM Entry
+        WHERE {where} AND epochMillis IS NOT NULL
+        GROUP BY deviceID, versionID, day
+    ON CONFLICT(deviceID, versionID, day) DO UPDATE SET
+        count = count + excluded.count,
+        sum = sum + excluded.sum,
+        sumSquares = sumSquares + excluded.sumSquares,
+        min = MIN(min, excluded.min),
+        max = MAX(max, excluded.max)
+'''
+
+# Adds the totalTime statistics of the Entry rows matching {where} to EntryRollup, grouped by UTC
+# day, before they are deleted by compaction.
+ROLLUP_ENTRIES_SQL = '''
+    INSERT INTO EntryRollup(deviceID, versionID, day, count, sum, sumSquares, min, max)
+        SELECT
+            deviceID,
+            versionID,
+            epochMillis / 86400000 AS day,
+            COUNT(*),
+            SUM(totalTime),
+            SUM(totalTime * totalTime),
+            MIN(totalTime),
+            MAX(totalTime)
+        FROM Entry
+        WHERE {where}
+        GROUP BY deviceID, versionID, day
+    ON CONFLICT(deviceID, versionID, day) DO UPDATE SET
+        count = count + excluded.count,
+        sum = sum + excluded.sum,
+        sumSquares = sumSquares + excluded.sumSquares,
+        min = MIN(min, excluded.min),
+        max = MAX(max, excluded.max)
+'''
+
+# Adds the step statistics of the Checkpoint rows of the Entry rows matching {where} to
+# CheckpointRollup, grouped by UTC day, before they are deleted by compaction.
+ROLLUP_CHECKPOINTS_SQL = '''
+    INSERT INTO CheckpointRollup(
+        deviceID, versionID, actionID, day, firstIndex, count, sum, sumSquares, min, max
+    )
+        SELECT
+            Entry.deviceID,
+            Entry.versionID,
+            Checkpoint.actionID,
+            Entry.epochMillis / 86400000 AS day,
+            MIN(Checkpoint.arrayIndex),
+            COUNT(*),
+            SUM(Checkpoint.step),
+            SUM(Checkpoint.step * Checkpoint.step),
+            MIN(Checkpoint.step),
+            MAX(Checkpoint.step)
+        FROM Checkpoint JOIN Entry ON Checkpoint.entryID = Entry.id
+        WHERE {where}
+        GROUP BY Entry.deviceID, Entry.versionID, Checkpoint.actionID, day
+    ON CONFLICT(deviceID, versionID, actionID, day) DO UPDATE SET
+        firstIndex = MIN(firstIndex, excluded.firstIndex),
+        count = count + excluded.count,
+        sum = sum + excluded.sum,
+        sumSquares = sumSquares + excluded.sumSquares,
+        min = MIN(min, excluded.min),
+        max = MAX(max, excluded.max)
+'''
+
+# Select the totalTime and step values of the Entry rows matching {where} and their Checkpoint rows,
+# grouped like ROLLUP_ENTRIES_SQL and ROLLUP_CHECKPOINTS_SQL and sorted for iter_sorted_groups, so
+# that compaction can merge them into the value blobs of the rollup rows.
+ROLLUP_ENTRY_VALUES_SQL = '''
+    SELECT deviceID, versionID, epochMillis / 86400000 AS day, totalTime
+        FROM Entry
+        WHERE {where}
+        ORDER BY deviceID, versionID, day, totalTime
+'''
+ROLLUP_CHECKPOINT_VALUES_SQL = '''
+    SELECT
+        Entry.deviceID,
+        Entry.versionID,
+        Checkpoint.actionID,
+        Entry.epochMillis / 86400000 AS day,
+        Checkpoint.step
+    FROM Checkpoint JOIN Entry ON Checkpoint.entryID = Entry.id
+    WHERE {where}
+    ORDER BY Entry.deviceID, Entry.versionID, Checkpoint.actionID, day, Checkpoint.step
+'''
+
+# Add the statistics of the compacted entries in EntryRollup and CheckpointRollup to the summary
+# tables, which are otherwise computed from the raw rows by rebuild_summaries.
+SUMMARIZE_ENTRY_ROLLUPS_SQL = '''
+    INSERT INTO EntrySummary(deviceID, versionID, count, sum, sumSquares, min, max)
+        SELECT deviceID, versionID, SUM(count), SUM(sum), SUM(sumSquares), MIN(min), MAX(max)
+        FROM EntryRollup
+        GROUP BY deviceID, versionID
+    ON CONFLICT(deviceID, versionID) DO UPDATE SET
+        count = count + excluded.count,
+        sum = sum + excluded.sum,
+        sumSquares = sumSquares + excluded.sumSquares,
+        min = MIN(min, excluded.min),
+        max = MAX(max, excluded.max)
+'''
+SUMMARIZE_CHECKPOINT_ROLLUPS_SQL = '''
+    INSERT INTO CheckpointSummary(
+        deviceID, versionID, actionID, firstIndex, count, sum, sumSquares, min, max
+    )
+        SELECT
+            deviceID,
+            versionID,
+            actionID,
+            MIN(firstIndex),
+            SUM(count),
+            SUM(sum),
+            SUM(sumSquares),
+            MIN(min),
+            MAX(max)
+        FROM CheckpointRollup
+        GROUP BY deviceID, versionID, actionID
+    ON CONFLICT(deviceID, versionID, actionID) DO UPDATE SET
+        firstIndex = MIN(firstIndex, excluded.firstIndex),
+        count = count + excluded.count,
+        sum = sum + excluded.sum,
+        sumSquares = sumSquares + excluded.sumSquares,
+        min = MIN(min, excluded.min),
+        max = MAX(max, excluded.max)
+'''
+SUMMARIZE_ENTRY_DAY_ROLLUPS_SQL = '''
+    INSERT INTO EntryDaySummary(deviceID, versionID, day, count, sum, sumSquares, min, max)
+        SELECT deviceID, versionID, day, count, sum, sumSquares, min, max
+            FROM EntryRollup WHERE true
+    ON CONFLICT(deviceID, versionID, day) DO UPDATE SET
+        count = count + excluded.count,
+        sum = sum + excluded.sum,
+        sumSquares = sumSquares + excluded.sumSquares,
+        min = MIN(min, excluded.min),
+        max = MAX(max, excluded.max)
+'''
+
+def is_busy_error(error: sqlite3.Error) -> bool:
+    '''
+    Returns True if `error` was caused by another connection holding a lock
+    on the database.
+    '''
+
+    code = getattr(error, 'sqlite_errorcode', None)
+    if code is not None:
+        return code & 0xff in (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED)
+    return str(error).startswith(('database is locked', 'database table is locked'))
+
+def split_sql_statements(script: str) -> list[str]:
+    '''
+    Splits `script` into its individual SQL statements, so that they can be
+    run inside a transaction started with `BEGIN IMMEDIATE`. (Running them with
+    `executescript` would first commit that transaction.)
+    '''
+
+    statements = []
+    statement = ''
+    for part in script.split(';'):
+        statement += part + ';'
+        # A semicolon inside a string literal or comment does not end the statement.
+        if sqlite3.complete_statement(statement):
+            statements.append(statement)
+            statement = ''
+    return statements
+
+class Migration(NamedTuple):
+    '''
+    One step in the evolution of the StartupTimes database schema. Running
+    `sql` upgrades the previous version of the schema to `version`.
+
+    Migrations that rebuild a table that other tables reference must set
+    `foreign_keys` to False, so that dropping the old table does not cascade
+    or fail. The foreign keys are checked before such a migration commits.
+    '''
+
+    version: str
+    description: str
+    sql: str
+    foreign_keys: bool = True
+
+def schema_version_key(version: str) -> tuple[int, ...]:
+    '''
+    Returns a sort key for the schema version string `version`.
+    '''
 
+    return tuple(map(int, version.split('.')))
+
+# pylint: disable-next=too-many-public-methods
 class StartupTimesDB:
     '''
     Object for dealing with the StartupTimes sqlite3 database.
     '''
 
+    # The schema version created by __create_tables. MIGRATIONS upgrades the schema from there.
+    BASE_SCHEMA_VERSION = '1.0'
+    # The ordered list of schema migrations. Each applied migration is recorded in Props.
+    MIGRATIONS: list[Migration] = [
+        Migration('1.1', 'Merge duplicate devices and entries and add UNIQUE lookup indices', '''
+            -- Merge duplicate devices and entries that could be created by concurrent writers
+            -- before the UNIQUE indices below existed.
+            UPDATE Entry SET deviceID = (
+                SELECT MIN(Duplicate.id) FROM Device, Device AS Duplicate
+                    WHERE Device.id = Entry.deviceID
+                    AND Duplicate.cpuCores = Device.cpuCores
+                    AND Duplicate.memory = Device.memory
+                    AND Duplicate.modelID = Device.modelID
+                    AND Duplicate.systemVersion = Device.systemVersion
+            );
+            DELETE FROM Device WHERE id NOT IN (
+                SELECT MIN(id) FROM Device GROUP BY cpuCores, memory, modelID, systemVersion
+            );
+            DELETE FROM Checkpoint WHERE entryID NOT IN (
+                SELECT MIN(id) FROM Entry GROUP BY deviceID, timestamp
+            );
+            DELETE FROM Entry WHERE id NOT IN (
+                SELECT MIN(id) FROM Entry GROUP BY deviceID, timestamp
+            );
+            CREATE UNIQUE INDEX Device_lookup ON Device(cpuCores, memory, modelID, systemVersion);
+            CREATE UNIQUE INDEX Entry_lookup ON Entry(deviceID, timestamp);
+        '''),
+        Migration('1.2', 'Add a covering index for checkpoints by entry and action', '''
+            -- Lets the phases report find the checkpoints of each entry by action without reading
+            -- the Checkpoint table itself.
+            CREATE INDEX Checkpoint_entryID_action ON Checkpoint(entryID, action, arrayIndex, step);
+        '''),
+        Migration('1.3', 'Add the EntrySummary and CheckpointSummary tables', '''
+            -- Running totals for each (device, iTwinVersion) and (device, iTwinVersion, action),
+            -- kept up to date by insert_entries so that reports do not have to scan the raw rows.
+            CREATE TABLE EntrySummary(
+                deviceID INTEGER NOT NULL,
+                iTwinVersion TEXT NOT NULL,
+                count INTEGER NOT NULL,
+                sum REAL NOT NULL,
+                sumSquares REAL NOT NULL,
+                min REAL NOT NULL,
+                max REAL NOT NULL,
+                PRIMARY KEY(deviceID, iTwinVersion),
+                FOREIGN KEY(deviceID) REFERENCES Device(id)
+            ) WITHOUT ROWID;
+            CREATE TABLE CheckpointSummary(
+                deviceID INTEGER NOT NULL,
+                iTwinVersion TEXT NOT NULL,
+                action TEXT NOT NULL,
+                firstIndex INTEGER NOT NULL,
+                count INTEGER NOT NULL,
+                sum REAL NOT NULL,
+                sumSquares REAL NOT NULL,
+                min REAL NOT NULL,
+                max REAL NOT NULL,
+                PRIMARY KEY(deviceID, iTwinVersion, action),
+                FOREIGN KEY(deviceID) REFERENCES Device(id)
+            ) WITHOUT ROWID;
+            INSERT INTO EntrySummary(deviceID, iTwinVersion, count, sum, sumSquares, min, max)
+                SELECT
+                    deviceID,
+                    iTwinVersion,
+                    COUNT(*),
+                    SUM(totalTime),
+                    SUM(totalTime * totalTime),
+                    MIN(totalTime),
+                    MAX(totalTime)
+                FROM Entry
+                GROUP BY deviceID, iTwinVersion;
+            INSERT INTO CheckpointSummary(
+                deviceID, iTwinVersion, action, firstIndex, count, sum, sumSquares, min, max
+            )
+                SELECT
+                    Entry.deviceID,
+                    Entry.iTwinVersion,
+                    Checkpoint.action,
+                    MIN(Checkpoint.arrayIndex),
+                    COUNT(*),
+                    SUM(Checkpoint.step),
+                    SUM(Checkpoint.step * Checkpoint.step),
+                    MIN(Checkpoint.step),
+                    MAX(Checkpoint.step)
+                FROM Checkpoint JOIN Entry ON Checkpoint.entryID = Entry.id
+                GROUP BY Entry.deviceID, Entry.iTwinVersion, Checkpoint.action;
+            INSERT INTO Props(namespace, name, value)
+                VALUES ('startuptimes', 'summaryTables', 'EntrySummary,CheckpointSummary');
+        '''),
+        Migration('1.4', 'Add a covering index for totalTime by device and version', '''
+            -- Lets the percentile and regression queries read totalTime already sorted by group.
+            CREATE INDEX Entry_deviceID_iTwinVersion ON Entry(deviceID, iTwinVersion, totalTime);
+            ANALYZE;
+        '''),
+        Migration('1.5', 'Store iTwin versions and checkpoint actions in dictionary tables', '''
+            -- Each distinct iTwinVersion and action string is stored once, and Entry, Checkpoint,
+            -- and the summary tables refer to it by id. This rebuilds those tables.
+            CREATE TABLE Version(
+                id INTEGER PRIMARY KEY,
+                name TEXT NOT NULL UNIQUE
+            );
+            CREATE TABLE Action(
+                id INTEGER PRIMARY KEY,
+                name TEXT NOT NULL UNIQUE
+            );
+            INSERT INTO Version(name) SELECT DISTINCT iTwinVersion FROM Entry ORDER BY iTwinVersion;
+            INSERT INTO Action(name) SELECT DISTINCT action FROM Checkpoint ORDER BY action;
+
+            CREATE TABLE NewEntry(
+                id INTEGER PRIMARY KEY,
+                versionID INTEGER NOT NULL,
+                title TEXT NOT NULL,
+                timestamp TEXT NOT NULL,
+                totalTime REAL NOT NULL,
+                usingRemoteServer INT NOT NULL,
+                deviceID INT NOT NULL,
+                FOREIGN KEY(deviceID) REFERENCES Device(id),
+                FOREIGN KEY(versionID) REFERENCES Version(id)
+            );
+            INSERT INTO NewEntry(id, versionID, title, timestamp, totalTime, usingRemoteServer, deviceID)
+                SELECT Entry.id, Version.id, title, timestamp, totalTime, usingRemoteServer, deviceID
+                FROM Entry JOIN Version ON Version.name = Entry.iTwinVersion
+                ORDER BY Entry.id;
+            DROP TABLE Entry;
+            ALTER TABLE NewEntry RENAME TO Entry;
+            CREATE INDEX Entry_timestamp ON Entry(timestamp);
+            CREATE UNIQUE INDEX Entry_lookup ON Entry(deviceID, timestamp);
+            CREATE INDEX Entry_deviceID_versionID ON Entry(deviceID, versionID, totalTime);
+
+            -- Checkpoint_arrayIndex is not recreated: no query looks checkpoints up by arrayIndex
+            -- alone.
+            CREATE TABLE NewCheckpoint(
+                id INTEGER PRIMARY KEY,
+                entryID INTEGER NOT NULL,
+                arrayIndex INT NOT NULL,
+                actionID INTEGER NOT NULL,
+                timestamp TEXT NOT NULL,
+                step REAL NOT NULL,
+                total REAL NOT NULL,
+                FOREIGN KEY(entryID) REFERENCES Entry(id),
+                FOREIGN KEY(actionID) REFERENCES Action(id)
+            );
+            INSERT INTO NewCheckpoint(id, entryID, arrayIndex, actionID, timestamp, step, total)
+                SELECT Checkpoint.id, entryID, arrayIndex, Action.id, timestamp, step, total
+                FROM Checkpoint JOIN Action ON Action.name = Checkpoint.action
+                ORDER BY Checkpoint.id;
+            DROP TABLE Checkpoint;
+            ALTER TABLE NewCheckpoint RENAME TO Checkpoint;
+            CREATE INDEX Checkpoint_entryID_actionID ON Checkpoint(entryID, actionID, arrayIndex, step);
+
+            CREATE TABLE NewEntrySummary(
+                deviceID INTEGER NOT NULL,
+                versionID INTEGER NOT NULL,
+                count INTEGER NOT NULL,
+                sum REAL NOT NULL,
+                sumSquares REAL NOT NULL,
+                min REAL NOT NULL,
+                max REAL NOT NULL,
+                PRIMARY KEY(deviceID, versionID),
+                FOREIGN KEY(deviceID) REFERENCES Device(id),
+                FOREIGN KEY(versionID) REFERENCES Version(id)
+            ) WITHOUT ROWID;
+            INSERT INTO NewEntrySummary(deviceID, versionID, count, sum, sumSquares, min, max)
+                SELECT deviceID, Version.id, count, sum, sumSquares, min, max
+                FROM EntrySummary JOIN Version ON Version.name = EntrySummary.iTwinVersion;
+            DROP TABLE EntrySummary;
+            ALTER TABLE NewEntrySummary RENAME TO EntrySummary;
+
+            CREATE TABLE NewCheckpointSummary(
+                deviceID INTEGER NOT NULL,
+                versionID INTEGER NOT NULL,
+                actionID INTEGER NOT NULL,
+                firstIndex INTEGER NOT NULL,
+                count INTEGER NOT NULL,
+                sum REAL NOT NULL,
+                sumSquares REAL NOT NULL,
+                min REAL NOT NULL,
+                max REAL NOT NULL,
+                PRIMARY KEY(deviceID, versionID, actionID),
+                FOREIGN KEY(deviceID) REFERENCES Device(id),
+                FOREIGN KEY(versionID) REFERENCES Version(id),
+                FOREIGN KEY(actionID) REFERENCES Action(id)
+            ) WITHOUT ROWID;
+            INSERT INTO NewCheckpointSummary(
+                deviceID, versionID, actionID, firstIndex, count, sum, sumSquares, min, max
+            )
+                SELECT deviceID, Version.id, Action.id, firstIndex, count, sum, sumSquares, min, max
+                FROM CheckpointSummary
+                JOIN Version ON Version.name = CheckpointSummary.iTwinVersion
+                JOIN Action ON Action.name = CheckpointSummary.action;
+            DROP TABLE CheckpointSummary;
+            ALTER TABLE NewCheckpointSummary RENAME TO CheckpointSummary;
+
+            -- Views with the original shape of the Entry and Checkpoint tables, for ad hoc queries.
+            CREATE VIEW EntryView AS
+                SELECT
+                    Entry.id,
+                    Version.name AS iTwinVersion,
+                    Entry.title,
+                    Entry.timestamp,
+                    Entry.totalTime,
+                    Entry.usingRemoteServer,
+                    Entry.deviceID
+                FROM Entry JOIN Version ON Version.id = Entry.versionID;
+            CREATE VIEW CheckpointView AS
+                SELECT
+                    Checkpoint.id,
+                    Checkpoint.entryID,
+                    Checkpoint.arrayIndex,
+                    Action.name AS action,
+                    Checkpoint.timestamp,
+                    Checkpoint.step,
+                    Checkpoint.total
+                FROM Checkpoint JOIN Action ON Action.id = Checkpoint.actionID;
+            ANALYZE;
+        ''', foreign_keys=False),
+        Migration('1.6', 'Add indexes for filtering entries by title and usingRemoteServer', '''
+            -- Let StartupTimesQuery filter on these columns and page through the matching entries in
+            -- (timestamp, id) order without scanning Entry.
+            CREATE INDEX Entry_title ON Entry(title, timestamp);
+            CREATE INDEX Entry_usingRemoteServer ON Entry(usingRemoteServer, timestamp);
+            ANALYZE Entry;
+        '''),
+        Migration('1.7', 'Add Entry.epochMillis and the EntryDaySummary table for trends', '''
+            -- The timestamp as milliseconds since the Unix epoch (UTC), or NULL if it cannot be
+            -- parsed. It is computed from timestamp, so inserting entries does not change.
+            ALTER TABLE Entry ADD COLUMN epochMillis INTEGER GENERATED ALWAYS AS (
+                CAST(ROUND((julianday(timestamp) - 2440587.5) * 86400000) AS INTEGER)
+            ) VIRTUAL;
+            -- Running totals for each (device, iTwinVersion, UTC day), kept up to date by
+            -- insert_entries so that trends do not have to scan the raw rows. day is the number of
+            -- days since 1970-01-01.
+            CREATE TABLE EntryDaySummary(
+                deviceID INTEGER NOT NULL,
+                versionID INTEGER NOT NULL,
+                day INTEGER NOT NULL,
+                count INTEGER NOT NULL,
+                sum REAL NOT NULL,
+                sumSquares REAL NOT NULL,
+                min REAL NOT NULL,
+                max REAL NOT NULL,
+                PRIMARY KEY(deviceID, versionID, day),
+                FOREIGN KEY(deviceID) REFERENCES Device(id),
+                FOREIGN KEY(versionID) REFERENCES Version(id)
+            ) WITHOUT ROWID;
+            INSERT INTO EntryDaySummary(deviceID, versionID, day, count, sum, sumSquares, min, max)
+                SELECT
+                    deviceID,
+                    versionID,
+                    epochMillis / 86400000 AS day,
+                    COUNT(*),
+                    SUM(totalTime),
+                    SUM(totalTime * totalTime),
+                    MIN(totalTime),
+                    MAX(totalTime)
+                FROM Entry
+                WHERE epochMillis IS NOT NULL
+                GROUP BY deviceID, versionID, day;
+            UPDATE Props SET value = 'EntrySummary,CheckpointSummary,EntryDaySummary'
+                WHERE namespace = 'startuptimes' AND name = 'summaryTables';
+        '''),
+        Migration('1.8', 'Add the EntryRollup and CheckpointRollup tables for compaction', '''
+            -- The statistics of the entries and checkpoints that the compact command deleted,
+            -- for each (device, iTwinVersion, UTC day) and (device, iTwinVersion, action, UTC day).
+            -- The summary tables include these, so rebuild_summaries adds them back in. The sorted
+            -- totalTime and step values are kept as blobs of doubles (see rollup_blob) for the
+            -- distribution statistics and regressions.
+            CREATE TABLE EntryRollup(
+                deviceID INTEGER NOT NULL,
+                versionID INTEGER NOT NULL,
+                day INTEGER NOT NULL,
+                count INTEGER NOT NULL,
+                sum REAL NOT NULL,
+                sumSquares REAL NOT NULL,
+                min REAL NOT NULL,
+                max REAL NOT NULL,
+                totalTimes BLOB NOT NULL DEFAULT X'',
+                PRIMARY KEY(deviceID, versionID, day),
+                FOREIGN KEY(deviceID) REFERENCES Device(id),
+                FOREIGN KEY(versionID) REFERENCES Version(id)
+            ) WITHOUT ROWID;
+            CREATE TABLE CheckpointRollup(
+                deviceID INTEGER NOT NULL,
+                versionID INTEGER NOT NULL,
+                actionID INTEGER NOT NULL,
+                day INTEGER NOT NULL,
+                firstIndex INTEGER NOT NULL,
+                count INTEGER NOT NULL,
+                sum REAL NOT NULL,
+                sumSquares REAL NOT NULL,
+                min REAL NOT NULL,
+                max REAL NOT NULL,
+                steps BLOB NOT NULL DEFAULT X'',
+                PRIMARY KEY(deviceID, versionID, actionID, day),
+                FOREIGN KEY(deviceID) REFERENCES Device(id),
+                FOREIGN KEY(versionID) REFERENCES Version(id),
+                FOREIGN KEY(actionID) REFERENCES Action(id)
+            ) WITHOUT ROWID;
+        '''),
+    ]
+    SCHEMA_VERSION = MIGRATIONS[-1].version
+
+    # The SQL used by insert_entries. These are kept constant so that sqlite3's statement cache
+    # reuses the prepared statements across batches.
+    INSERT_ENTRY_SQL = '''
+        INSERT OR IGNORE INTO Entry(id, versionID, title, timestamp, totalTime, usingRemoteServer, deviceID)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+    '''
+    INSERT_CHECKPOINT_SQL = '''
+        INSERT INTO Checkpoint(entryID, arrayIndex, actionID, timestamp, step, total)
+            VALUES (?, ?, ?, ?, ?, ?)
+    '''
+    SELECT_DEVICE_SQL = '''
+        SELECT id FROM Device
+            WHERE cpuCores = :cpuCores
+            AND memory = :memory
+            AND modelID = :modelID
+            AND systemVersion = :systemVersion
+    '''
+    # Device_lookup makes this a no-op if another process already added the device.
+    UPSERT_DEVICE_SQL = '''
+        INSERT INTO Device(cpuCores, memory, model, modelID, modelIDRefURL, systemName, systemVersion)
+            VALUES (:cpuCores, :memory, :model, :modelID, :modelIDRefURL, :systemName, :systemVersion)
+            ON CONFLICT(cpuCores, memory, modelID, systemVersion) DO NOTHING
+    '''
+    # Bumps the change counter (see `change_counter`) in the transaction that runs it.
+    BUMP_CHANGE_COUNTER_SQL = '''
+        INSERT INTO Props(namespace, name, value) VALUES ('startuptimes', 'changeCounter', '1')
+        ON CONFLICT(namespace, name) DO UPDATE SET value = value + 1
+    '''
+    # Bounding the range of ids at both ends makes SQLite search it by rowid, rather than read
+    # all of Entry through an index in GROUP BY order.
+    UPDATE_ENTRY_SUMMARY_SQL = SUMMARIZE_ENTRIES_SQL.format(where='Entry.id BETWEEN ? AND ?')
+    UPDATE_CHECKPOINT_SUMMARY_SQL = SUMMARIZE_CHECKPOINTS_SQL.format(
+        where='Checkpoint.entryID BETWEEN ? AND ?')
+    UPDATE_ENTRY_DAY_SUMMARY_SQL = SUMMARIZE_ENTRY_DAYS_SQL.format(where='Entry.id BETWEEN ? AND ?')
+    # Copies the entries of the database attached as Source that are not already present (see
+    # `merge`). Temporary tables map the Source ids of the devices, versions, and actions to the
+    # ids of the matching rows, and each copied entry to its new id, starting at :firstID.
+    MERGE_SQL = [
+        'INSERT OR IGNORE INTO main.Version(name) SELECT name FROM Source.Version ORDER BY id',
+        'INSERT OR IGNORE INTO main.Action(name) SELECT name FROM Source.Action ORDER BY id',
+        # The WHERE clause keeps SQLite from parsing ON CONFLICT as a join constraint.
+        '''
+        INSERT INTO main.Device(
+                cpuCores, memory, model, modelID, modelIDRefURL, systemName, systemVersion)
+            SELECT cpuCores, memory, model, modelID, modelIDRefURL, systemName, systemVersion
+                FROM Source.Device WHERE true ORDER BY id
+            ON CONFLICT(cpuCores, memory, modelID, systemVersion) DO NOTHING
+        ''',
+        'CREATE TEMP TABLE DeviceMap(sourceID INTEGER PRIMARY KEY, id INTEGER NOT NULL)',
+        '''
+        INSERT INTO temp.DeviceMap
+            SELECT SourceDevice.id, Device.id
+            FROM Source.Device AS SourceDevice
+            JOIN main.Device USING (cpuCores, memory, modelID, systemVersion)
+        ''',
+        'CREATE TEMP TABLE VersionMap(sourceID INTEGER PRIMARY KEY, id INTEGER NOT NULL)',
+        '''
+        INSERT INTO temp.VersionMap
+            SELECT SourceVersion.id, Version.id
+            FROM Source.Version AS SourceVersion JOIN main.Version USING (name)
+        ''',
+        'CREATE TEMP TABLE ActionMap(sourceID INTEGER PRIMARY KEY, id INTEGER NOT NULL)',
+        '''
+        INSERT INTO temp.ActionMap
+            SELECT SourceAction.id, Action.id
+            FROM Source.Action AS SourceAction JOIN main.Action USING (name)
+        ''',
+        'CREATE TEMP TABLE EntryMap(sourceID INTEGER PRIMARY KEY, id INTEGER NOT NULL)',
+        # Entries from before :compactedBefore are skipped, as insert_entries does.
+        '''
+        INSERT INTO temp.EntryMap
+            SELECT SourceEntry.id, :firstID - 1 + ROW_NUMBER() OVER (ORDER BY SourceEntry.id)
+            FROM Source.Entry AS SourceEntry
+            JOIN temp.DeviceMap ON DeviceMap.sourceID = SourceEntry.deviceID
+            WHERE NOT EXISTS (
+                SELECT 1 FROM main.Entry
+                    WHERE Entry.deviceID = DeviceMap.id AND Entry.timestamp = SourceEntry.timestamp)
+            AND NOT COALESCE(SourceEntry.epochMillis < :compactedBefore, false)
+        ''',
+        '''
+        INSERT INTO main.Entry(
+                id, versionID, title, timestamp, totalTime, usingRemoteServer, deviceID)
+            SELECT
+                EntryMap.id,
+                VersionMap.id,
+                SourceEntry.title,
+                SourceEntry.timestamp,
+                SourceEntry.totalTime,
+                SourceEntry.usingRemoteServer,
+                DeviceMap.id
+            FROM temp.EntryMap
+            JOIN Source.Entry AS SourceEntry ON SourceEntry.id = EntryMap.sourceID
+            JOIN temp.DeviceMap ON DeviceMap.sourceID = SourceEntry.deviceID
+            JOIN temp.VersionMap ON VersionMap.sourceID = SourceEntry.versionID
+            ORDER BY EntryMap.id
+        ''',
+        '''
+        INSERT INTO main.Checkpoint(entryID, arrayIndex, actionID, timestamp, step, total)
+            SELECT
+                EntryMap.id,
+                SourceCheckpoint.arrayIndex,
+                ActionMap.id,
+                SourceCheckpoint.timestamp,
+                SourceCheckpoint.step,
+                SourceCheckpoint.total
+            FROM temp.EntryMap
+            JOIN Source.Checkpoint AS SourceCheckpoint
+                ON SourceCheckpoint.entryID = EntryMap.sourceID
+            JOIN temp.ActionMap ON ActionMap.sourceID = SourceCheckpoint.actionID
+            ORDER BY EntryMap.id, SourceCheckpoint.arrayIndex
+        '''
+    ]
+    MERGE_TEMP_TABLES = [ 'DeviceMap', 'VersionMap', 'ActionMap', 'EntryMap' ]
+
     __db: sqlite3.Connection
+    __cache: IngestCache | None
+    __filename: str
+    __schema_version: str
+    __read_only: bool
+    __profiler: Profiler
+    __shards: list[str]
 
-    def __init__(self, filename: str) -> None:
+    def __init__(
+        self,
+        filename: str,
+        migrate: bool = True,
+        read_only: bool = False,
+        busy_timeout: float = DEFAULT_BUSY_TIMEOUT,
+        profiler: Profiler | None = None
+    ) -> None:
         '''
         Constructs a StartupTimesDB object and connects to the sqlite3 database referenced by
         `filename`. If such a database does not exist, it is created.
+
+        If `migrate` is True, any pending schema migrations are applied (see `migrate`). Otherwise,
+        the database is left at its current schema version, and only `pending_migrations` and
+        `migrate` should be used.
+
+        If `read_only` is True, the database is opened read-only, so it must already exist and be
+        at the current schema version. `busy_timeout` is the number of seconds to wait for another
+        connection to release a lock before giving up. (See `retry`.)
+
+        If `profiler` is given, the time spent connecting, adding entries, and
+        committing is recorded in it, along with the SQL statements run.
         '''
 
-        self.__connect(filename)
+        self.__cache = None
+        self.__filename = filename
+        self.__read_only = read_only
+        self.__profiler = profiler or Profiler()
+        self.__shards = []
+        with self.__profiler.phase('setup'):
+            self.__connect(filename, migrate, busy_timeout)
 
-    def __create_tables(self) -> None:
+    def __create_tables(self) -> bool:
         '''
-        Create the tables and indices in `db` needed by startuptimes (other
-        than Props).
+        Create the Props table and the tables and indices in `db` needed by
+        startuptimes, in a single transaction. If another connection created
+        them first, nothing is done.
+
+        Returns True if the tables were created.
         '''
 
         cur = self.cursor()
-        sql = '''
+        sql = f'''
+            CREATE TABLE Props(
+                id INTEGER PRIMARY KEY,
+                namespace TEXT NOT NULL,
+                name TEXT NOT NULL,
+                value TEXT NOT NULL
+            );
+            CREATE UNIQUE INDEX Props_namespace ON Props(namespace);
+            CREATE UNIQUE INDEX Props_lookup ON Props(namespace, name);
+            INSERT INTO Props(id, namespace, name, value)
+                VALUES (1, 'startuptimes', 'schemaVersion', '{StartupTimesDB.BASE_SCHEMA_VERSION}');
             CREATE TABLE Device(
                 id INTEGER PRIMARY KEY,
                 cpuCores INTEGER NOT NULL,
@@ -201,7 +1366,18 @@ class StartupTimesDB:
             CREATE INDEX Checkpoint_arrayIndex on Checkpoint(arrayIndex);
             CREATE INDEX Device_modelID on Device(modelID);
         '''
-        cur.executescript(sql)
+        cur.execute('BEGIN IMMEDIATE')
+        try:
+            if self.__check_for_table('Props'):
+                self.__db.rollback()
+                return False
+            for statement in split_sql_statements(sql):
+                cur.execute(statement)
+            self.commit()
+        except BaseException:
+            self.__db.rollback()
+            raise
+        return True
 
     def __check_for_table(self, table_name: str) -> bool:
         '''
@@ -217,106 +1393,324 @@ class StartupTimesDB:
         cur.execute(sql, [ table_name ])
         return cur.fetchone()[0] == 1
 
-    def __setup(self) -> None:
+    def __read_schema_version(self) -> str:
+        '''
+        Reads the schema version of `db` from the Props table.
+        '''
+
+        cur = self.cursor()
+        sql = '''
+            SELECT value FROM Props WHERE namespace == 'startuptimes' AND name == 'schemaVersion'
+        '''
+        cur.execute(sql)
+        rows = cur.fetchall()
+        if len(rows) != 1:
+            raise ValueError('Database is not a startuptimes database.')
+        return rows[0][0]
+
+    def __setup(self, migrate: bool) -> None:
         '''
         Set up `db` for use with `startuptimes`. If `db` is not already set up,
-        this will also create and populate the Props table.
+        this will also create and populate the Props table. If `migrate` is
+        True, this also applies any pending migrations.
         '''
 
         cur = self.cursor()
         # NOTE: foreign_keys must be turned on ever time the connection is opened.
         cur.execute('PRAGMA foreign_keys = ON')
-        # id is included in the records below to allow for easy checking that the values in the
-        # database match the expected values. If schemaVersion ever gets bumped, the logic will
-        # have to get more complicated.
-        version_record = {
-            'id': 1,
-            'namespace': 'startuptimes',
-            'name': 'schemaVersion',
-            'value': '1.0'
-        }
-        if self.__check_for_table('Props'):
-            sql = '''
-                SELECT * FROM Props WHERE namespace == 'startuptimes' AND name == 'schemaVersion'
-            '''
-            cur.execute(sql)
-            rows = self.process_rows(cur.fetchall(), cur.description)
-            if len(rows) == 1 and rows[0] ==  version_record:
-                # The database schema is already correct, so we are done.
-                return
-        else:
-            # Props table does not yet exist. Create and initialize it.
-            sql = '''
-                CREATE TABLE Props(
-                    id INTEGER PRIMARY KEY,
-                    namespace TEXT NOT NULL,
-                    name TEXT NOT NULL,
-                    value TEXT NOT NULL
-                );
-                CREATE UNIQUE INDEX Props_namespace ON Props(namespace);
-                CREATE UNIQUE INDEX Props_lookup ON Props(namespace, name);
-            '''
-            cur.executescript(sql)
-            self.insert_record('Props', version_record)
-        self.__create_tables()
-
-    def __connect(self, filename: str) -> None:
+        created = False
+        if not self.__check_for_table('Props'):
+            if self.__read_only:
+                raise ValueError('Database is not a startuptimes database.')
+            created = self.retry(self.__create_tables)
+        self.__schema_version = self.__read_schema_version()
+        if schema_version_key(self.__schema_version) > schema_version_key(
+                StartupTimesDB.SCHEMA_VERSION):
+            raise ValueError(
+                f'Database schema version {self.__schema_version} is newer than the '
+                f'supported version {StartupTimesDB.SCHEMA_VERSION}.')
+        if self.__read_only:
+            self.require_current_schema()
+        elif migrate:
+            # There is nothing to back up in a brand new database.
+            self.migrate(backup=not created)
+
+    @property
+    def filename(self) -> str:
+        '''
+        The filename of the database.
         '''
-        Connects to the SQLite database contained in the file named `filename`.
 
-        Also insures that the database is configured for use by startuptimes.
+        return self.__filename
 
-        Returns the database connection.
+    @property
+    def schema_version(self) -> str:
+        '''
+        The current schema version of the database.
         '''
 
-        self.__db = sqlite3.connect(filename)
-        self.__setup()
+        return self.__schema_version
 
-    def get_column_names(self, record: Record) -> list[str]:
+    @property
+    def profiler(self) -> Profiler:
         '''
-        Gets the column names of the primitive fields `record`. (Primitive fields
-        are of type `str`, `int`, `bool`, and `float`.)
-
-        Returns a list containing the column names.
+        The `Profiler` recording the work done with this database. (It is
+        disabled unless one was given to the constructor.)
         '''
 
-        column_names = []
-        for key in record:
-            value = record[key]
-            # NOTE: bool is a subclass of int.
-            if isinstance(value, (str, int, float)):
-                column_names.append(key)
-        return column_names
+        return self.__profiler
 
-    def create_insert_sql(self, table_name: str, record: Record) -> str:
+    @property
+    def change_counter(self) -> int:
         '''
-        Creates a SQL statement suitable for inserting `record` into a table
-        named `table_name`.
-
-        Returns the SQL statement.
+        A number that is increased by every transaction that changes the
+        entries or their statistics (inserting, merging, compacting, and
+        rebuilding the summaries), so that results computed from the database
+        can tell whether they are still current. (See `ReportCache`.)
         '''
 
-        column_names = self.get_column_names(record)
-        sql = 'INSERT INTO ' + table_name + '('
-        sql += ', '.join(column_names)
-        sql += ') VALUES ('
-        sql += ', '.join(map(lambda column_name: f':{column_name}', column_names))
-        sql += ');'
-        # sql should now be of the following form:
-        # INSERT INTO TableName(column1, column2, ...) VALUES (:column1, :column2, ...);
-        return sql
+        cur = self.cursor()
+        cur.execute('''
+            SELECT value FROM Props WHERE namespace == 'startuptimes' AND name == 'changeCounter'
+        ''')
+        row = cur.fetchone()
+        return 0 if row is None else int(row[0])
 
-    def insert_record(self, table_name: str, record: Record) -> int:
+    @property
+    def compacted_before(self) -> str | None:
         '''
-        Inserts `record` into the table named `table_name` in `db`.
-
-        Returns the id of the inserted record.
+        The UTC date (YYYY-MM-DD) before which entries have been compacted
+        (see `compact`), or None if the database has never been compacted.
         '''
 
-        sql = self.create_insert_sql(table_name, record)
         cur = self.cursor()
-        cur.execute(sql, record)
-        self.commit()
+        cur.execute('''
+            SELECT value FROM Props WHERE namespace == 'startuptimes' AND name == 'compactedBefore'
+        ''')
+        row = cur.fetchone()
+        return None if row is None else row[0]
+
+    def __compacted_before_millis(self) -> int | None:
+        '''
+        Returns `compacted_before` as milliseconds since the Unix epoch, to
+        compare with Entry.epochMillis, or None if it is not set.
+        '''
+
+        compacted_before = self.compacted_before
+        if compacted_before is None:
+            return None
+        return (date.fromisoformat(compacted_before) - date(1970, 1, 1)).days * 86400000
+
+    def pending_migrations(self, target: str | None = None) -> list[Migration]:
+        '''
+        Returns the migrations in `MIGRATIONS` that have not yet been applied
+        to `db`, in the order they need to be applied. If `target` is given,
+        only the migrations up to and including that version are returned.
+        '''
+
+        current = schema_version_key(self.__schema_version)
+        last = schema_version_key(target or StartupTimesDB.SCHEMA_VERSION)
+        return [migration for migration in StartupTimesDB.MIGRATIONS
+                if current < schema_version_key(migration.version) <= last]
+
+    def require_current_schema(self) -> None:
+        '''
+        Raises a ValueError if `db` has pending migrations (see `migrate`).
+        '''
+
+        if len(self.pending_migrations()) > 0:
+            raise ValueError(
+                f'Database schema version {self.__schema_version} is older than version '
+                f'{StartupTimesDB.SCHEMA_VERSION}. Use the migrate command to upgrade it.')
+
+    def backup(self, filename: str) -> None:
+        '''
+        Writes a consistent copy of `db` to a new database file named
+        `filename`, using the SQLite online backup API.
+        '''
+
+        target = sqlite3.connect(filename)
+        try:
+            self.__db.backup(target)
+        finally:
+            target.close()
+
+    def __apply_migration(self, migration: Migration) -> bool:
+        '''
+        Applies `migration` to `db` in a single transaction, unless another
+        connection already applied it.
+
+        Returns True if the migration was applied.
+        '''
+
+        cur = self.cursor()
+        applied_at = datetime.now(timezone.utc).isoformat()
+        if not migration.foreign_keys:
+            # NOTE: this has no effect inside a transaction, so it must come before BEGIN.
+            cur.execute('PRAGMA foreign_keys = OFF')
+        cur.execute('BEGIN IMMEDIATE')
+        try:
+            # Another process may have migrated the database since the schema version was read.
+            self.__schema_version = self.__read_schema_version()
+            if schema_version_key(self.__schema_version) >= schema_version_key(migration.version):
+                self.__db.rollback()
+                return False
+            for statement in split_sql_statements(f'''
+                {migration.sql}
+                -- Props_lookup already guarantees uniqueness. Props_namespace only allowed one
+                -- property per namespace, which is not enough to record the migrations.
+                DROP INDEX IF EXISTS Props_namespace;
+                UPDATE Props SET value = '{migration.version}'
+                    WHERE namespace = 'startuptimes' AND name = 'schemaVersion';
+                INSERT INTO Props(namespace, name, value)
+                    VALUES ('startuptimes', 'migration.{migration.version}', '{applied_at}');
+            '''):
+                cur.execute(statement)
+            cur.execute('PRAGMA foreign_key_check')
+            if cur.fetchone() is not None:
+                raise ValueError(
+                    f'Migration {migration.version} would leave rows with invalid foreign keys.')
+            self.commit()
+        except BaseException:
+            self.__db.rollback()
+            raise
+        finally:
+            if not migration.foreign_keys:
+                cur.execute('PRAGMA foreign_keys = ON')
+        self.__schema_version = migration.version
+        return True
+
+    def migrate(
+        self,
+        backup: bool = True,
+        on_applied: Callable[[Migration, float], None] | None = None,
+        target: str | None = None
+    ) -> str | None:
+        '''
+        Upgrades `db` to `target` (by default `SCHEMA_VERSION`) by applying
+        each of the pending migrations in its own transaction. If a migration
+        fails, it is rolled back, leaving `db` at the schema version of the
+        previous migration. Each applied migration is recorded in Props as
+        'migration.<version>' with the time it was applied. Migrations that
+        another process applies at the same time are skipped.
+
+        If `backup` is True and there are pending migrations, a copy of `db`
+        is first written next to it (see `backup`). `on_applied` is called with
+        each migration and the number of seconds it took once it is committed.
+
+        Returns the filename of the backup, or None if no backup was made.
+        '''
+
+        pending = self.pending_migrations(target)
+        if len(pending) == 0:
+            return None
+        backup_filename = None
+        if backup and self.__filename != ':memory:':
+            backup_filename = f'{self.__filename}.{self.__schema_version}.bak'
+            self.backup(backup_filename)
+        for migration in pending:
+            start = time.perf_counter()
+            if self.retry(partial(self.__apply_migration, migration)) and on_applied is not None:
+                on_applied(migration, time.perf_counter() - start)
+        return backup_filename
+
+    def retry(self, operation: Callable[[], T]) -> T:
+        '''
+        Calls `operation` and returns its result. If it fails because another
+        connection held a lock for longer than the busy timeout, it is called
+        again after an exponentially increasing delay, up to `BUSY_RETRIES`
+        times in all. `operation` must roll back any changes it made before
+        failing.
+        '''
+
+        attempt = 0
+        while True:
+            try:
+                return operation()
+            except sqlite3.OperationalError as error:
+                attempt += 1
+                if attempt >= BUSY_RETRIES or not is_busy_error(error):
+                    raise
+            # The jitter keeps processes that were waiting for the same lock from retrying in step.
+            time.sleep(BUSY_RETRY_DELAY * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+
+    def __connect(self, filename: str, migrate: bool, busy_timeout: float) -> None:
+        '''
+        Connects to the SQLite database contained in the file named `filename`.
+
+        Also insures that the database is configured for use by startuptimes.
+
+        Returns the database connection.
+        '''
+
+        if self.__read_only:
+            if not os.path.exists(filename):
+                raise ValueError(f'Database {filename} does not exist.')
+            self.__db = sqlite3.connect(
+                f'{Path(filename).resolve().as_uri()}?mode=ro', timeout=busy_timeout, uri=True)
+        else:
+            is_new = not os.path.exists(filename) or os.path.getsize(filename) == 0
+            self.__db = sqlite3.connect(filename, timeout=busy_timeout)
+            if is_new:
+                # This only takes effect before the first table is created. It lets compact give the
+                # space freed by deleted rows back to the file system without rewriting the file.
+                self.__db.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        self.__profiler.trace(self.__db)
+        if not self.__read_only:
+            # WAL lets reports read while another process writes, and lets writers commit while
+            # reports are reading. The journal mode is stored in the database file.
+            self.retry(lambda: self.__db.execute('PRAGMA journal_mode = WAL'))
+            # With WAL, NORMAL can lose the last transactions on power loss, but never corrupts.
+            self.__db.execute('PRAGMA synchronous = NORMAL')
+        self.__setup(migrate)
+
+    def get_column_names(self, record: Record) -> list[str]:
+        '''
+        Gets the column names of the primitive fields `record`. (Primitive fields
+        are of type `str`, `int`, `bool`, and `float`.)
+
+        Returns a list containing the column names.
+        '''
+
+        column_names = []
+        for key in record:
+            value = record[key]
+            # NOTE: bool is a subclass of int.
+            if isinstance(value, (str, int, float)):
+                column_names.append(key)
+        return column_names
+
+    def create_insert_sql(self, table_name: str, record: Record) -> str:
+        '''
+        Creates a SQL statement suitable for inserting `record` into a table
+        named `table_name`.
+
+        Returns the SQL statement.
+        '''
+
+        column_names = self.get_column_names(record)
+        sql = 'INSERT INTO ' + table_name + '('
+        sql += ', '.join(column_names)
+        sql += ') VALUES ('
+        sql += ', '.join(map(lambda column_name: f':{column_name}', column_names))
+        sql += ');'
+        # sql should now be of the following form:
+        # INSERT INTO TableName(column1, column2, ...) VALUES (:column1, :column2, ...);
+        return sql
+
+    def insert_record(self, table_name: str, record: Record, commit: bool = True) -> int:
+        '''
+        Inserts `record` into the table named `table_name` in `db`. If `commit`
+        is False, the insertion is left as part of the current transaction.
+
+        Returns the id of the inserted record.
+        '''
+
+        sql = self.create_insert_sql(table_name, record)
+        cur = self.cursor()
+        cur.execute(sql, record)
+        if commit:
+            self.commit()
         return cur.lastrowid or 0
 
     def insert_records(self, table_name: str, records: list[Record]) -> None:
@@ -331,59 +1725,202 @@ class StartupTimesDB:
         cur.executemany(sql, records)
         self.commit()
 
-    def find_device_id(self, device: Record) -> int:
+    def find_device_id(self, device: Record, commit: bool = True) -> int:
         '''
         Looks for `device` in `db` and returns its id if it is found. Otherwise,
         adds `device` to `db` and returns the id of the newly created record.
+        If `commit` is False, a newly added device is left as part of the
+        current transaction. If another process adds the same device at the
+        same time, both get the id of the single Device row.
 
         Returns the id of the matching device entry.
         '''
 
         cur = self.cursor()
-        sql = '''
-            SELECT id FROM Device
-                WHERE cpuCores = :cpuCores
-                AND memory = :memory
-                AND modelID = :modelID
-                AND systemVersion = :systemVersion
-        '''
-        cur.execute(sql, device)
+        cur.execute(StartupTimesDB.SELECT_DEVICE_SQL, device)
         row = cur.fetchone()
-        if row is not None:
-            return int(row[0])
-        device_id = self.insert_record('Device', device)
-        model_id = device['modelID']
-        print(f'Device {model_id} inserted with ID: {device_id}')
-        return device_id
+        if row is None:
+            # Android devices have no model.
+            cur.execute(StartupTimesDB.UPSERT_DEVICE_SQL, { 'model': None, **device })
+            cur.execute(StartupTimesDB.SELECT_DEVICE_SQL, device)
+            row = cur.fetchone()
+            if commit:
+                self.commit()
+        return int(row[0])
 
-    def insert_entry(self, entry: Record) -> int:
+    def __batch_rows(self, batch: list[Record], first_id: int) -> tuple[list[tuple], list[tuple]]:
+        '''
+        Builds the Entry and Checkpoint rows for the entries in `batch` that
+        are not already in the database (according to the ingestion cache),
+        numbering the entries from `first_id`, and records their timestamps
+        in the cache.
+
+        Returns the Entry rows and the Checkpoint rows.
+        '''
+
+        cache = self.__cache
+        entry_rows = []
+        checkpoint_rows = []
+        next_id = first_id
+        for entry in batch:
+            device_id = cache.find_device_id(self, entry['device'])
+            timestamps = cache.timestamps(self, device_id)
+            timestamp = entry['timestamp']
+            if timestamp in timestamps:
+                continue
+            timestamps.add(timestamp)
+            entry_rows.append((
+                next_id,
+                cache.intern(self, 'Version', entry['iTwinVersion']),
+                entry['title'],
+                entry['timestamp'],
+                entry['totalTime'],
+                entry['usingRemoteServer'],
+                device_id
+            ))
+            for index, checkpoint in enumerate(entry['checkpoints']):
+                checkpoint_rows.append((
+                    next_id,
+                    index,
+                    cache.intern(self, 'Action', checkpoint['action']),
+                    checkpoint['timestamp'],
+                    checkpoint['step'],
+                    checkpoint['total']
+                ))
+            next_id += 1
+        return (entry_rows, checkpoint_rows)
+
+    def __insert_batch(self, batch: list[Record], stats: IngestStats) -> None:
         '''
-        Inserts `entry` into `db`. This creates records in the Entry,
-        Checkpoints, and (optionally) Device tables. (If a record already exists
-        in the Device table matching the device of `entry`, that device is
-        used.) Returns 1 if the insertion was skipped due the entry already
-        being present, or 0 if the entry was inserted. Note: the weird return
-        value allows the calling function to trivially add up the number of
-        skipped entries.
+        Inserts the entries in `batch` into `db` using a single transaction,
+        updating `stats` once the transaction has been committed. If anything
+        fails, the whole batch is rolled back and the exception is re-raised.
         '''
 
-        device_id = self.find_device_id(entry['device'])
-        entry['deviceID'] = device_id
+        if self.__cache is None:
+            self.__cache = IngestCache()
+        profiler = self.__profiler
         cur = self.cursor()
-        cur.execute('SELECT 1 FROM Entry WHERE timestamp=:timestamp AND deviceID=:deviceID', entry)
-        if cur.fetchone() is not None:
-            return 1
-        entry_id = self.insert_record('Entry', entry)
-        print(f'Entry inserted with ID: {entry_id}')
-        index = 0
-        checkpoints = entry['checkpoints']
-        for checkpoint in checkpoints:
-            checkpoint['entryID'] = entry_id
-            checkpoint['arrayIndex'] = index
-            index = index + 1
-        self.insert_records('Checkpoint', checkpoints)
-        print(f'{len(checkpoints)} checkpoints inserted.')
-        return 0
+        # BEGIN IMMEDIATE takes the write lock up front, so the entry ids allocated below cannot
+        # collide with those of another writer.
+        with profiler.phase('lock'):
+            cur.execute('BEGIN IMMEDIATE')
+        try:
+            with profiler.phase('lookup'):
+                cur.execute('SELECT COUNT(*) FROM Device')
+                num_devices = cur.fetchone()[0]
+                cur.execute('SELECT COALESCE(MAX(id), 0) FROM Entry')
+                first_id = cur.fetchone()[0] + 1
+                (entry_rows, checkpoint_rows) = self.__batch_rows(batch, first_id)
+                num_skipped = len(batch) - len(entry_rows)
+                next_id = first_id + len(entry_rows)
+            with profiler.phase('insert'):
+                cur.executemany(StartupTimesDB.INSERT_ENTRY_SQL, entry_rows)
+                num_rows = cur.rowcount
+                compacted_before = self.__compacted_before_millis()
+                if compacted_before is not None:
+                    # Entries from before the compacted days may have been compacted already, so
+                    # they cannot be told apart from duplicates.
+                    cur.execute(
+                        'DELETE FROM Entry WHERE id >= ? AND epochMillis < ?',
+                        [ first_id, compacted_before ])
+                    num_rows -= cur.rowcount
+                if num_rows != len(entry_rows):
+                    # Another process added some of these entries since the cache was seeded, so
+                    # INSERT OR IGNORE skipped them (or they were from compacted days). Drop the
+                    # checkpoints of the skipped entries.
+                    cur.execute('SELECT id FROM Entry WHERE id >= ?', [ first_id ])
+                    inserted_ids = { row[0] for row in cur }
+                    num_skipped += len(entry_rows) - len(inserted_ids)
+                    entry_rows = [row for row in entry_rows if row[0] in inserted_ids]
+                    checkpoint_rows = [row for row in checkpoint_rows if row[0] in inserted_ids]
+                cur.executemany(StartupTimesDB.INSERT_CHECKPOINT_SQL, checkpoint_rows)
+            with profiler.phase('summarize'):
+                if len(entry_rows) > 0:
+                    # All of the Entry and Checkpoint rows from first_id up to next_id were
+                    # inserted above.
+                    ids = [ first_id, next_id - 1 ]
+                    cur.execute(StartupTimesDB.UPDATE_ENTRY_SUMMARY_SQL, ids)
+                    cur.execute(StartupTimesDB.UPDATE_CHECKPOINT_SUMMARY_SQL, ids)
+                    cur.execute(StartupTimesDB.UPDATE_ENTRY_DAY_SUMMARY_SQL, ids)
+                    cur.execute(StartupTimesDB.BUMP_CHANGE_COUNTER_SQL)
+                cur.execute('SELECT COUNT(*) FROM Device')
+                num_devices = cur.fetchone()[0] - num_devices
+            with profiler.phase('commit'):
+                self.commit()
+        except BaseException:
+            self.__db.rollback()
+            # The cache may now contain rows that were rolled back.
+            self.__cache = None
+            raise
+        stats.add(len(entry_rows), num_skipped, len(checkpoint_rows), num_devices)
+
+    def insert_entries(
+        self,
+        entries: Iterable[Record],
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        on_batch: Callable[[IngestStats], None] | None = None
+    ) -> IngestStats:
+        '''
+        Inserts the entries produced by `entries` into `db`. This creates
+        records in the Entry, Checkpoint, and (optionally) Device tables. (If a
+        record already exists in the Device table matching the device of an
+        entry, that device is used.) Entries that are already present in `db`
+        are skipped, as are entries from before `compacted_before`.
+
+        The entries are inserted in transactions of `batch_size` entries each.
+        `entries` is consumed lazily, so it can be a generator that streams
+        entries from a large file. If inserting a batch fails, that batch is
+        rolled back, but batches that were already committed are kept. If
+        `on_batch` is given, it is called with the running totals after each
+        batch is committed. The time spent waiting for `entries` is recorded
+        in the 'parse' phase of the profiler.
+
+        Returns an `IngestStats` describing what was inserted.
+        '''
+
+        stats = IngestStats()
+        start = time.perf_counter()
+        batch: list[Record] = []
+        entries = self.__profiler.timed_iter('parse', entries, 'entries parsed')
+
+        def insert_batch() -> None:
+            self.retry(lambda: self.__insert_batch(batch, stats))
+            stats.seconds = time.perf_counter() - start
+            if on_batch is not None:
+                on_batch(stats)
+
+        for entry in entries:
+            batch.append(entry)
+            if len(batch) >= batch_size:
+                insert_batch()
+                batch = []
+        if len(batch) > 0:
+            insert_batch()
+        stats.seconds = time.perf_counter() - start
+        self.__profiler.count('entries inserted', stats.inserted)
+        self.__profiler.count('entries skipped', stats.skipped)
+        return stats
+
+    def insert_entry(self, entry: Record) -> int:
+        '''
+        Inserts `entry` into `db`. (See `insert_entries`.) Returns 1 if the
+        insertion was skipped due the entry already being present, or 0 if the
+        entry was inserted. Note: the weird return value allows the calling
+        function to trivially add up the number of skipped entries.
+        '''
+
+        return self.insert_entries([ entry ]).skipped
+
+    def add_entries(self, entries: Iterable[Record]) -> int:
+        '''
+        Add the entries produced by `entries` to db. `entries` is consumed
+        lazily, so it can be a generator that streams entries from a large
+        file. Returns the number of entries that were skipped due to already
+        being present in the database.
+        '''
+
+        return self.insert_entries(entries).skipped
 
     def add_from_json(self, json_string: str) -> int:
         '''
@@ -392,14 +1929,542 @@ class StartupTimesDB:
         database.
         '''
 
-        num_skipped = 0
         data = json.loads(json_string)
-        if isinstance(data, list):
-            for entry in data:
-                num_skipped += self.insert_entry(entry)
+        return self.add_entries(data if isinstance(data, list) else [ data ])
+
+    def __attach(self, filename: str, schema_name: str) -> None:
+        '''
+        Attaches the startuptimes database named `filename` as `schema_name`,
+        after checking that it is at the current schema version.
+
+        Raises ValueError if `filename` is this database, or is not a
+        startuptimes database at the current schema version.
+        '''
+
+        if os.path.exists(filename) and os.path.samefile(filename, self.__filename):
+            raise ValueError(f'{filename} is the database being used.')
+        try:
+            StartupTimesDB(filename, read_only=True).close()
+        except (ValueError, sqlite3.DatabaseError) as error:
+            raise ValueError(f'{filename}: {error}') from error
+        if self.__read_only:
+            uri = f'{Path(filename).resolve().as_uri()}?mode=ro'
+            self.__db.execute(f'ATTACH ? AS {schema_name}', [ uri ])
+        else:
+            self.__db.execute(f'ATTACH ? AS {schema_name}', [ filename ])
+
+    def __merge_attached(self, stats: IngestStats) -> None:
+        '''
+        Copies the new entries of the database attached as Source into this
+        one in a single transaction, updating `stats` once the transaction has
+        been committed. (See `merge`.)
+        '''
+
+        cur = self.cursor()
+        cur.execute('BEGIN IMMEDIATE')
+        try:
+            cur.execute('SELECT COUNT(*) FROM main.Device')
+            num_devices = cur.fetchone()[0]
+            cur.execute('SELECT COALESCE(MAX(id), 0) FROM main.Entry')
+            first_id = cur.fetchone()[0] + 1
+            params = {
+                'firstID': first_id, 'compactedBefore': self.__compacted_before_millis()
+            }
+            for sql in StartupTimesDB.MERGE_SQL:
+                cur.execute(sql, params)
+            cur.execute('SELECT COUNT(*) FROM temp.EntryMap')
+            num_inserted = cur.fetchone()[0]
+            cur.execute('SELECT COUNT(*) FROM Source.Entry')
+            num_skipped = cur.fetchone()[0] - num_inserted
+            cur.execute(
+                'SELECT COUNT(*) FROM main.Checkpoint WHERE entryID >= ?', [ first_id ])
+            num_checkpoints = cur.fetchone()[0]
+            if num_inserted > 0:
+                # The copied entries have the ids from first_id on, like a batch of insert_entries.
+                ids = [ first_id, first_id + num_inserted - 1 ]
+                cur.execute(StartupTimesDB.UPDATE_ENTRY_SUMMARY_SQL, ids)
+                cur.execute(StartupTimesDB.UPDATE_CHECKPOINT_SUMMARY_SQL, ids)
+                cur.execute(StartupTimesDB.UPDATE_ENTRY_DAY_SUMMARY_SQL, ids)
+                cur.execute(StartupTimesDB.BUMP_CHANGE_COUNTER_SQL)
+            cur.execute('SELECT COUNT(*) FROM main.Device')
+            num_devices = cur.fetchone()[0] - num_devices
+            for table_name in StartupTimesDB.MERGE_TEMP_TABLES:
+                cur.execute(f'DROP TABLE temp.{table_name}')
+            self.commit()
+        except BaseException:
+            self.__db.rollback()
+            for table_name in StartupTimesDB.MERGE_TEMP_TABLES:
+                cur.execute(f'DROP TABLE IF EXISTS temp.{table_name}')
+            raise
+        stats.add(num_inserted, num_skipped, num_checkpoints, num_devices)
+
+    def merge(self, filename: str) -> IngestStats:
+        '''
+        Copies the entries in the startuptimes database named `filename` that
+        are not already present into this database, along with their
+        checkpoints, in a single transaction. Devices, iTwin versions, and
+        actions are matched by their values rather than their ids, and any
+        that are missing are added. As with `insert_entries`, an entry is
+        already present if there is one for the same device with the same
+        timestamp. The summary tables are updated in the same transaction.
+
+        The copy is done by a fixed number of set-based statements (see
+        `MERGE_SQL`), so it does not run any Python code per entry.
+
+        If this database has been compacted, entries from before
+        `compacted_before` are skipped (see `compact`).
+
+        Returns an `IngestStats` describing what was copied. Raises ValueError
+        if `filename` is this database, is not a startuptimes database at the
+        current schema version, or has been compacted (since its rollups
+        cannot be matched with the entries of this database).
+        '''
+
+        stats = IngestStats()
+        start = time.perf_counter()
+        self.__attach(filename, 'Source')
+        try:
+            cur = self.cursor()
+            cur.execute('SELECT EXISTS (SELECT 1 FROM Source.EntryRollup)')
+            if cur.fetchone()[0]:
+                raise ValueError(f'{filename} has been compacted, so it cannot be merged.')
+            self.retry(lambda: self.__merge_attached(stats))
+        finally:
+            self.__db.execute('DETACH Source')
+        # The cache does not know about the copied devices and entries.
+        self.__cache = None
+        stats.seconds = time.perf_counter() - start
+        return stats
+
+    def attach_shard(self, filename: str) -> None:
+        '''
+        Attaches the startuptimes database named `filename` as another shard,
+        so that `federated_sql` includes it. The first time a shard is
+        attached, this database becomes shard 0.
+
+        Temporary tables give the devices and iTwin versions of all the shards
+        common ids, matching them by their values: FederatedDevice and
+        FederatedVersion hold the combined rows, and ShardDevice and
+        ShardVersion map the ids used by each shard to them.
+
+        Raises ValueError if `filename` is this database, is not a
+        startuptimes database at the current schema version, or cannot be
+        attached.
+        '''
+
+        cur = self.cursor()
+        if len(self.__shards) == 0:
+            cur.execute('''
+                CREATE TEMP TABLE FederatedDevice(
+                    id INTEGER PRIMARY KEY,
+                    cpuCores INTEGER NOT NULL,
+                    memory INTEGER NOT NULL,
+                    modelID TEXT NOT NULL,
+                    systemName TEXT NOT NULL,
+                    systemVersion TEXT NOT NULL,
+                    UNIQUE(cpuCores, memory, modelID, systemVersion)
+                )
+            ''')
+            cur.execute('''
+                CREATE TEMP TABLE FederatedVersion(id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE)
+            ''')
+            cur.execute('''
+                CREATE TEMP TABLE ShardDevice(
+                    shard INTEGER NOT NULL,
+                    deviceID INTEGER NOT NULL,
+                    federatedID INTEGER NOT NULL,
+                    PRIMARY KEY(shard, deviceID)
+                ) WITHOUT ROWID
+            ''')
+            cur.execute('''
+                CREATE TEMP TABLE ShardVersion(
+                    shard INTEGER NOT NULL,
+                    versionID INTEGER NOT NULL,
+                    federatedID INTEGER NOT NULL,
+                    PRIMARY KEY(shard, versionID)
+                ) WITHOUT ROWID
+            ''')
+            self.__add_shard('main')
+        schema_name = f'shard{len(self.__shards)}'
+        try:
+            self.__attach(filename, schema_name)
+        except sqlite3.OperationalError as error:
+            # SQLite limits the number of attached databases, by default to 10.
+            raise ValueError(f'{filename}: {error}') from error
+        self.__add_shard(schema_name)
+
+    def __add_shard(self, schema_name: str) -> None:
+        '''
+        Adds the devices and iTwin versions of the database attached as
+        `schema_name` to the temporary tables described in `attach_shard`.
+        '''
+
+        shard = len(self.__shards)
+        cur = self.cursor()
+        cur.execute(f'''
+            INSERT OR IGNORE INTO temp.FederatedDevice(cpuCores, memory, modelID, systemName, systemVersion)
+                SELECT cpuCores, memory, modelID, systemName, systemVersion
+                FROM {schema_name}.Device ORDER BY id
+        ''')
+        cur.execute(f'''
+            INSERT INTO temp.ShardDevice
+                SELECT {shard}, Shard.id, FederatedDevice.id
+                FROM {schema_name}.Device AS Shard
+                JOIN temp.FederatedDevice USING (cpuCores, memory, modelID, systemVersion)
+        ''')
+        cur.execute(f'''
+            INSERT OR IGNORE INTO temp.FederatedVersion(name)
+                SELECT name FROM {schema_name}.Version ORDER BY id
+        ''')
+        cur.execute(f'''
+            INSERT INTO temp.ShardVersion
+                SELECT {shard}, Shard.id, FederatedVersion.id
+                FROM {schema_name}.Version AS Shard JOIN temp.FederatedVersion USING (name)
+        ''')
+        self.__shards.append(schema_name)
+
+    @property
+    def shards(self) -> list[str]:
+        '''
+        The schema names of the shards (see `attach_shard`), starting with
+        'main', or an empty list if no shards have been attached.
+        '''
+
+        return list(self.__shards)
+
+    def federated_sql(self, sql: str, shard_sql: str) -> str:
+        '''
+        Replaces the {shards} placeholder in `sql` with the UNION ALL of
+        `shard_sql` for each shard, with its {shard} placeholder replaced by
+        the number of the shard, and its {schema} placeholder replaced by the
+        schema name of the shard.
+        '''
+
+        return sql.format(shards=' UNION ALL '.join(
+            shard_sql.format(shard=shard, schema=schema_name)
+            for (shard, schema_name) in enumerate(self.__shards)))
+
+    def compact(
+        self,
+        before: str,
+        chunk_size: int = DEFAULT_COMPACT_CHUNK_SIZE,
+        on_chunk: Callable[[int, int], None] | None = None
+    ) -> tuple[int, int]:
+        '''
+        Rolls up the entries from before the UTC date `before` (YYYY-MM-DD)
+        into per-(device, iTwin version, UTC day) rows in EntryRollup, and
+        their checkpoints into per-(device, iTwin version, action, UTC day)
+        rows in CheckpointRollup, then deletes the Entry and Checkpoint rows.
+
+        The summary tables are left as they are, since they already include
+        the compacted entries, so reports computed from them do not change.
+        The rollups let `rebuild_summaries`, `check_summaries`, and filtered
+        reports of whole days include the compacted entries too. They also
+        keep the sorted totalTime and step values, so that distribution
+        statistics and regressions include the compacted entries.
+
+        The cutoff is recorded first, as `compacted_before`, and then the
+        entries are compacted in transactions of up to `chunk_size` entries,
+        calling `on_chunk` with the running totals of the entries and
+        checkpoints compacted after each one. If this is interrupted, calling
+        it again resumes where it stopped. The cutoff never moves backwards:
+        if `before` is earlier than `compacted_before`, the latter is used.
+        Once it is set, `insert_entries` and `merge` skip entries from before
+        the cutoff, since they cannot tell them apart from compacted ones.
+
+        Deleted rows leave free pages in the file; call `vacuum` afterwards to
+        give them back to the file system.
+
+        Returns the number of entries and checkpoints that were compacted.
+        '''
+
+        date.fromisoformat(before)
+
+        def set_cutoff() -> None:
+            cur = self.cursor()
+            cur.execute('BEGIN IMMEDIATE')
+            try:
+                cur.execute('''
+                    INSERT INTO Props(namespace, name, value)
+                        VALUES ('startuptimes', 'compactedBefore', ?)
+                    ON CONFLICT(namespace, name) DO UPDATE SET value = MAX(value, excluded.value)
+                ''', [ before ])
+                cur.execute(StartupTimesDB.BUMP_CHANGE_COUNTER_SQL)
+                self.commit()
+            except BaseException:
+                self.__db.rollback()
+                raise
+
+        self.retry(set_cutoff)
+        cutoff = self.__compacted_before_millis()
+        num_entries = 0
+        num_checkpoints = 0
+        last_id = 0
+
+        def compact_chunk() -> int | None:
+            cur = self.cursor()
+            cur.execute('BEGIN IMMEDIATE')
+            try:
+                cur.execute('''
+                    SELECT MIN(id), MAX(id) FROM (
+                        SELECT id FROM Entry WHERE id > ? AND epochMillis < ? ORDER BY id LIMIT ?
+                    )
+                ''', [ last_id, cutoff, chunk_size ])
+                (first_id, chunk_last_id) = cur.fetchone()
+                if chunk_last_id is None:
+                    self.__db.rollback()
+                    return None
+                where = (
+                    f'Entry.id BETWEEN {first_id} AND {chunk_last_id} '
+                    f'AND Entry.epochMillis < {cutoff}')
+                cur.execute(ROLLUP_ENTRIES_SQL.format(where=where))
+                cur.execute(ROLLUP_CHECKPOINTS_SQL.format(where=where))
+                self.__merge_rollup_values(
+                    ROLLUP_ENTRY_VALUES_SQL.format(where=where), 'EntryRollup', 'totalTimes',
+                    ('deviceID', 'versionID', 'day'))
+                self.__merge_rollup_values(
+                    ROLLUP_CHECKPOINT_VALUES_SQL.format(where=where), 'CheckpointRollup', 'steps',
+                    ('deviceID', 'versionID', 'actionID', 'day'))
+                cur.execute(f'''
+                    DELETE FROM Checkpoint WHERE entryID IN (SELECT id FROM Entry WHERE {where})
+                ''')
+                chunk_checkpoints = cur.rowcount
+                cur.execute(f'DELETE FROM Entry WHERE {where}')
+                chunk_entries = cur.rowcount
+                cur.execute(StartupTimesDB.BUMP_CHANGE_COUNTER_SQL)
+                self.commit()
+            except BaseException:
+                self.__db.rollback()
+                raise
+            nonlocal num_entries, num_checkpoints
+            num_entries += chunk_entries
+            num_checkpoints += chunk_checkpoints
+            return chunk_last_id
+
+        while True:
+            chunk_last_id = self.retry(compact_chunk)
+            if chunk_last_id is None:
+                break
+            last_id = chunk_last_id
+            if on_chunk is not None:
+                on_chunk(num_entries, num_checkpoints)
+        # The cache may hold the timestamps of deleted entries.
+        self.__cache = None
+        return (num_entries, num_checkpoints)
+
+    def __merge_rollup_values(
+        self,
+        values_sql: str,
+        table: str,
+        column: str,
+        key_names: tuple[str, ...]
+    ) -> None:
+        '''
+        Merges the sorted values selected by `values_sql` (see
+        `iter_sorted_groups`) into the value blob in `column` of the row of the
+        rollup `table` with the same key, the columns named in `key_names`.
+        The rows must already exist. This is called by `compact` in its
+        transaction, so the blobs stay sorted and complete.
+        '''
+
+        condition = ' AND '.join(f'{name} = ?' for name in key_names)
+        cur = self.cursor()
+        cur.execute(values_sql)
+        blobs = self.cursor()
+        updates = []
+        for (key, values) in iter_sorted_groups(cur, len(key_names)):
+            blobs.execute(f'SELECT {column} FROM {table} WHERE {condition}', key)
+            merged = array('d', heapq.merge(rollup_values(blobs.fetchone()[0]), values))
+            updates.append((rollup_blob(merged), *key))
+        cur.executemany(f'UPDATE {table} SET {column} = ? WHERE {condition}', updates)
+
+    def vacuum(self) -> None:
+        '''
+        Gives the free pages left by deleted rows back to the file system, and
+        truncates the write-ahead log.
+
+        Databases created before `compact` existed do not use incremental auto
+        vacuum, so the first call converts them, which rewrites the whole file
+        once with VACUUM. After that, only the free pages are removed.
+        '''
+
+        cur = self.cursor()
+        cur.execute('PRAGMA auto_vacuum')
+        if cur.fetchone()[0] == 0:
+            cur.execute('PRAGMA auto_vacuum = INCREMENTAL')
+            self.retry(lambda: cur.execute('VACUUM'))
         else:
-            num_skipped += self.insert_entry(data)
-        return num_skipped
+            # Each step of incremental_vacuum frees one page, but execute only takes one step.
+            self.retry(lambda: cur.executescript('PRAGMA incremental_vacuum'))
+        self.retry(lambda: cur.execute('PRAGMA wal_checkpoint(TRUNCATE)').fetchall())
+
+    def rebuild_summaries(self) -> None:
+        '''
+        Recomputes the EntrySummary, CheckpointSummary, and EntryDaySummary
+        tables from the Entry and Checkpoint tables, and the EntryRollup and
+        CheckpointRollup tables of compacted entries (see `compact`), in a
+        single transaction.
+        '''
+
+        def rebuild() -> None:
+            cur = self.cursor()
+            cur.execute('BEGIN IMMEDIATE')
+            try:
+                cur.execute('DELETE FROM EntrySummary')
+                cur.execute('DELETE FROM CheckpointSummary')
+                cur.execute('DELETE FROM EntryDaySummary')
+                cur.execute(SUMMARIZE_ENTRIES_SQL.format(where='true'))
+                cur.execute(SUMMARIZE_CHECKPOINTS_SQL.format(where='true'))
+                cur.execute(SUMMARIZE_ENTRY_DAYS_SQL.format(where='true'))
+                cur.execute(SUMMARIZE_ENTRY_ROLLUPS_SQL)
+                cur.execute(SUMMARIZE_CHECKPOINT_ROLLUPS_SQL)
+                cur.execute(SUMMARIZE_ENTRY_DAY_ROLLUPS_SQL)
+                cur.execute(StartupTimesDB.BUMP_CHANGE_COUNTER_SQL)
+                self.commit()
+            except BaseException:
+                self.__db.rollback()
+                raise
+
+        self.retry(rebuild)
+
+    def check_summaries(self) -> list[str]:
+        '''
+        Compares the EntrySummary, CheckpointSummary, and EntryDaySummary
+        tables with statistics computed directly from the Entry and Checkpoint
+        tables, combined with those of the compacted entries in EntryRollup and
+        CheckpointRollup.
+
+        Returns a list of descriptions of the groups that do not match. The
+        list is empty if the summaries are consistent.
+        '''
+
+        def fetch_groups(sql: str, key_length: int) -> dict[tuple, tuple]:
+            cur = self.cursor()
+            cur.execute(sql)
+            return { row[:key_length]: row[key_length:] for row in cur }
+
+        checks = [
+            (
+                'EntrySummary',
+                fetch_groups('''
+                    SELECT deviceID, versionID, count, sum, sumSquares, min, max
+                        FROM EntrySummary
+                ''', 2),
+                fetch_groups('''
+                    SELECT
+                        deviceID,
+                        versionID,
+                        SUM(count),
+                        SUM(sum),
+                        SUM(sumSquares),
+                        MIN(min),
+                        MAX(max)
+                    FROM (
+                        SELECT
+                            deviceID,
+                            versionID,
+                            COUNT(*) AS count,
+                            SUM(totalTime) AS sum,
+                            SUM(totalTime * totalTime) AS sumSquares,
+                            MIN(totalTime) AS min,
+                            MAX(totalTime) AS max
+                        FROM Entry
+                        GROUP BY deviceID, versionID
+                        UNION ALL
+                        SELECT deviceID, versionID, count, sum, sumSquares, min, max
+                            FROM EntryRollup
+                    )
+                    GROUP BY deviceID, versionID
+                ''', 2)
+            ),
+            (
+                'CheckpointSummary',
+                fetch_groups('''
+                    SELECT
+                        deviceID, versionID, actionID, firstIndex, count, sum, sumSquares, min, max
+                    FROM CheckpointSummary
+                ''', 3),
+                fetch_groups('''
+                    SELECT
+                        deviceID,
+                        versionID,
+                        actionID,
+                        MIN(firstIndex),
+                        SUM(count),
+                        SUM(sum),
+                        SUM(sumSquares),
+                        MIN(min),
+                        MAX(max)
+                    FROM (
+                        SELECT
+                            Entry.deviceID,
+                            Entry.versionID,
+                            Checkpoint.actionID,
+                            MIN(Checkpoint.arrayIndex) AS firstIndex,
+                            COUNT(*) AS count,
+                            SUM(Checkpoint.step) AS sum,
+                            SUM(Checkpoint.step * Checkpoint.step) AS sumSquares,
+                            MIN(Checkpoint.step) AS min,
+                            MAX(Checkpoint.step) AS max
+                        FROM Checkpoint JOIN Entry ON Checkpoint.entryID = Entry.id
+                        GROUP BY Entry.deviceID, Entry.versionID, Checkpoint.actionID
+                        UNION ALL
+                        SELECT
+                            deviceID, versionID, actionID, firstIndex, count, sum, sumSquares, min,
+                            max
+                        FROM CheckpointRollup
+                    )
+                    GROUP BY deviceID, versionID, actionID
+                ''', 3)
+            ),
+            (
+                'EntryDaySummary',
+                fetch_groups('''
+                    SELECT deviceID, versionID, day, count, sum, sumSquares, min, max
+                        FROM EntryDaySummary
+                ''', 3),
+                fetch_groups('''
+                    SELECT
+                        deviceID,
+                        versionID,
+                        day,
+                        SUM(count),
+                        SUM(sum),
+                        SUM(sumSquares),
+                        MIN(min),
+                        MAX(max)
+                    FROM (
+                        SELECT
+                            deviceID,
+                            versionID,
+                            epochMillis / 86400000 AS day,
+                            COUNT(*) AS count,
+                            SUM(totalTime) AS sum,
+                            SUM(totalTime * totalTime) AS sumSquares,
+                            MIN(totalTime) AS min,
+                            MAX(totalTime) AS max
+                        FROM Entry
+                        WHERE epochMillis IS NOT NULL
+                        GROUP BY deviceID, versionID, day
+                        UNION ALL
+                        SELECT deviceID, versionID, day, count, sum, sumSquares, min, max
+                            FROM EntryRollup
+                    )
+                    GROUP BY deviceID, versionID, day
+                ''', 3)
+            )
+        ]
+        problems = []
+        for (table_name, summaries, expected) in checks:
+            for key in sorted(summaries.keys() | expected.keys(), key=str):
+                summary = summaries.get(key)
+                actual = expected.get(key)
+                if summary is None or actual is None or not all(
+                    math.isclose(value, actual_value, rel_tol=1e-9, abs_tol=1e-9)
+                    for (value, actual_value) in zip(summary, actual)
+                ):
+                    problems.append(f'{table_name} {key}: expected {actual}, found {summary}')
+        return problems
 
     def cursor(self) -> sqlite3.Cursor:
         '''
@@ -417,6 +2482,7 @@ class StartupTimesDB:
         '''
         Close the database connection.
         '''
+        self.__profiler.count('rows written', self.__db.total_changes)
         self.__db.close()
 
     def process_row(self, row: tuple, description: SQLiteDescription) -> Record:
@@ -444,134 +2510,3647 @@ class StartupTimesDB:
             result.append(self.process_row(row, description))
         return result
 
-def gen_report_row(db: sqlite3.Connection, where: Record) -> Record:
+# The nested helpers share the decoder's state, so they are counted as part of this function.
+# pylint: disable-next=too-many-statements
+def iter_json_entries(input_file: TextIO, chunk_size: int = READ_CHUNK_SIZE) -> Iterator[Record]:
     '''
-    Generates a report row from data in `db` using the values in `where`.
+    Incrementally decodes the JSON values in `input_file` and yields the
+    entries they contain, reading at most `chunk_size` characters at a time.
 
-    The `where` parameter must contatin 'deviceID' and 'iTwinVersion'
-    values.
+    The input is a sequence of JSON values separated by optional whitespace
+    (which includes the blank lines written between entries by ActivityTimer).
+    A top-level value that is an object is yielded as-is. A top-level value
+    that is an array is streamed one element at a time, so a huge array never
+    has to be held in memory all at once.
 
-    Returns a dict with data for one row in a report.
+    Raises json.JSONDecodeError if the input is not valid.
     '''
 
-    cur = db.cursor()
-    cur.execute('SELECT * FROM Device WHERE id = :deviceID', where)
-    device = db.process_row(cur.fetchone(), cur.description)
-    sql = 'SELECT * FROM Entry WHERE iTwinVersion = :iTwinVersion AND deviceID = :deviceID'
-    cur.execute(sql, where)
-    entries = db.process_rows(cur.fetchall(), cur.description)
-    total_time = 0.0
-    for entry in entries:
-        total_time += entry['totalTime']
-    return {
-        'modelID': device['modelID'],
-        'osVersion': f"{device['systemName']} {device['systemVersion']}",
-        'iTwinVersion': where['iTwinVersion'],
-        'averageTime': total_time / len(entries),
-        'samples': len(entries)
-    }
+    decoder = json.JSONDecoder()
+    buffer = ''
+    pos = 0
+    eof = False
 
-def add_command(db: StartupTimesDB, args) -> None:
+    def fill() -> None:
+        nonlocal buffer, pos, eof
+        chunk = input_file.read(chunk_size)
+        if chunk:
+            # Drop the already-consumed text so the buffer never grows beyond
+            # the largest single value plus one chunk.
+            buffer = buffer[pos:] + chunk
+            pos = 0
+        else:
+            eof = True
+
+    def skip_whitespace() -> None:
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos].isspace():
+                pos += 1
+            if pos < len(buffer) or eof:
+                return
+            fill()
+
+    def decode() -> Any:
+        nonlocal pos
+        while True:
+            try:
+                value, end = decoder.raw_decode(buffer, pos)
+                # A value that ends exactly at the end of the buffer might be a
+                # number that continues in the next chunk.
+                if end < len(buffer) or eof:
+                    pos = end
+                    return value
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            fill()
+
+    in_array = False
+    need_element = False
+    while True:
+        skip_whitespace()
+        if pos == len(buffer):
+            if in_array:
+                raise json.JSONDecodeError('Unterminated array', buffer, pos)
+            return
+        char = buffer[pos]
+        if not in_array:
+            if char == '[':
+                pos += 1
+                in_array = True
+                need_element = False
+                skip_whitespace()
+                if buffer.startswith(']', pos):
+                    pos += 1
+                    in_array = False
+                else:
+                    need_element = True
+                continue
+            yield decode()
+        elif need_element:
+            yield decode()
+            need_element = False
+        elif char == ',':
+            pos += 1
+            need_element = True
+        elif char == ']':
+            pos += 1
+            in_array = False
+        else:
+            raise json.JSONDecodeError("Expecting ',' delimiter", buffer, pos)
+
+def iter_json_lines_entries(input_file: TextIO) -> Iterator[Record]:
     '''
-    Handler for the 'add' command line command. (See command help for more
-    info.)
+    Decodes `input_file` as JSON Lines (one JSON value per line) and yields the
+    entries it contains. Blank lines are ignored, and a line containing an
+    array yields each of the array's elements.
     '''
 
-    input_file: TextIO
-    if hasattr(args, 'filename') and args.filename:
-        input_file = open(args.filename, encoding='utf-8')
-    else:
-        input_file = sys.stdin
-        print('Input entry JSON, then hit Ctrl+D:')
-    lines = input_file.readlines()
-    json_string = ''
-    num_skipped = 0
-    for line in lines:
-        stripped = line.rstrip()
-        if len(stripped) > 0:
-            json_string += f'{stripped}\n'
+    for line in input_file:
+        if not line.strip():
+            continue
+        data = json.loads(line)
+        if isinstance(data, list):
+            yield from data
         else:
-            num_skipped += db.add_from_json(json_string)
-            json_string = ''
-    if len(json_string) != 0:
-        num_skipped += db.add_from_json(json_string)
-    if isinstance(input_file, TextIOWrapper):
-        input_file.close()
-    if num_skipped > 0:
-        print(f'{num_skipped} entries were skipped due to already being present.')
+            yield data
 
-def report_command(db: StartupTimesDB, _) -> None:
+def decode_log_window(window: str, column: int) -> tuple[Any, str] | None:
     '''
-    Handler for the 'report' command line command. (See command help for
-    more info.)
+    Decodes the JSON value that starts at `column` in the first line of
+    `window`, either as-is or with the first `column` characters of every
+    line removed.
+
+    Returns the value and the text of `window` that it was decoded from, or
+    None if `window` does not start with a complete JSON value.
     '''
 
-    cur = db.cursor()
-    report_rows = []
-    sql = '''
-        SELECT DISTINCT iTwinVersion, deviceID, modelID FROM Entry, Device
-            WHERE Entry.deviceID = Device.id ORDER BY modelID
+    decoder = json.JSONDecoder()
+    try:
+        (value, end) = decoder.raw_decode(window, column)
+        return (value, window[:end])
+    except json.JSONDecodeError:
+        pass
+    lines = window.split('\n')
+    stripped = '\n'.join(line[column:] for line in lines)
+    try:
+        (value, end) = decoder.raw_decode(stripped)
+    except json.JSONDecodeError:
+        return None
+    num_lines = stripped.count('\n', 0, end)
+    return (value, '\n'.join(lines[:num_lines + 1]))
+
+def decode_log_entry(log: bytes | mmap.mmap, pos: int) -> tuple[Record | None, int]:
     '''
-    for row in cur.execute(sql):
-        report_rows.append(gen_report_row(db, { 'iTwinVersion': row[0], 'deviceID': row[1] }))
-    columns = [
-        ('modelID', 'Device'),
-        ('osVersion', 'OS Ver'),
-        ('iTwinVersion', 'iTwin Ver'),
-        ('averageTime', 'Average Time'),
-        ('samples', 'Samples')
-    ]
-    table = TextTable(report_rows, columns, [ None, None, None, TextTable.elapsed_string , None ])
-    print(f'Results:\n{table}')
+    Decodes the JSON entry that ActivityTimer logs on the lines following its
+    title, where `pos` is the position in `log` just after the title. The JSON
+    may be logged as-is (as in the Xcode console and log files), or with every
+    line prefixed by the same number of characters (as in logcat output).
 
-def main() -> None:
+    Returns the entry (or None if the title is not followed by a valid JSON
+    entry) and the position in `log` to continue scanning from.
     '''
-    The startuptimes main program.
+
+    # The JSON starts on the line after the title, or on the title's line itself.
+    line_end = log.find(b'\n', pos)
+    search_end = log.find(b'\n', line_end + 1) if line_end >= 0 else -1
+    brace = log.find(b'{', pos, search_end if search_end >= 0 else len(log))
+    if brace < 0:
+        return (None, pos)
+    line_start = log.rfind(b'\n', 0, brace) + 1
+    column = len(log[line_start:brace].decode('utf-8', 'surrogateescape'))
+    window_size = LOG_WINDOW_SIZE
+    while True:
+        window_end = min(len(log), brace + window_size)
+        # surrogateescape lets the consumed text be encoded back to exactly the original bytes.
+        decoded = decode_log_window(
+            log[line_start:window_end].decode('utf-8', 'surrogateescape'), column)
+        if decoded is not None:
+            (entry, consumed) = decoded
+            break
+        if window_end == len(log) or window_size >= MAX_LOG_ENTRY_SIZE:
+            return (None, brace + 1)
+        window_size *= 2
+    try:
+        validate_entry(entry)
+    except ValueError:
+        return (None, brace + 1)
+    return (entry, line_start + len(consumed.encode('utf-8', 'surrogateescape')))
+
+def iter_log_entries(filename: str, title: str = LOG_TITLE) -> Iterator[Record]:
     '''
+    Scans the raw device or console log file named `filename` for the entries
+    logged by ActivityTimer under `title`, and yields each of them.
 
-    parser = argparse.ArgumentParser(
-        description='Script for interacting with iTwin Mobile SDK samples startup times database.',
-        epilog=textwrap.dedent('''
-            When run with no arguments, runs the report command.
-            '''))
-    parser.add_argument(
-        '-d',
-        '--db_filename',
-        dest='db_filename',
-        help='Filename of the SQLite database to use for entries. Default is ./StartupTimes.db.',
-        required=False)
-    sub_parsers=parser.add_subparsers(title='Commands', metavar='')
+    The file is memory-mapped and searched for the title followed by a colon,
+    so the JSON decoder only runs where an entry was logged. Blocks that are
+    not valid JSON entries (for example, the text table format, or output that
+    was cut off when the app was killed) are ignored.
+    '''
 
-    parser_add = sub_parsers.add_parser(
-        'add',
-        help='Add one or more entries from a file or from stdin.',
-        description=textwrap.dedent('''
-            If a filename is specified, that filename is parsed as JSON. If no
-            filename is specified, the user is prompted to enter JSON. The record
-            or records in the JSON are inserted into the database.
+    with open(filename, 'rb') as log_file:
+        if os.fstat(log_file.fileno()).st_size == 0:
+            return
+        with mmap.mmap(log_file.fileno(), 0, access=mmap.ACCESS_READ) as log:
+            marker = f'{title}:'.encode()
+            pos = log.find(marker)
+            while pos >= 0:
+                (entry, pos) = decode_log_entry(log, pos + len(marker))
+                if entry is not None:
+                    yield entry
+                pos = log.find(marker, pos)
 
-            Either way, blank lines in the input are treated as separators between
-            distinct JSON values that will be parsed separately. So, to add multiple
-            entries, you can either put them into a JSON array, or simply put them
-            sequentially with blank lines between them.
-            '''),
-        formatter_class=argparse.RawDescriptionHelpFormatter)
-    parser_add.set_defaults(func=add_command)
-    parser_add.add_argument(
-        '-f',
+# The fields that every entry, device, and checkpoint must contain, along with their types. These
+# match the JSON written by ActivityTimer on iOS and Android.
+ENTRY_FIELDS: dict[str, type | tuple[type, ...]] = {
+    'checkpoints': list,
+    'device': dict,
+    'iTwinVersion': str,
+    'timestamp': str,
+    'title': str,
+    'totalTime': (int, float),
+    'usingRemoteServer': (bool, int)
+}
+DEVICE_FIELDS: dict[str, type | tuple[type, ...]] = {
+    'cpuCores': int,
+    'memory': int,
+    'modelID': str,
+    'modelIDRefURL': str,
+    'systemName': str,
+    'systemVersion': str
+}
+CHECKPOINT_FIELDS: dict[str, type | tuple[type, ...]] = {
+    'action': str,
+    'timestamp': str,
+    'step': (int, float),
+    'total': (int, float)
+}
+
+def validate_entry(entry: Any) -> Record:
+    '''
+    Checks that `entry` has the fields needed to insert it into the database
+    (see `ENTRY_FIELDS`).
+
+    Returns `entry`. Raises ValueError if it is not valid.
+    '''
+
+    def check(record: Any, fields: dict[str, type | tuple[type, ...]], what: str) -> None:
+        if not isinstance(record, dict):
+            raise ValueError(f'{what} is not an object.')
+        for (name, field_type) in fields.items():
+            if not isinstance(record.get(name), field_type):
+                raise ValueError(f'{what} has a missing or invalid {name}.')
+
+    check(entry, ENTRY_FIELDS, 'Entry')
+    check(entry['device'], DEVICE_FIELDS, f'Device of entry {entry["timestamp"]}')
+    for (index, checkpoint) in enumerate(entry['checkpoints']):
+        check(checkpoint, CHECKPOINT_FIELDS, f'Checkpoint {index} of entry {entry["timestamp"]}')
+    return entry
+
+def expand_paths(paths: Iterable[str], extensions: tuple[str, ...] = INPUT_EXTENSIONS) -> list[str]:
+    '''
+    Expands `paths` into a list of filenames. Each path may be a file, a
+    directory (which is searched recursively for files with one of the
+    `extensions`), or a glob pattern (where '**' matches any number of
+    directories) matching files and directories.
+
+    Raises ValueError if a path does not match anything.
+    '''
+
+    filenames = []
+    for path in paths:
+        if any(char in path for char in '*?['):
+            matches = sorted(glob.glob(path, recursive=True))
+        else:
+            matches = [ path ] if os.path.exists(path) else []
+        if len(matches) == 0:
+            raise ValueError(f'No such file or directory: {path}')
+        for match in matches:
+            if os.path.isdir(match):
+                for (dir_path, dir_names, file_names) in os.walk(match):
+                    dir_names.sort()
+                    filenames.extend(
+                        os.path.join(dir_path, file_name) for file_name in sorted(file_names)
+                        if file_name.endswith(extensions))
+            else:
+                filenames.append(match)
+    return filenames
+
+def iter_entries_file(filename: str, jsonl: bool, logs: bool = False) -> Iterator[Record]:
+    '''
+    Reads, parses, and validates the entries in the file named `filename`,
+    treating it as JSON Lines if `jsonl` is True, or as a raw log (see
+    `iter_log_entries`) if `logs` is True.
+
+    Yields each entry. Raises OSError or ValueError if the file cannot be read
+    or an entry is not valid.
+    '''
+
+    if logs:
+        yield from iter_log_entries(filename)
+        return
+    with open(filename, encoding='utf-8') as input_file:
+        entries = iter_json_lines_entries(input_file) if jsonl else iter_json_entries(input_file)
+        yield from map(validate_entry, entries)
+
+class ParseWorker:
+    '''
+    The worker process side of `parse_files`. Each worker parses whole files
+    and sends their entries to the parent process in batches through a
+    bounded queue, so it never holds more than one batch in memory.
+    '''
+
+    queue: Any = None
+    cancelled: Any = None
+
+    @staticmethod
+    def init(queue: Any, cancelled: Any) -> None:
+        '''
+        Initializes a worker process with the `queue` to send batches to and
+        the `cancelled` event that tells it to stop. Multiprocessing queues
+        can only be given to a process when it starts, so this is the
+        initializer of the pool.
+        '''
+
+        ParseWorker.queue = queue
+        ParseWorker.cancelled = cancelled
+        # Batches that the parent will never read must not stop the worker from exiting.
+        queue.cancel_join_thread()
+
+    @staticmethod
+    def parse(index: int, filename: str, jsonl: bool, logs: bool, batch_size: int) -> None:
+        '''
+        Parses the file named `filename` (see `iter_entries_file`), putting an
+        (index, entries) tuple on the queue for each batch of up to
+        `batch_size` entries. This is followed by (index, None) once the whole
+        file is parsed, or (index, exception) if it cannot be parsed.
+        Returns early if `parse_files` is cancelled.
+        '''
+
+        batch: list[Record] = []
+        result: Exception | None = None
+        try:
+            for entry in iter_entries_file(filename, jsonl, logs):
+                batch.append(entry)
+                if len(batch) >= batch_size:
+                    if ParseWorker.cancelled.is_set():
+                        return
+                    ParseWorker.queue.put((index, batch))
+                    batch = []
+        except (OSError, ValueError) as error:
+            result = error
+        if len(batch) > 0:
+            ParseWorker.queue.put((index, batch))
+        ParseWorker.queue.put((index, result))
+
+def parse_files(
+    filenames: Sequence[str],
+    jsonl: bool,
+    logs: bool = False,
+    jobs: int | None = None,
+    batch_size: int = DEFAULT_BATCH_SIZE
+) -> Iterator[tuple[str, list[Record] | Exception | None]]:
+    '''
+    Parses the files named in `filenames` (see `iter_entries_file`) in a pool
+    of `jobs` worker processes (by default, one per CPU). Files ending in
+    '.jsonl' are always treated as JSON Lines.
+
+    Yields a (filename, entries) tuple for each batch of up to `batch_size`
+    entries as soon as a worker has parsed it, so the batches of different
+    files may be interleaved. Once a file has been parsed, (filename, None) is
+    yielded. If it could not be parsed, (filename, exception) is yielded
+    instead, after the batches of the entries preceding the error. Only
+    `PARSE_AHEAD` batches per worker are parsed ahead of the consumer, so
+    memory use depends on neither the size nor the number of the files.
+    '''
+
+    jobs = jobs or os.cpu_count() or 1
+    queue: Any = multiprocessing.Queue(jobs * PARSE_AHEAD)
+    cancelled = multiprocessing.Event()
+    with ProcessPoolExecutor(jobs, initializer=ParseWorker.init,
+                             initargs=(queue, cancelled)) as executor:
+        futures: dict[int, Future] = {}
+        num_submitted = 0
+
+        def submit_files() -> None:
+            nonlocal num_submitted
+            while num_submitted < len(filenames) and len(futures) < 2 * jobs:
+                filename = filenames[num_submitted]
+                futures[num_submitted] = executor.submit(
+                    ParseWorker.parse,
+                    num_submitted,
+                    filename,
+                    jsonl or filename.endswith('.jsonl'),
+                    logs,
+                    batch_size)
+                num_submitted += 1
+
+        try:
+            submit_files()
+            while len(futures) > 0:
+                try:
+                    (index, result) = queue.get(timeout=PARSE_POLL_INTERVAL)
+                except Empty:
+                    index = None
+                if index is None:
+                    # A worker that failed unexpectedly never reports the end of its file.
+                    for future in futures.values():
+                        if future.done() and (error := future.exception()) is not None:
+                            raise error
+                    continue
+                yield (filenames[index], result)
+                if not isinstance(result, list):
+                    del futures[index]
+                    submit_files()
+        finally:
+            cancelled.set()
+            for future in futures.values():
+                future.cancel()
+            # Workers waiting for room in the queue need it drained before they can stop.
+            while any(not future.done() for future in futures.values()):
+                try:
+                    queue.get(timeout=PARSE_POLL_INTERVAL)
+                except Empty:
+                    pass
+
+# pylint: disable-next=too-many-arguments,too-many-positional-arguments
+def ingest_files(
+    db: StartupTimesDB,
+    filenames: Sequence[str],
+    jsonl: bool = False,
+    logs: bool = False,
+    jobs: int | None = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    on_progress: Callable[[int, IngestStats], None] | None = None
+) -> tuple[IngestStats, list[tuple[str, Exception]]]:
+    '''
+    Inserts the entries in the files named in `filenames` into `db`. The files
+    are parsed in parallel by `parse_files`, while this thread inserts the
+    parsed entries in batches (see `StartupTimesDB.insert_entries`), so
+    parsing overlaps with writing. If a file cannot be parsed, the entries
+    preceding the error are inserted and the rest of the file is skipped.
+
+    If `on_progress` is given, it is called with the number of files parsed
+    so far and the running totals after each batch is committed.
+
+    Returns the `IngestStats` and a list of (filename, exception) tuples for
+    the files that could not be parsed.
+    '''
+
+    failures: list[tuple[str, Exception]] = []
+    num_parsed = 0
+
+    def gen_entries() -> Iterator[Record]:
+        nonlocal num_parsed
+        for (filename, entries) in parse_files(filenames, jsonl, logs, jobs, batch_size):
+            if isinstance(entries, list):
+                yield from entries
+            else:
+                num_parsed += 1
+                if entries is not None:
+                    failures.append((filename, entries))
+
+    def on_batch(stats: IngestStats) -> None:
+        if on_progress is not None:
+            on_progress(num_parsed, stats)
+
+    stats = db.insert_entries(gen_entries(), batch_size, on_batch)
+    return (stats, failures)
+
+# Reads the totalTime statistics of each (device, iTwinVersion) group from EntrySummary.
+REPORT_SQL = '''
+    SELECT
+        EntrySummary.deviceID,
+        Device.modelID,
+        Device.systemName,
+        Device.systemVersion,
+        EntrySummary.versionID,
+        Version.name,
+        EntrySummary.count,
+        EntrySummary.sum,
+        EntrySummary.sumSquares,
+        EntrySummary.min,
+        EntrySummary.max
+    FROM EntrySummary
+    JOIN Device ON EntrySummary.deviceID = Device.id
+    JOIN Version ON EntrySummary.versionID = Version.id
+    ORDER BY Device.modelID, EntrySummary.deviceID, Version.name
+'''
+
+def make_report_row(row: tuple) -> Record:
+    '''
+    Converts a raw row returned by `REPORT_SQL` into a report row.
+
+    Returns a dict with data for one row in a report.
+    '''
+
+    (
+        device_id,
+        model_id,
+        system_name,
+        system_version,
+        version_id,
+        itwin_version,
+        count,
+        total,
+        sum_squares,
+        minimum,
+        maximum
+    ) = row
+    average = total / count
+    variance = (sum_squares - total * average) / (count - 1) if count > 1 else 0.0
+    return {
+        'deviceID': device_id,
+        'modelID': model_id,
+        'osVersion': f'{system_name} {system_version}',
+        'versionID': version_id,
+        'iTwinVersion': itwin_version,
+        'averageTime': average,
+        'samples': count,
+        'minTime': minimum,
+        'maxTime': maximum,
+        'stdDevTime': math.sqrt(max(variance, 0.0))
+    }
+
+def gen_report_rows(db: StartupTimesDB) -> Iterator[Record]:
+    '''
+    Generates the report rows for every (device, iTwinVersion) combination in
+    `db` from the EntrySummary table, so the cost is proportional to the
+    number of groups rather than the number of entries. Rows are yielded as
+    they are read from the database.
+    '''
+
+    cur = db.cursor()
+    cur.execute(REPORT_SQL)
+    for row in cur:
+        yield make_report_row(row)
+
+# Computes the same columns as REPORT_SQL across the shards attached to a database (see
+# StartupTimesDB.attach_shard), adding up the EntrySummary rows of each shard for the same device
+# and iTwin version. The device and version ids are those of FederatedDevice and FederatedVersion.
+FEDERATED_REPORT_SQL = '''
+    SELECT
+        FederatedDevice.id,
+        FederatedDevice.modelID,
+        FederatedDevice.systemName,
+        FederatedDevice.systemVersion,
+        FederatedVersion.id,
+        FederatedVersion.name,
+        SUM(Shards.count),
+        SUM(Shards.sum),
+        SUM(Shards.sumSquares),
+        MIN(Shards.min),
+        MAX(Shards.max)
+    FROM ({shards}) AS Shards
+    JOIN temp.ShardDevice
+        ON ShardDevice.shard = Shards.shard AND ShardDevice.deviceID = Shards.deviceID
+    JOIN temp.ShardVersion
+        ON ShardVersion.shard = Shards.shard AND ShardVersion.versionID = Shards.versionID
+    JOIN temp.FederatedDevice ON FederatedDevice.id = ShardDevice.federatedID
+    JOIN temp.FederatedVersion ON FederatedVersion.id = ShardVersion.federatedID
+    GROUP BY FederatedDevice.id, FederatedVersion.id
+    ORDER BY FederatedDevice.modelID, FederatedDevice.id, FederatedVersion.name
+'''
+FEDERATED_SUMMARY_SQL = '''
+    SELECT {shard} AS shard, deviceID, versionID, count, sum, sumSquares, min, max
+        FROM {schema}.EntrySummary
+'''
+
+# Selects the same groups as ENTRY_DISTRIBUTION_SQL across the shards attached to a database, using
+# the ids of FederatedDevice and FederatedVersion.
+FEDERATED_ENTRY_DISTRIBUTION_SQL = '''
+    SELECT ShardDevice.federatedID, ShardVersion.federatedID, Shards.totalTime
+    FROM ({shards}) AS Shards
+    JOIN temp.ShardDevice
+        ON ShardDevice.shard = Shards.shard AND ShardDevice.deviceID = Shards.deviceID
+    JOIN temp.ShardVersion
+        ON ShardVersion.shard = Shards.shard AND ShardVersion.versionID = Shards.versionID
+    ORDER BY 1, 2, 3
+'''
+FEDERATED_ENTRIES_SQL = '''
+    SELECT {shard} AS shard, deviceID, versionID, totalTime FROM {schema}.Entry
+'''
+
+def gen_federated_report_rows(db: StartupTimesDB) -> Iterator[Record]:
+    '''
+    Generates the report rows for every (device, iTwinVersion) combination in
+    the shards attached to `db` (see `StartupTimesDB.attach_shard`) from
+    their EntrySummary tables, without copying any entries.
+    '''
+
+    cur = db.cursor()
+    cur.execute(db.federated_sql(FEDERATED_REPORT_SQL, FEDERATED_SUMMARY_SQL))
+    for row in cur:
+        yield make_report_row(row)
+
+# Reads the Checkpoint.step statistics of each (device, iTwinVersion, action) group from
+# CheckpointSummary. Phases are ordered by where they appear in the entries.
+PHASE_REPORT_SQL = '''
+    SELECT
+        CheckpointSummary.deviceID,
+        Device.modelID,
+        Device.systemName,
+        Device.systemVersion,
+        CheckpointSummary.versionID,
+        Version.name,
+        CheckpointSummary.count,
+        CheckpointSummary.sum,
+        CheckpointSummary.sumSquares,
+        CheckpointSummary.min,
+        CheckpointSummary.max,
+        CheckpointSummary.actionID,
+        Action.name
+    FROM CheckpointSummary
+    JOIN Device ON CheckpointSummary.deviceID = Device.id
+    JOIN Version ON CheckpointSummary.versionID = Version.id
+    JOIN Action ON CheckpointSummary.actionID = Action.id
+    ORDER BY
+        Device.modelID,
+        CheckpointSummary.deviceID,
+        Version.name,
+        CheckpointSummary.firstIndex
+'''
+
+def gen_phase_rows(db: StartupTimesDB) -> Iterator[Record]:
+    '''
+    Generates the phases report rows for every (device, iTwinVersion,
+    action) combination in `db` from the CheckpointSummary table. Each row is
+    a report row (see `make_report_row`) describing the step times of one
+    checkpoint action, with additional 'actionID' and 'action' values.
+    '''
+
+    cur = db.cursor()
+    cur.execute(PHASE_REPORT_SQL)
+    for row in cur:
+        report_row = make_report_row(row[:-2])
+        (report_row['actionID'], report_row['action']) = row[-2:]
+        yield report_row
+
+def percentile(values: Sequence[float], fraction: float) -> float:
+    '''
+    Returns the value at `fraction` (0.0 to 1.0) of the way through the sorted
+    `values`, interpolating linearly between the two closest values.
+    '''
+
+    position = fraction * (len(values) - 1)
+    lower = math.floor(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+# Groups with more values than this use a normal confidence interval instead of a bootstrap one. At
+# this size the bootstrap means are close to normally distributed, and resampling every value of a
+# large group costs O(iterations * count).
+BOOTSTRAP_MAX_VALUES = 500
+
+def normal_interval(
+    mean: float,
+    std_dev: float,
+    count: int,
+    confidence: float
+) -> tuple[float, float]:
+    '''
+    Computes a `confidence` (for example 0.95) confidence interval for a mean
+    of `count` values with the given `mean` and standard deviation, assuming
+    that the mean is normally distributed.
+
+    Returns the lower and upper bounds of the interval.
+    '''
+
+    margin = statistics.NormalDist().inv_cdf((1.0 + confidence) / 2.0) * std_dev / math.sqrt(count)
+    return (mean - margin, mean + margin)
+
+def bootstrap_interval(
+    values: Sequence[float],
+    iterations: int,
+    confidence: float,
+    rand: random.Random
+) -> tuple[float, float]:
+    '''
+    Estimates a `confidence` (for example 0.95) confidence interval for the
+    mean of `values` by computing the means of `iterations` resamples of
+    `values`.
+
+    Returns the lower and upper bounds of the interval.
+    '''
+
+    count = len(values)
+    means = array('d', sorted(sum(rand.choices(values, k=count)) / count
+                              for _ in range(iterations)))
+    tail = (1.0 - confidence) / 2.0
+    return (percentile(means, tail), percentile(means, 1.0 - tail))
+
+def describe(
+    values: Sequence[float],
+    iterations: int = 0,
+    confidence: float = 0.95,
+    rand: random.Random | None = None
+) -> Record:
+    '''
+    Computes distribution statistics for the sorted, non-empty `values`. If
+    `iterations` is greater than 0, a confidence interval for the mean is
+    included: a bootstrap interval for groups of up to `BOOTSTRAP_MAX_VALUES`
+    values, and a normal interval (see `normal_interval`) for larger ones.
+    Otherwise the interval bounds are None.
+
+    Returns a dict containing the statistics.
+    '''
+
+    count = len(values)
+    mean = math.fsum(values) / count
+    variance = (
+        math.fsum((value - mean) ** 2 for value in values) / (count - 1) if count > 1 else 0.0)
+    stats = {
+        'medianTime': percentile(values, 0.5),
+        'p90Time': percentile(values, 0.9),
+        'p99Time': percentile(values, 0.99),
+        'stdDevTime': math.sqrt(variance)
+    }
+    if iterations <= 0:
+        (stats['ciLowTime'], stats['ciHighTime']) = (None, None)
+    elif count > BOOTSTRAP_MAX_VALUES:
+        (stats['ciLowTime'], stats['ciHighTime']) = normal_interval(
+            mean, stats['stdDevTime'], count, confidence)
+    else:
+        (stats['ciLowTime'], stats['ciHighTime']) = bootstrap_interval(
+            values, iterations, confidence, rand or random.Random())
+    return stats
+
+def iter_sorted_groups(cur: sqlite3.Cursor, key_length: int) -> Iterator[tuple[tuple, array]]:
+    '''
+    Splits the rows of an executed query into groups. The first `key_length`
+    columns of each row are the group key, and the last column is a value.
+    The query must be ordered by the key columns and then by the value.
+
+    Yields a (key, values) tuple for each group, where values is an array of
+    doubles. Only one group is held in memory at a time.
+    '''
+
+    key: tuple | None = None
+    values = array('d')
+    while rows := cur.fetchmany(FETCH_SIZE):
+        for row in rows:
+            row_key = row[:key_length]
+            if row_key != key:
+                if key is not None:
+                    yield (key, values)
+                key = row_key
+                values = array('d')
+            values.append(row[key_length])
+    if key is not None:
+        yield (key, values)
+
+def rollup_blob(values: array) -> bytes:
+    '''
+    Returns the doubles in `values` as a blob for the totalTimes and steps
+    columns of EntryRollup and CheckpointRollup: little-endian, so that the
+    database file can be read on any platform.
+    '''
+
+    if sys.byteorder == 'big':
+        values = array('d', values)
+        values.byteswap()
+    return values.tobytes()
+
+def rollup_values(blob: bytes) -> array:
+    '''
+    Returns the doubles in a blob made by `rollup_blob` as an array.
+    '''
+
+    values = array('d')
+    values.frombytes(blob)
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values
+
+def iter_distribution_groups(
+    db: StartupTimesDB,
+    query: tuple[str, Record],
+    rollup_query: tuple[str, Record] | None = None
+) -> Iterator[tuple[tuple, array]]:
+    '''
+    Reads groups of sorted values from `db` for distribution statistics.
+    `query`, the SQL and its named parameters, selects the values for
+    `iter_sorted_groups`. `rollup_query`, if given, selects the same key
+    columns and then a value blob (see `rollup_blob`) from the rollup rows of
+    compacted entries, ordered by the key columns, so that the values of the
+    compacted entries are merged into their groups.
+
+    Yields a (key, values) tuple for each group, in key order, where values
+    is a sorted array of doubles.
+    '''
+
+    cur = db.cursor()
+    cur.execute(*query)
+    key_length = len(cur.description) - 1
+    groups = iter_sorted_groups(cur, key_length)
+    if rollup_query is None:
+        yield from groups
+        return
+    rollup_cur = db.cursor()
+    rollup_cur.execute(*rollup_query)
+    rollups = ((row[:key_length], rollup_values(row[key_length])) for row in rollup_cur)
+
+    def group_key(group: tuple[tuple, array]) -> tuple:
+        return group[0]
+
+    for (key, parts) in itertools.groupby(heapq.merge(groups, rollups, key=group_key), group_key):
+        all_values = [values for (_, values) in parts]
+        yield (key, all_values[0] if len(all_values) == 1 else array('d', heapq.merge(*all_values)))
+
+# Selects Entry.totalTime for each (deviceID, versionID) group, sorted for iter_sorted_groups.
+ENTRY_DISTRIBUTION_SQL = '''
+    SELECT deviceID, versionID, totalTime FROM Entry
+        ORDER BY deviceID, versionID, totalTime
+'''
+
+# Selects Checkpoint.step for each (deviceID, versionID, actionID) group, sorted for
+# iter_sorted_groups.
+PHASE_DISTRIBUTION_SQL = '''
+    SELECT Entry.deviceID, Entry.versionID, Checkpoint.actionID, Checkpoint.step
+        FROM Entry JOIN Checkpoint ON Checkpoint.entryID = Entry.id
+        ORDER BY Entry.deviceID, Entry.versionID, Checkpoint.actionID, Checkpoint.step
+'''
+
+# Select the value blobs of the compacted entries in the same groups as ENTRY_DISTRIBUTION_SQL and
+# PHASE_DISTRIBUTION_SQL, for iter_distribution_groups. As in QUERY_ROLLUP_REPORT_SQL, the rollup
+# rows are given the name Entry and a timestamp so that the conditions of a StartupTimesQuery that
+# selects whole days apply to them as {where}.
+ENTRY_ROLLUP_DISTRIBUTION_SQL = '''
+    SELECT deviceID, versionID, totalTimes
+        FROM (
+            SELECT *, date(day * 86400, 'unixepoch') AS timestamp FROM EntryRollup
+        ) AS Entry
+        {where}
+        ORDER BY deviceID, versionID
+'''
+PHASE_ROLLUP_DISTRIBUTION_SQL = '''
+    SELECT deviceID, versionID, actionID, steps
+        FROM (
+            SELECT *, date(day * 86400, 'unixepoch') AS timestamp FROM CheckpointRollup
+        ) AS Entry
+        {where}
+        ORDER BY deviceID, versionID, actionID
+'''
+
+# pylint: disable-next=too-many-arguments,too-many-positional-arguments
+def gen_distribution_stats(
+    db: StartupTimesDB,
+    iterations: int = 0,
+    confidence: float = 0.95,
+    seed: int | None = None,
+    query: tuple[str, Record] = (ENTRY_DISTRIBUTION_SQL, {}),
+    rollup_query: tuple[str, Record] | None = (ENTRY_ROLLUP_DISTRIBUTION_SQL.format(where=''), {})
+) -> dict[tuple, Record]:
+    '''
+    Computes the distribution statistics (see `describe`) of the values
+    selected by `query` and `rollup_query` (see `iter_distribution_groups`)
+    for each group in `db`. By default this is totalTime for every
+    (deviceID, versionID) combination, including compacted entries. The
+    values are read in bulk, one group at a time, already sorted by SQLite.
+
+    Returns a dict mapping each group key to the statistics.
+    '''
+
+    rand = random.Random(seed)
+    return {
+        key: describe(values, iterations, confidence, rand)
+        for (key, values) in iter_distribution_groups(db, query, rollup_query)
+    }
+
+def itwin_version_key(version: str) -> tuple:
+    '''
+    Returns a sort key for the iTwin version string `version` (for example
+    '4.1.3' or '4.2.0-dev.7'), so that versions sort numerically, with
+    prerelease versions before the corresponding release.
+    '''
+
+    (release, _, prerelease) = version.partition('-')
+    numbers = tuple(int(part) if part.isdigit() else 0 for part in release.split('.'))
+    return (numbers, prerelease == '', prerelease)
+
+def mann_whitney_u(old: Sequence[float], new: Sequence[float]) -> float:
+    '''
+    Performs a one-sided Mann-Whitney U test of whether the values in `new`
+    tend to be larger than the values in `old`. Both sequences must be sorted
+    and non-empty. Uses the normal approximation with tie and continuity
+    corrections.
+
+    Returns the p-value of the test.
+    '''
+
+    num_old = len(old)
+    num_new = len(new)
+    # Count the old values below each new value, with ties counting as half.
+    u_new = math.fsum(
+        (bisect.bisect_left(old, value) + bisect.bisect_right(old, value)) / 2 for value in new)
+    group_sizes = (sum(1 for _ in group) for (_, group) in itertools.groupby(heapq.merge(old, new)))
+    ties = math.fsum(count ** 3 - count for count in group_sizes)
+    total = num_old + num_new
+    variance = num_old * num_new / 12.0 * ((total + 1) - ties / (total * (total - 1)))
+    if variance <= 0.0:
+        return 1.0
+    z_score = (u_new - num_old * num_new / 2.0 - 0.5) / math.sqrt(variance)
+    return 0.5 * math.erfc(z_score / math.sqrt(2.0))
+
+def find_regressions(
+    groups: Iterable[tuple[tuple, array]],
+    alpha: float,
+    min_change: float,
+    min_samples: int
+) -> Iterator[Record]:
+    '''
+    Compares each pair of consecutive iTwin versions for each device and
+    phase in `groups`. Each element of `groups` is a ((deviceID,
+    iTwinVersion, phase), sorted values) tuple, and `groups` must be ordered
+    by deviceID. (See `iter_sorted_groups`.)
+
+    Yields a record for each comparison whose median increased by at least
+    `min_change` (a fraction) with a Mann-Whitney U p-value below `alpha`.
+    Versions with fewer than `min_samples` values are ignored.
+    '''
+
+    def compare(device_id: int, by_phase: dict[str, dict[str, array]]) -> Iterator[Record]:
+        for (phase, by_version) in by_phase.items():
+            versions = sorted(
+                (version for (version, values) in by_version.items() if len(values) >= min_samples),
+                key=itwin_version_key)
+            for (old_version, new_version) in zip(versions, versions[1:]):
+                old = by_version[old_version]
+                new = by_version[new_version]
+                old_median = percentile(old, 0.5)
+                new_median = percentile(new, 0.5)
+                if old_median <= 0.0 or (new_median - old_median) / old_median < min_change:
+                    continue
+                p_value = mann_whitney_u(old, new)
+                if p_value < alpha:
+                    yield {
+                        'deviceID': device_id,
+                        'phase': phase,
+                        'oldVersion': old_version,
+                        'newVersion': new_version,
+                        'oldMedian': old_median,
+                        'newMedian': new_median,
+                        'change': f'{(new_median - old_median) / old_median * 100.0:+.1f}%',
+                        'pValue': f'{p_value:.2g}',
+                        'samples': f'{len(old)}/{len(new)}'
+                    }
+
+    device_id: int | None = None
+    by_phase: dict[str, dict[str, array]] = {}
+    for ((group_device_id, version, phase), values) in groups:
+        if group_device_id != device_id:
+            if device_id is not None:
+                yield from compare(device_id, by_phase)
+            device_id = group_device_id
+            by_phase = {}
+        by_phase.setdefault(phase, {})[version] = values
+    if device_id is not None:
+        yield from compare(device_id, by_phase)
+
+class EntryRow(NamedTuple):
+    '''
+    An entry selected by a `StartupTimesQuery`, with its device and iTwin
+    version.
+    '''
+
+    id: int
+    deviceID: int
+    modelID: str
+    systemName: str
+    systemVersion: str
+    iTwinVersion: str
+    title: str
+    timestamp: str
+    totalTime: float
+    usingRemoteServer: bool
+
+# Selects an EntryRow for each of the first :limit entries matching {where}, in the (timestamp, id)
+# order used for keyset pagination.
+QUERY_ENTRIES_SQL = '''
+    SELECT
+        Entry.id,
+        Entry.deviceID,
+        Device.modelID,
+        Device.systemName,
+        Device.systemVersion,
+        Version.name,
+        Entry.title,
+        Entry.timestamp,
+        Entry.totalTime,
+        Entry.usingRemoteServer
+    FROM Entry
+    JOIN Device ON Entry.deviceID = Device.id
+    JOIN Version ON Entry.versionID = Version.id
+    {where}
+    ORDER BY Entry.timestamp, Entry.id
+    LIMIT :limit
+'''
+
+# Computes the same columns as REPORT_SQL from Entry, for filtered reports, which cannot use
+# EntrySummary. (See StartupTimesQuery.restrict.)
+QUERY_REPORT_SQL = '''
+    SELECT
+        Entry.deviceID,
+        Device.modelID,
+        Device.systemName,
+        Device.systemVersion,
+        Entry.versionID,
+        Version.name,
+        COUNT(*),
+        SUM(Entry.totalTime),
+        SUM(Entry.totalTime * Entry.totalTime),
+        MIN(Entry.totalTime),
+        MAX(Entry.totalTime)
+    FROM Entry
+    JOIN Device ON Entry.deviceID = Device.id
+    JOIN Version ON Entry.versionID = Version.id
+    GROUP BY Entry.deviceID, Entry.versionID
+    ORDER BY Device.modelID, Entry.deviceID, Version.name
+'''
+
+# Computes the same columns as PHASE_REPORT_SQL from Checkpoint, for filtered phase reports, which
+# cannot use CheckpointSummary. (See StartupTimesQuery.restrict.)
+QUERY_PHASE_REPORT_SQL = '''
+    SELECT
+        Entry.deviceID,
+        Device.modelID,
+        Device.systemName,
+        Device.systemVersion,
+        Entry.versionID,
+        Version.name,
+        COUNT(*),
+        SUM(Checkpoint.step),
+        SUM(Checkpoint.step * Checkpoint.step),
+        MIN(Checkpoint.step),
+        MAX(Checkpoint.step),
+        Checkpoint.actionID,
+        Action.name
+    FROM Entry
+    JOIN Checkpoint ON Checkpoint.entryID = Entry.id
+    JOIN Device ON Entry.deviceID = Device.id
+    JOIN Version ON Entry.versionID = Version.id
+    JOIN Action ON Checkpoint.actionID = Action.id
+    GROUP BY Entry.deviceID, Entry.versionID, Checkpoint.actionID
+    ORDER BY Device.modelID, Entry.deviceID, Version.name, MIN(Checkpoint.arrayIndex)
+'''
+
+# Like QUERY_REPORT_SQL, but also adds in the EntryRollup rows of compacted entries. The rollup rows
+# are given the name Entry and a timestamp (the date of the day) so that the conditions of a
+# StartupTimesQuery that selects whole days apply to them as {where}, as in TREND_SUMMARY_DAYS_SQL.
+QUERY_ROLLUP_REPORT_SQL = '''
+    SELECT
+        Groups.deviceID,
+        Device.modelID,
+        Device.systemName,
+        Device.systemVersion,
+        Groups.versionID,
+        Version.name,
+        SUM(Groups.count),
+        SUM(Groups.sum),
+        SUM(Groups.sumSquares),
+        MIN(Groups.min),
+        MAX(Groups.max)
+    FROM (
+        SELECT
+            deviceID,
+            versionID,
+            COUNT(*) AS count,
+            SUM(totalTime) AS sum,
+            SUM(totalTime * totalTime) AS sumSquares,
+            MIN(totalTime) AS min,
+            MAX(totalTime) AS max
+        FROM Entry
+        GROUP BY deviceID, versionID
+        UNION ALL
+        SELECT deviceID, versionID, count, sum, sumSquares, min, max
+        FROM (
+            SELECT *, date(day * 86400, 'unixepoch') AS timestamp FROM EntryRollup
+        ) AS Entry
+        {where}
+    ) AS Groups
+    JOIN Device ON Groups.deviceID = Device.id
+    JOIN Version ON Groups.versionID = Version.id
+    GROUP BY Groups.deviceID, Groups.versionID
+    ORDER BY Device.modelID, Groups.deviceID, Version.name
+'''
+
+# Like QUERY_PHASE_REPORT_SQL, but also adds in the CheckpointRollup rows of compacted entries.
+# (See QUERY_ROLLUP_REPORT_SQL.)
+QUERY_ROLLUP_PHASE_REPORT_SQL = '''
+    SELECT
+        Groups.deviceID,
+        Device.modelID,
+        Device.systemName,
+        Device.systemVersion,
+        Groups.versionID,
+        Version.name,
+        SUM(Groups.count),
+        SUM(Groups.sum),
+        SUM(Groups.sumSquares),
+        MIN(Groups.min),
+        MAX(Groups.max),
+        Groups.actionID,
+        Action.name
+    FROM (
+        SELECT
+            Entry.deviceID,
+            Entry.versionID,
+            Checkpoint.actionID,
+            MIN(Checkpoint.arrayIndex) AS firstIndex,
+            COUNT(*) AS count,
+            SUM(Checkpoint.step) AS sum,
+            SUM(Checkpoint.step * Checkpoint.step) AS sumSquares,
+            MIN(Checkpoint.step) AS min,
+            MAX(Checkpoint.step) AS max
+        FROM Entry
+        JOIN Checkpoint ON Checkpoint.entryID = Entry.id
+        GROUP BY Entry.deviceID, Entry.versionID, Checkpoint.actionID
+        UNION ALL
+        SELECT deviceID, versionID, actionID, firstIndex, count, sum, sumSquares, min, max
+        FROM (
+            SELECT *, date(day * 86400, 'unixepoch') AS timestamp FROM CheckpointRollup
+        ) AS Entry
+        {where}
+    ) AS Groups
+    JOIN Device ON Groups.deviceID = Device.id
+    JOIN Version ON Groups.versionID = Version.id
+    JOIN Action ON Groups.actionID = Action.id
+    GROUP BY Groups.deviceID, Groups.versionID, Groups.actionID
+    ORDER BY Device.modelID, Groups.deviceID, Version.name, MIN(Groups.firstIndex)
+'''
+
+def is_date(value: str) -> bool:
+    '''
+    Returns True if `value` is a plain date, such as '2024-01-01', with no
+    time.
+    '''
+
+    try:
+        datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        return False
+    return len(value) == 10
+
+# The SQL expression for the first day (see EntryDaySummary) of the bucket containing day, for
+# each trend bucket size. Weeks start on Monday (1970-01-01 was a Thursday).
+TREND_BUCKETS = {
+    'day': 'day',
+    'week': '(day + 3) / 7 * 7 - 3',
+    'month': "CAST(julianday(day * 86400, 'unixepoch', 'start of month') - 2440587.5 AS INTEGER)"
+}
+
+# Adds up the per-day statistics selected by {days} into the buckets computed by {bucket} (one of
+# TREND_BUCKETS), for each device and iTwin version. Each row has the same columns as REPORT_SQL,
+# followed by the date of the first day of the bucket.
+TREND_SQL = '''
+    SELECT
+        Days.deviceID,
+        Device.modelID,
+        Device.systemName,
+        Device.systemVersion,
+        Days.versionID,
+        Version.name,
+        SUM(Days.count),
+        SUM(Days.sum),
+        SUM(Days.sumSquares),
+        MIN(Days.min),
+        MAX(Days.max),
+        date(Days.bucket * 86400, 'unixepoch')
+    FROM (
+        SELECT deviceID, versionID, {bucket} AS bucket, count, sum, sumSquares, min, max
+            FROM ({days})
+    ) AS Days
+    JOIN Device ON Days.deviceID = Device.id
+    JOIN Version ON Days.versionID = Version.id
+    GROUP BY Days.deviceID, Days.versionID, Days.bucket
+    ORDER BY Device.modelID, Days.deviceID, Version.name, Days.bucket
+'''
+
+# The per-day statistics for TREND_SQL, read from EntryDaySummary. The summary rows are given the
+# name Entry and a timestamp (the date of the day) so that the conditions of a StartupTimesQuery
+# that selects whole days of entries from whole devices apply to them as {where}.
+TREND_SUMMARY_DAYS_SQL = '''
+    SELECT deviceID, versionID, day, count, sum, sumSquares, min, max
+    FROM (
+        SELECT *, date(day * 86400, 'unixepoch') AS timestamp FROM EntryDaySummary
+    ) AS Entry
+    {where}
+'''
+
+# The per-day statistics for TREND_SQL, computed from Entry, for filters that EntryDaySummary
+# cannot answer. (See StartupTimesQuery.restrict.)
+TREND_ENTRY_DAYS_SQL = '''
+    SELECT
+        deviceID,
+        versionID,
+        epochMillis / 86400000 AS day,
+        COUNT(*) AS count,
+        SUM(totalTime) AS sum,
+        SUM(totalTime * totalTime) AS sumSquares,
+        MIN(totalTime) AS min,
+        MAX(totalTime) AS max
+    FROM Entry
+    WHERE epochMillis IS NOT NULL
+    GROUP BY deviceID, versionID, day
+'''
+
+class StartupTimesQuery:
+    '''
+    Builds parameterized SQL that selects the entries in a `StartupTimesDB`
+    matching a set of filters, and runs the queries that the commands need
+    over those entries.
+
+    Each filter method returns a new query with the filter added, so a query
+    can be kept and used as the base of others. The filters are combined with
+    AND. Every filter can be answered from an index: timestamps use
+    Entry_timestamp, devices use Entry_lookup or Entry_deviceID_versionID,
+    and titles and usingRemoteServer use the indexes of the same names. (The
+    'query' benchmark checks each plan with EXPLAIN QUERY PLAN.)
+
+    Queries that page through entries use the conditions directly (see
+    `where`), so SQLite can use an index that is already in (timestamp, id)
+    order and stop after one page. Queries that aggregate entries are
+    restricted to the matching entries by `restrict` instead.
+    '''
+
+    __db: StartupTimesDB
+    __conditions: tuple[str, ...]
+    __params: Record
+    __by_day: bool
+
+    def __init__(self, db: StartupTimesDB) -> None:
+        '''
+        Creates a query that selects every entry in `db`.
+        '''
+
+        self.__db = db
+        self.__conditions = ()
+        self.__params = {}
+        self.__by_day = True
+
+    def __with(self, condition: str, *values: Any, by_day: bool = False) -> 'StartupTimesQuery':
+        '''
+        Creates a copy of this query with `condition` added. Each '?' in
+        `condition` is replaced with a uniquely named parameter for the
+        corresponding value in `values`. `by_day` tells whether `condition`
+        can be applied to EntryDaySummary (see `by_day`).
+
+        Returns the new query.
+        '''
+
+        # The copy is a StartupTimesQuery too, so its private members are this class's own.
+        # pylint: disable=protected-access,unused-private-member
+        query = StartupTimesQuery(self.__db)
+        query.__params = dict(self.__params)
+        query.__by_day = self.__by_day and by_day
+        parts = condition.split('?')
+        for (i, value) in enumerate(values):
+            name = f'p{len(query.__params)}'
+            query.__params[name] = value
+            parts[i] += f':{name}'
+        query.__conditions = self.__conditions + (''.join(parts),)
+        return query
+
+    @staticmethod
+    def __placeholders(values: Sequence[Any]) -> str:
+        '''
+        Returns a '?' for each of `values`, separated by commas, for an IN list.
+        '''
+
+        if len(values) == 0:
+            raise ValueError('At least one value is required.')
+        return ', '.join('?' * len(values))
+
+    def since(self, timestamp: str) -> 'StartupTimesQuery':
+        '''
+        Selects the entries recorded at or after `timestamp`, an ISO 8601 UTC
+        date or time such as '2024-01-01' or '2024-01-01T12:00:00Z'.
+        Timestamps are compared as text, the way they are stored.
+        '''
+
+        return self.__with('Entry.timestamp >= ?', timestamp, by_day=is_date(timestamp))
+
+    def until(self, timestamp: str) -> 'StartupTimesQuery':
+        '''
+        Selects the entries recorded before `timestamp` (see `since`).
+        '''
+
+        return self.__with('Entry.timestamp < ?', timestamp, by_day=is_date(timestamp))
+
+    def model_ids(self, *model_ids: str) -> 'StartupTimesQuery':
+        '''
+        Selects the entries from devices with any of the given modelIDs.
+        '''
+
+        return self.__with(
+            'Entry.deviceID IN (SELECT id FROM Device WHERE modelID IN '
+            f'({StartupTimesQuery.__placeholders(model_ids)}))',
+            *model_ids,
+            by_day=True)
+
+    def system_versions(self, *system_versions: str) -> 'StartupTimesQuery':
+        '''
+        Selects the entries from devices with any of the given systemVersions.
+        '''
+
+        return self.__with(
+            'Entry.deviceID IN (SELECT id FROM Device WHERE systemVersion IN '
+            f'({StartupTimesQuery.__placeholders(system_versions)}))',
+            *system_versions,
+            by_day=True)
+
+    def titles(self, *titles: str) -> 'StartupTimesQuery':
+        '''
+        Selects the entries with any of the given titles.
+        '''
+
+        return self.__with(f'Entry.title IN ({StartupTimesQuery.__placeholders(titles)})', *titles)
+
+    def using_remote_server(self, using_remote_server: bool) -> 'StartupTimesQuery':
+        '''
+        Selects the entries whose usingRemoteServer is `using_remote_server`.
+        '''
+
+        return self.__with('Entry.usingRemoteServer = ?', int(using_remote_server))
+
+    @property
+    def db(self) -> StartupTimesDB:
+        '''
+        The database that the query reads from.
+        '''
+
+        return self.__db
+
+    @property
+    def filtered(self) -> bool:
+        '''
+        Whether the query has any filters.
+        '''
+
+        return len(self.__conditions) > 0
+
+    @property
+    def by_day(self) -> bool:
+        '''
+        Whether every filter selects whole UTC days of entries from whole
+        devices (date ranges given as plain dates, models, and OS versions), so
+        that the filters can be applied to EntryDaySummary.
+        '''
+
+        return self.__by_day
+
+    def where(self, *conditions: str) -> tuple[str, Record]:
+        '''
+        Combines the filters with any extra `conditions`.
+
+        Returns a WHERE clause (or '' if there are no conditions) and the
+        named parameters it uses.
+        '''
+
+        all_conditions = self.__conditions + conditions
+        if len(all_conditions) == 0:
+            return ('', {})
+        return (f'WHERE {" AND ".join(all_conditions)}', dict(self.__params))
+
+    def restrict(self, sql: str) -> tuple[str, Record]:
+        '''
+        Restricts `sql`, any query that refers to Entry, to the matching
+        entries, by defining a materialized common table expression named
+        Entry that hides the table. SQLite fills it using the indexes for the
+        filters, rather than an index that suits the GROUP BY or ORDER BY of
+        `sql` but not the filters. Without filters, `sql` is unchanged.
+
+        Returns the SQL and its named parameters.
+        '''
+
+        if not self.filtered:
+            return (sql, {})
+        (where, params) = self.where()
+        return (f'WITH Entry AS MATERIALIZED (SELECT * FROM main.Entry {where}) {sql}', params)
+
+    def page_sql(self, limit: int, after: EntryRow | None = None) -> tuple[str, Record]:
+        '''
+        Builds the query for `page`.
+
+        Returns the SQL and its named parameters.
+        '''
+
+        conditions = []
+        if after is not None:
+            conditions.append('(Entry.timestamp, Entry.id) > (:afterTimestamp, :afterID)')
+        (where, params) = self.where(*conditions)
+        params['limit'] = limit
+        if after is not None:
+            params['afterTimestamp'] = after.timestamp
+            params['afterID'] = after.id
+        return (QUERY_ENTRIES_SQL.format(where=where), params)
+
+    def page(self, limit: int, after: EntryRow | None = None) -> list[EntryRow]:
+        '''
+        Selects the first `limit` matching entries in (timestamp, id) order
+        that come after the entry `after`, or from the start if `after` is
+        None. Passing the last entry of a page as `after` gets the next page,
+        without reading any of the entries before it (keyset pagination).
+
+        Returns the entries.
+        '''
+
+        cur = self.__db.cursor()
+        cur.execute(*self.page_sql(limit, after))
+        return [EntryRow(*row[:-1], row[-1] != 0) for row in cur.fetchall()]
+
+    def entries(self, page_size: int = FETCH_SIZE) -> Iterator[EntryRow]:
+        '''
+        Generates all of the matching entries in (timestamp, id) order, reading
+        them one page of `page_size` entries at a time.
+        '''
+
+        after = None
+        while entries := self.page(page_size, after):
+            yield from entries
+            after = entries[-1]
+
+    def __rollup_sql(self, sql: str, rollup_sql: str) -> str:
+        '''
+        Returns `rollup_sql`, with the filters applied to the rollup rows, if
+        the database has been compacted and the filters allow it (see
+        `by_day`), or else `sql`, which only reads the raw entries.
+        '''
+
+        if not self.__by_day or self.__db.compacted_before is None:
+            return sql
+        return rollup_sql.format(where=self.where()[0])
+
+    def report_rows(self) -> Iterator[Record]:
+        '''
+        Generates the report rows (see `make_report_row`) for the matching
+        entries. Without filters, these come from EntrySummary (see
+        `gen_report_rows`). Compacted entries are included if the filters
+        allow it (see `by_day`).
+        '''
+
+        if not self.filtered:
+            yield from gen_report_rows(self.__db)
+            return
+        cur = self.__db.cursor()
+        cur.execute(*self.restrict(self.__rollup_sql(QUERY_REPORT_SQL, QUERY_ROLLUP_REPORT_SQL)))
+        for row in cur:
+            yield make_report_row(row)
+
+    def phase_rows(self) -> Iterator[Record]:
+        '''
+        Generates the phases report rows (see `gen_phase_rows`) for the
+        matching entries. Without filters, these come from CheckpointSummary.
+        Compacted entries are included if the filters allow it (see
+        `by_day`).
+        '''
+
+        if not self.filtered:
+            yield from gen_phase_rows(self.__db)
+            return
+        cur = self.__db.cursor()
+        cur.execute(*self.restrict(
+            self.__rollup_sql(QUERY_PHASE_REPORT_SQL, QUERY_ROLLUP_PHASE_REPORT_SQL)))
+        for row in cur:
+            report_row = make_report_row(row[:-2])
+            (report_row['actionID'], report_row['action']) = row[-2:]
+            yield report_row
+
+    def trend_rows(self, bucket: str = 'week') -> Iterator[Record]:
+        '''
+        Generates a report row (see `make_report_row`) for each device and
+        iTwin version in each `bucket` (one of the keys of `TREND_BUCKETS`) of
+        time with matching entries, in bucket order within each device and
+        version. The date of the first day of the bucket is in the 'bucket'
+        value. Entries whose timestamp cannot be parsed are left out.
+
+        If the filters allow it (see `by_day`), the rows are added up from
+        EntryDaySummary, so the cost is proportional to the number of days
+        rather than the number of entries.
+        '''
+
+        if self.__by_day:
+            (where, params) = self.where()
+            days = TREND_SUMMARY_DAYS_SQL.format(where=where)
+            sql = TREND_SQL.format(bucket=TREND_BUCKETS[bucket], days=days)
+        else:
+            (sql, params) = self.restrict(
+                TREND_SQL.format(bucket=TREND_BUCKETS[bucket], days=TREND_ENTRY_DAYS_SQL))
+        cur = self.__db.cursor()
+        cur.execute(sql, params)
+        for row in cur:
+            report_row = make_report_row(row[:-1])
+            report_row['bucket'] = row[-1]
+            yield report_row
+
+    def __rollup_query(self, rollup_sql: str | None) -> tuple[str, Record] | None:
+        '''
+        Returns `rollup_sql` and its parameters, with the filters applied to
+        the rollup rows, if the database has been compacted and the filters
+        allow it (see `by_day`), or else None.
+        '''
+
+        if rollup_sql is None or not self.__by_day or self.__db.compacted_before is None:
+            return None
+        (where, params) = self.where()
+        return (rollup_sql.format(where=where), params)
+
+    def distribution_groups(
+        self,
+        sql: str = ENTRY_DISTRIBUTION_SQL,
+        rollup_sql: str | None = ENTRY_ROLLUP_DISTRIBUTION_SQL
+    ) -> Iterator[tuple[tuple, array]]:
+        '''
+        Generates the groups of sorted values selected by `sql` from the
+        matching entries (see `iter_distribution_groups`). The values of
+        compacted entries, selected by `rollup_sql`, are merged in if the
+        filters allow it (see `by_day`).
+        '''
+
+        return iter_distribution_groups(
+            self.__db, self.restrict(sql), self.__rollup_query(rollup_sql))
+
+    def distribution_stats(
+        self,
+        iterations: int = 0,
+        confidence: float = 0.95,
+        seed: int | None = None,
+        sql: tuple[str, str | None] = (ENTRY_DISTRIBUTION_SQL, ENTRY_ROLLUP_DISTRIBUTION_SQL)
+    ) -> dict[tuple, Record]:
+        '''
+        Computes the distribution statistics of the groups selected by `sql`,
+        the arguments of `distribution_groups`, from the matching entries (see
+        `gen_distribution_stats`).
+        '''
+
+        (entry_sql, rollup_sql) = sql
+        return gen_distribution_stats(
+            self.__db, iterations, confidence, seed, self.restrict(entry_sql),
+            self.__rollup_query(rollup_sql))
+
+    def explain(self, sql: str, params: Record) -> list[str]:
+        '''
+        Runs EXPLAIN QUERY PLAN on `sql` with `params`.
+
+        Returns the detail of each step of the plan.
+        '''
+
+        cur = self.__db.cursor()
+        cur.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        return [row[3] for row in cur.fetchall()]
+
+# pylint: disable-next=too-many-instance-attributes,too-few-public-methods
+class IngestServer:
+    '''
+    The asyncio HTTP server run by the 'serve' command. (See command help for
+    more info.)
+
+    Entries POSTed to /entries are validated and put on a bounded in-memory
+    queue. A single writer task takes whatever is on the queue (up to the
+    batch size) and inserts it with `StartupTimesDB.insert_entries` on a
+    dedicated thread, so SQLite never blocks the event loop and each batch is
+    one transaction. When the queue does not have room for a request's
+    entries, the request is rejected with 503 so the client backs off, or with
+    413 if the queue could never hold them. /report and /metrics are answered
+    from aggregates that the writer refreshes after each batch.
+    '''
+
+    __filename: str
+    __queue_size: int
+    __batch_size: int
+    __busy_timeout: float
+    __profiler: Profiler | None
+    __db: StartupTimesDB | None
+    __connections: set[asyncio.StreamWriter]
+    __report: bytes
+    __samples: int
+    __counters: dict[str, float]
+
+    def __init__(
+        self,
+        filename: str,
+        queue_size: int = DEFAULT_QUEUE_SIZE,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        busy_timeout: float = DEFAULT_BUSY_TIMEOUT,
+        profiler: Profiler | None = None
+    ) -> None:
+        self.__filename = filename
+        self.__queue_size = queue_size
+        self.__batch_size = batch_size
+        self.__busy_timeout = busy_timeout
+        self.__profiler = profiler
+        self.__db = None
+        self.__connections = set()
+        self.__report = b'[]'
+        self.__samples = 0
+        self.__counters = dict.fromkeys([
+            'requests',
+            'requests_rejected',
+            'entries_received',
+            'entries_inserted',
+            'entries_skipped',
+            'entries_failed',
+            'batches',
+            'write_seconds'
+        ], 0)
+
+    def __open_db(self) -> None:
+        '''
+        Opens the database on the writer thread, which is the only thread that
+        uses it.
+        '''
+
+        self.__db = StartupTimesDB(
+            self.__filename, busy_timeout=self.__busy_timeout, profiler=self.__profiler)
+        self.__refresh_report()
+
+    def __refresh_report(self) -> None:
+        '''
+        Recomputes the cached report from the summary tables. Runs on the
+        writer thread.
+        '''
+
+        assert self.__db is not None
+        with self.__db.profiler.phase('query'):
+            rows = list(StartupTimesQuery(self.__db).report_rows())
+        self.__samples = sum(row['samples'] for row in rows)
+        self.__report = json.dumps(rows).encode()
+
+    def __write_batch(self, batch: list[Record]) -> IngestStats:
+        '''
+        Inserts `batch` in a single transaction and refreshes the cached
+        report. Runs on the writer thread.
+        '''
+
+        assert self.__db is not None
+        stats = self.__db.insert_entries(batch, len(batch))
+        self.__refresh_report()
+        return stats
+
+    async def __write_entries(self, queue: asyncio.Queue, executor: ThreadPoolExecutor) -> None:
+        '''
+        The writer task. Inserts the entries from `queue` in batches until it
+        gets None, which is queued after all other entries on shutdown.
+        '''
+
+        loop = asyncio.get_running_loop()
+        done = False
+        while not done:
+            batch = [ await queue.get() ]
+            while len(batch) < self.__batch_size and not queue.empty():
+                batch.append(queue.get_nowait())
+            if batch[-1] is None:
+                done = True
+                batch.pop()
+            if len(batch) == 0:
+                continue
+            start = time.perf_counter()
+            try:
+                stats = await loop.run_in_executor(executor, self.__write_batch, batch)
+                self.__counters['entries_inserted'] += stats.inserted
+                self.__counters['entries_skipped'] += stats.skipped
+            except Exception as error: # pylint: disable=broad-exception-caught
+                # The batch was rolled back. Keep serving, but make the loss visible.
+                self.__counters['entries_failed'] += len(batch)
+                print(f'Failed to insert {len(batch)} entries: {error}', file=sys.stderr)
+            self.__counters['batches'] += 1
+            self.__counters['write_seconds'] += time.perf_counter() - start
+
+    def __metrics(self, queue: asyncio.Queue) -> bytes:
+        '''
+        Returns the server metrics in the Prometheus text format.
+        '''
+
+        lines = [
+            f'startuptimes_{name}_total {value:g}' for (name, value) in self.__counters.items()
+        ]
+        lines.extend([
+            f'startuptimes_queue_depth {queue.qsize()}',
+            f'startuptimes_queue_capacity {self.__queue_size}',
+            f'startuptimes_report_samples {self.__samples}'
+        ])
+        return ('\n'.join(lines) + '\n').encode()
+
+    # Each route and each reason to reject a request returns its own response.
+    # pylint: disable-next=too-many-return-statements
+    def __handle_request(
+        self,
+        queue: asyncio.Queue,
+        method: str,
+        path: str,
+        body: bytes
+    ) -> tuple[int, str, bytes]:
+        '''
+        Handles one request.
+
+        Returns the status code, content type, and body of the response.
+        '''
+
+        self.__counters['requests'] += 1
+        routes = { '/entries': 'POST', '/report': 'GET', '/metrics': 'GET' }
+        if path not in routes:
+            return (404, 'text/plain', b'Not found.\n')
+        if method != routes[path]:
+            return (405, 'text/plain', f'Use {routes[path]}.\n'.encode())
+        if path == '/report':
+            return (200, 'application/json', self.__report)
+        if path == '/metrics':
+            return (200, 'text/plain; version=0.0.4', self.__metrics(queue))
+        try:
+            # iter_json_entries accepts a single value, arrays, and NDJSON.
+            entries = [
+                validate_entry(entry)
+                for entry in iter_json_entries(StringIO(body.decode('utf-8')))
+            ]
+        except ValueError as error:
+            return (400, 'text/plain', f'{error}\n'.encode())
+        if len(entries) > self.__queue_size:
+            # This can never fit in the queue, so retrying would not help.
+            message = f'Send at most {self.__queue_size} entries at a time.\n'
+            return (413, 'text/plain', message.encode())
+        if queue.qsize() + len(entries) > self.__queue_size:
+            self.__counters['requests_rejected'] += 1
+            return (503, 'text/plain', b'Queue is full. Try again later.\n')
+        for entry in entries:
+            queue.put_nowait(entry)
+        self.__counters['entries_received'] += len(entries)
+        return (202, 'application/json', json.dumps({ 'queued': len(entries) }).encode())
+
+    @staticmethod
+    def __parse_head(head: bytes) -> tuple[str, str, str, dict[str, str]]:
+        '''
+        Parses the head of an HTTP request.
+
+        Returns the method, target, and HTTP version of the request, and its
+        headers with lowercase names.
+        '''
+
+        (request_line, *header_lines) = head.decode('latin-1').rstrip('\r\n').split('\r\n')
+        (method, target, version) = (request_line.split(' ') + [ '', '' ])[:3]
+        headers = {}
+        for line in header_lines:
+            (name, _, value) = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+        return (method, target, version, headers)
+
+    @staticmethod
+    def __format_response(response: tuple[int, str, bytes], keep_alive: bool) -> bytes:
+        '''
+        Formats `response`, a tuple of the status code, content type, and
+        body, as an HTTP/1.1 response that closes the connection unless
+        `keep_alive` is True.
+        '''
+
+        (status, content_type, body) = response
+        head = (
+            f'HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n'
+            f'Content-Type: {content_type}\r\n'
+            f'Content-Length: {len(body)}\r\n'
+            + ('Retry-After: 1\r\n' if status == 503 else '')
+            + ('' if keep_alive else 'Connection: close\r\n')
+            + '\r\n')
+        return head.encode('latin-1') + body
+
+    async def __handle_connection(
+        self,
+        queue: asyncio.Queue,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter
+    ) -> None:
+        '''
+        Serves the HTTP/1.1 requests on one connection, keeping it open
+        between requests unless the client asks to close it.
+        '''
+
+        self.__connections.add(writer)
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b'\r\n\r\n')
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+                    break
+                (method, target, version, headers) = IngestServer.__parse_head(head)
+                keep_alive = (headers.get('connection', '').lower() != 'close'
+                              and version == 'HTTP/1.1')
+                length_value = headers.get('content-length', '0') or '0'
+                valid_length = length_value.isascii() and length_value.isdigit()
+                length = int(length_value) if valid_length else -1
+                if method == 'POST' and 'content-length' not in headers:
+                    response = (411, 'text/plain', b'Content-Length is required.\n')
+                    keep_alive = False
+                elif length < 0:
+                    response = (400, 'text/plain', b'Content-Length is not valid.\n')
+                    keep_alive = False
+                elif length > MAX_REQUEST_SIZE:
+                    response = (413, 'text/plain', b'Request is too large.\n')
+                    keep_alive = False
+                else:
+                    if headers.get('expect', '').lower() == '100-continue':
+                        writer.write(b'HTTP/1.1 100 Continue\r\n\r\n')
+                    body = await reader.readexactly(length)
+                    response = self.__handle_request(queue, method, target.partition('?')[0], body)
+                writer.write(IngestServer.__format_response(response, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.__connections.discard(writer)
+            writer.close()
+
+    async def run(
+        self,
+        host: str,
+        port: int,
+        on_listening: Callable[[str, int], None] | None = None
+    ) -> None:
+        '''
+        Serves requests on `host` and `port` until SIGINT or SIGTERM is
+        received, then stops accepting requests, writes all of the queued
+        entries, and returns. `on_listening` is called with the address and
+        port being served once the server is listening.
+        '''
+
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        stop = asyncio.Event()
+        for signal_number in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(signal_number, stop.set)
+            except NotImplementedError:
+                # Windows event loops do not support signal handlers. Ctrl+C still stops the
+                # server, but without writing the queued entries.
+                pass
+        with ThreadPoolExecutor(1) as executor:
+            await loop.run_in_executor(executor, self.__open_db)
+            writer_task = asyncio.create_task(self.__write_entries(queue, executor))
+            server = await asyncio.start_server(
+                partial(self.__handle_connection, queue), host, port, limit=MAX_HEADER_SIZE)
+            if on_listening is not None:
+                (address, bound_port) = server.sockets[0].getsockname()[:2]
+                on_listening(address, bound_port)
+            await stop.wait()
+            server.close()
+            # Idle keep-alive connections would otherwise keep the server open.
+            for connection in list(self.__connections):
+                connection.close()
+            await server.wait_closed()
+            queue.put_nowait(None)
+            await writer_task
+            assert self.__db is not None
+            await loop.run_in_executor(executor, self.__db.close)
+
+class CachedReport(NamedTuple):
+    '''
+    The output of a report command, as kept by `ReportCache`.
+    '''
+
+    stdout: str
+    stderr: str
+    # The exit status of the command.
+    status: int
+
+class ReportCache:
+    '''
+    Keeps the output of the most recently used report commands for a
+    startuptimes database in a SQLite file next to it, named
+    <db_filename>.reportcache, so that the same report can be printed again
+    without opening the database or querying it.
+
+    Each report is stored with a key describing the command and its
+    arguments, and the change token of the database (see `change_token`)
+    when it was computed. A report is only used again if the token has not
+    changed since. When there are more than `max_size` reports, the least
+    recently used ones are removed.
+    '''
+
+    __db: sqlite3.Connection
+    __max_size: int
+
+    def __init__(self, db_filename: str, max_size: int = DEFAULT_REPORT_CACHE_SIZE) -> None:
+        '''
+        Opens the report cache of the database named `db_filename`, creating
+        it if necessary.
+        '''
+
+        self.__max_size = max_size
+        self.__db = sqlite3.connect(f'{db_filename}.reportcache', timeout=DEFAULT_BUSY_TIMEOUT)
+        # Like the database itself, this lets one process read the cache while another updates it.
+        self.__db.execute('PRAGMA journal_mode = WAL')
+        self.__db.execute('PRAGMA synchronous = NORMAL')
+        self.__db.executescript('''
+            CREATE TABLE IF NOT EXISTS Report(
+                key TEXT PRIMARY KEY,
+                token TEXT NOT NULL,
+                stdout TEXT NOT NULL,
+                stderr TEXT NOT NULL,
+                status INTEGER NOT NULL,
+                lastUsed INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS Report_lastUsed ON Report(lastUsed);
+        ''')
+
+    @staticmethod
+    def change_token(db_filename: str) -> str | None:
+        '''
+        Reads the schema version and change counter (see
+        `StartupTimesDB.change_counter`) of the database named `db_filename`
+        directly, without the setup done by `StartupTimesDB`.
+
+        Returns them as a string that changes whenever the results of a report
+        might change, or None if the database does not exist or is not at the
+        current schema version, so a report cannot be cached.
+        '''
+
+        if not os.path.exists(db_filename):
+            return None
+        try:
+            db = sqlite3.connect(f'{Path(db_filename).resolve().as_uri()}?mode=ro', uri=True)
+            try:
+                props = dict(db.execute('''
+                    SELECT name, value FROM Props
+                    WHERE namespace == 'startuptimes'
+                        AND name IN ('schemaVersion', 'changeCounter')
+                ''').fetchall())
+            finally:
+                db.close()
+        except sqlite3.Error:
+            return None
+        if props.get('schemaVersion') != StartupTimesDB.SCHEMA_VERSION:
+            return None
+        return f'{StartupTimesDB.SCHEMA_VERSION}:{props.get("changeCounter", "0")}'
+
+    def get(self, key: str, token: str) -> CachedReport | None:
+        '''
+        Looks up the report for `key` computed when the database had the change
+        token `token`, marking it as the most recently used.
+
+        Returns the report, or None if there is no such report.
+        '''
+
+        with self.__db:
+            cur = self.__db.execute('''
+                UPDATE Report SET lastUsed = (SELECT MAX(lastUsed) + 1 FROM Report)
+                    WHERE key = ? AND token = ?
+                    RETURNING stdout, stderr, status
+            ''', [ key, token ])
+            row = cur.fetchone()
+        return None if row is None else CachedReport(*row)
+
+    def put(self, key: str, token: str, report: CachedReport) -> None:
+        '''
+        Stores `report` as the report for `key` computed when the database had
+        the change token `token`, replacing any older report for `key`, and
+        removes the least recently used reports beyond `max_size`.
+        '''
+
+        with self.__db:
+            self.__db.execute('''
+                INSERT OR REPLACE INTO Report(key, token, stdout, stderr, status, lastUsed)
+                    VALUES (?, ?, ?, ?, ?, (SELECT COALESCE(MAX(lastUsed), 0) + 1 FROM Report))
+            ''', [ key, token, *report ])
+            self.__db.execute('''
+                DELETE FROM Report WHERE lastUsed <= (
+                    SELECT lastUsed FROM Report ORDER BY lastUsed DESC LIMIT 1 OFFSET ?
+                )
+            ''', [ self.__max_size ])
+
+    def close(self) -> None:
+        '''
+        Closes the cache.
+        '''
+
+        self.__db.close()
+
+# The columns available in the report, keyed by report row key. Each value holds the column title
+# and the formatter to use for the column.
+REPORT_COLUMNS: dict[str, tuple[str, Callable[[Any], str] | None]] = {
+    'modelID': ('Device', None),
+    'osVersion': ('OS Ver', None),
+    'iTwinVersion': ('iTwin Ver', None),
+    'averageTime': ('Average Time', TextTable.elapsed_string),
+    'samples': ('Samples', None),
+    'minTime': ('Min Time', TextTable.elapsed_string),
+    'maxTime': ('Max Time', TextTable.elapsed_string),
+    'medianTime': ('Median', TextTable.elapsed_string),
+    'p90Time': ('P90', TextTable.elapsed_string),
+    'p99Time': ('P99', TextTable.elapsed_string),
+    'stdDevTime': ('Std Dev', TextTable.elapsed_string),
+    'ciLowTime': ('CI Low', TextTable.elapsed_string),
+    'ciHighTime': ('CI High', TextTable.elapsed_string)
+}
+DEFAULT_REPORT_COLUMNS = [ 'modelID', 'osVersion', 'iTwinVersion', 'averageTime', 'samples' ]
+# The columns available in the phases report. The time columns describe checkpoint step times.
+PHASE_COLUMNS = { 'action': ('Phase', None), **REPORT_COLUMNS }
+DEFAULT_PHASE_COLUMNS = [
+    'modelID',
+    'osVersion',
+    'iTwinVersion',
+    'action',
+    'averageTime',
+    'medianTime',
+    'p90Time',
+    'samples'
+]
+# Report columns that need the full distribution of totalTime values.
+DISTRIBUTION_COLUMNS = { 'medianTime', 'p90Time', 'p99Time' }
+# Report columns that need a confidence interval.
+BOOTSTRAP_COLUMNS = { 'ciLowTime', 'ciHighTime' }
+
+class ExportColumn(NamedTuple):
+    '''
+    A column in an export. `kind` is one of the keys of `COLUMNAR_TYPES`, and
+    `sql` is the expression that selects the column.
+    '''
+
+    name: str
+    kind: str
+    sql: str = ''
+
+# The raw data that can be exported, keyed by the name used on the command line. Each value holds
+# the columns, the FROM clause (including ORDER BY), a query that counts the rows, and the WHERE
+# clause that limits the rows to those of the entries matching a StartupTimesQuery (see
+# StartupTimesQuery.restrict), which replaces {filter} in the other two.
+EXPORT_SOURCES: dict[str, tuple[list[ExportColumn], str, str, str]] = {
+    'devices': (
+        [
+            ExportColumn('id', 'int', 'id'),
+            ExportColumn('cpuCores', 'int', 'cpuCores'),
+            ExportColumn('memory', 'int', 'memory'),
+            ExportColumn('model', 'string', 'model'),
+            ExportColumn('modelID', 'string', 'modelID'),
+            ExportColumn('modelIDRefURL', 'string', 'modelIDRefURL'),
+            ExportColumn('systemName', 'string', 'systemName'),
+            ExportColumn('systemVersion', 'string', 'systemVersion')
+        ],
+        'FROM Device {filter} ORDER BY id',
+        'SELECT COUNT(*) FROM Device {filter}',
+        'WHERE Device.id IN (SELECT deviceID FROM Entry)'
+    ),
+    'entries': (
+        [
+            ExportColumn('id', 'int', 'Entry.id'),
+            ExportColumn('deviceID', 'int', 'Entry.deviceID'),
+            ExportColumn('modelID', 'string', 'Device.modelID'),
+            ExportColumn('systemName', 'string', 'Device.systemName'),
+            ExportColumn('systemVersion', 'string', 'Device.systemVersion'),
+            ExportColumn('iTwinVersion', 'string', 'Version.name'),
+            ExportColumn('title', 'string', 'Entry.title'),
+            ExportColumn('timestamp', 'timestamp', 'Entry.timestamp'),
+            ExportColumn('totalTime', 'float', 'Entry.totalTime'),
+            ExportColumn('usingRemoteServer', 'int', 'Entry.usingRemoteServer')
+        ],
+        '''
+            FROM Entry
+            JOIN Device ON Device.id = Entry.deviceID
+            JOIN Version ON Version.id = Entry.versionID
+            {filter}
+            ORDER BY Entry.id
+        ''',
+        'SELECT COUNT(*) FROM Entry {filter}',
+        ''
+    ),
+    'checkpoints': (
+        [
+            ExportColumn('id', 'int', 'Checkpoint.id'),
+            ExportColumn('entryID', 'int', 'Checkpoint.entryID'),
+            ExportColumn('arrayIndex', 'int', 'Checkpoint.arrayIndex'),
+            ExportColumn('action', 'string', 'Action.name'),
+            ExportColumn('timestamp', 'timestamp', 'Checkpoint.timestamp'),
+            ExportColumn('step', 'float', 'Checkpoint.step'),
+            ExportColumn('total', 'float', 'Checkpoint.total')
+        ],
+        '''
+            FROM Checkpoint
+            JOIN Action ON Action.id = Checkpoint.actionID
+            {filter}
+            ORDER BY Checkpoint.id
+        ''',
+        'SELECT COUNT(*) FROM Checkpoint {filter}',
+        'WHERE Checkpoint.entryID IN (SELECT id FROM Entry)'
+    )
+}
+# The reports that can be exported, keyed by the name used on the command line.
+EXPORT_REPORTS: dict[str, Callable[[StartupTimesQuery], Iterator[Record]]] = {
+    'report': StartupTimesQuery.report_rows,
+    'phases': StartupTimesQuery.phase_rows
+}
+EXPORT_FORMATS = [ 'csv', 'ndjson', 'columnar' ]
+
+# Columnar export files start and end with this, so truncated files are detected.
+COLUMNAR_MAGIC = b'STCOLV1\n'
+# The start of each column in a columnar export is a multiple of this many bytes.
+COLUMNAR_ALIGNMENT = 64
+# The array typecode and NumPy dtype used to store each kind of column in a columnar export.
+# Strings are stored as indexes into the column's list of categories (-1 for NULL), and
+# timestamps as milliseconds since the Unix epoch (UTC).
+COLUMNAR_TYPES = {
+    'int': ('q', '<i8'),
+    'float': ('d', '<f8'),
+    'string': ('i', '<i4'),
+    'timestamp': ('q', '<i8')
+}
+
+class ColumnarColumn(NamedTuple):
+    '''
+    A column read from a columnar export by `read_columnar`. `values` is a
+    view of the memory-mapped file, so `numpy.asarray(values)` does not copy
+    it. For 'string' columns, `values` holds indexes into `categories`.
+    '''
+
+    name: str
+    kind: str
+    values: memoryview
+    categories: list[str] | None
+
+# The chunks of rows read for an export. Closing the generator ends the read.
+ExportChunks = Generator[list[tuple], None, None]
+
+def gen_export_source(
+    query: StartupTimesQuery,
+    source: str,
+    columnar: bool
+) -> tuple[list[ExportColumn], int, ExportChunks]:
+    '''
+    Reads the raw data named `source` (one of the keys of `EXPORT_SOURCES`)
+    for the entries matching `query` in chunks of at most `FETCH_SIZE` rows,
+    so memory use does not depend on the number of rows. If `columnar` is
+    True, timestamps are converted to milliseconds since the Unix epoch by
+    SQLite.
+
+    The rows are counted and read in one read transaction, so the count
+    matches the rows even if another process adds entries meanwhile. The
+    transaction ends when the generator of chunks finishes or is closed.
+
+    Returns the columns, the number of rows, and a generator of chunks.
+    '''
+
+    (columns, from_sql, count_sql, filter_sql) = EXPORT_SOURCES[source]
+    filter_sql = filter_sql if query.filtered else ''
+    expressions = [
+        f'CAST(ROUND((julianday({column.sql}) - 2440587.5) * 86400000) AS INTEGER)'
+        if columnar and column.kind == 'timestamp' else column.sql
+        for column in columns
+    ]
+    cur = query.db.cursor()
+    cur.execute('BEGIN')
+    try:
+        (num_rows,) = cur.execute(*query.restrict(count_sql.format(filter=filter_sql))).fetchone()
+        cur.execute(*query.restrict(
+            f'SELECT {", ".join(expressions)} {from_sql.format(filter=filter_sql)}'))
+    except Exception:
+        cur.execute('ROLLBACK')
+        raise
+
+    def gen_chunks() -> ExportChunks:
+        try:
+            while chunk := cur.fetchmany(FETCH_SIZE):
+                yield chunk
+        finally:
+            cur.execute('ROLLBACK')
+
+    return (columns, num_rows, gen_chunks())
+
+def gen_export_report(
+    query: StartupTimesQuery,
+    report: str
+) -> tuple[list[ExportColumn], int, ExportChunks]:
+    '''
+    Generates the report named `report` (one of the keys of `EXPORT_REPORTS`)
+    for the entries matching `query` (see `gen_export_rows`). Reports have
+    one row per group, so they are small enough to hold in memory.
+
+    Returns the columns, the number of rows, and a generator of chunks.
+    '''
+
+    return gen_export_rows(list(EXPORT_REPORTS[report](query)))
+
+def gen_export_rows(rows: list[Record]) -> tuple[list[ExportColumn], int, ExportChunks]:
+    '''
+    Generates an export of the report rows `rows`. The kind of each column is
+    taken from its values.
+
+    Returns the columns, the number of rows, and a generator of chunks.
+    '''
+
+    columns = []
+    for name in rows[0] if len(rows) > 0 else []:
+        values = [row[name] for row in rows if row[name] is not None]
+        if len(values) > 0 and all(isinstance(value, int) for value in values):
+            kind = 'int'
+        elif len(values) > 0 and all(isinstance(value, (int, float)) for value in values):
+            kind = 'float'
+        else:
+            kind = 'string'
+        columns.append(ExportColumn(name, kind))
+    chunk = [tuple(row[column.name] for column in columns) for row in rows]
+    return (columns, len(rows), (chunk for chunk in [chunk]))
+
+def write_csv(file: TextIO, columns: Sequence[ExportColumn], chunks: Iterable[list[tuple]]) -> None:
+    '''
+    Writes `chunks` to `file` as CSV, with a header row of column names.
+    NULL values are written as empty fields.
+    '''
+
+    writer = csv.writer(file, lineterminator='\n')
+    writer.writerow([column.name for column in columns])
+    for chunk in chunks:
+        writer.writerows(chunk)
+
+def write_ndjson(
+    file: TextIO,
+    columns: Sequence[ExportColumn],
+    chunks: Iterable[list[tuple]]
+) -> None:
+    '''
+    Writes `chunks` to `file` as NDJSON, with one JSON object per row.
+    '''
+
+    names = [column.name for column in columns]
+    encode = json.JSONEncoder().encode
+    for chunk in chunks:
+        file.write(''.join([f'{encode(dict(zip(names, row)))}\n' for row in chunk]))
+
+def columnar_array(column: ExportColumn, values: list[Any], codes: dict[str, int]) -> array:
+    '''
+    Converts the `values` of `column` to a little-endian array of the type
+    given by `COLUMNAR_TYPES`. Strings are replaced by their index in
+    `codes`, which is extended with any new strings, and missing strings by
+    -1. Missing floats are replaced by NaN.
+    '''
+
+    if column.kind == 'string':
+        values = [-1 if value is None else codes.setdefault(value, len(codes))
+                  for value in values]
+    elif column.kind == 'float':
+        values = [math.nan if value is None else value for value in values]
+    data = array(COLUMNAR_TYPES[column.kind][0], values)
+    if sys.byteorder == 'big':
+        data.byteswap()
+    return data
+
+def write_columnar(
+    file: BinaryIO,
+    columns: Sequence[ExportColumn],
+    num_rows: int,
+    chunks: Iterable[list[tuple]]
+) -> None:
+    '''
+    Writes `chunks`, which must contain `num_rows` rows, to `file` in the
+    columnar format read by `read_columnar`. `file` must be seekable,
+    because each chunk is written to the column arrays in place.
+
+    The file starts with `COLUMNAR_MAGIC`, followed by one little-endian
+    array per column (see `COLUMNAR_TYPES`), each starting at a multiple of
+    `COLUMNAR_ALIGNMENT` bytes. After the arrays comes a UTF-8 JSON footer
+    describing the columns, its size as a little-endian 64-bit integer, and
+    `COLUMNAR_MAGIC` again.
+    '''
+
+    offsets = []
+    end = COLUMNAR_ALIGNMENT
+    for column in columns:
+        offsets.append(end)
+        size = num_rows * array(COLUMNAR_TYPES[column.kind][0]).itemsize
+        end += -(-size // COLUMNAR_ALIGNMENT) * COLUMNAR_ALIGNMENT
+    categories: list[dict[str, int]] = [{} for _ in columns]
+    file.write(COLUMNAR_MAGIC)
+    row_index = 0
+    for chunk in chunks:
+        if row_index + len(chunk) > num_rows:
+            raise ValueError(f'Expected {num_rows} rows, but got more.')
+        for (i, column) in enumerate(columns):
+            data = columnar_array(column, [row[i] for row in chunk], categories[i])
+            file.seek(offsets[i] + row_index * data.itemsize)
+            file.write(data)
+        row_index += len(chunk)
+    if row_index != num_rows:
+        raise ValueError(f'Expected {num_rows} rows, but got {row_index}.')
+    footer = json.dumps({
+        'rows': num_rows,
+        'columns': [
+            {
+                'name': column.name,
+                'kind': column.kind,
+                'dtype': COLUMNAR_TYPES[column.kind][1],
+                'offset': offset,
+                **({ 'categories': list(codes) } if column.kind == 'string' else {})
+            }
+            for (column, offset, codes) in zip(columns, offsets, categories)
+        ]
+    }).encode()
+    file.seek(end)
+    file.write(footer)
+    file.write(len(footer).to_bytes(8, 'little'))
+    file.write(COLUMNAR_MAGIC)
+    file.truncate()
+
+def check_columnar_footer(footer: Any, data_end: int) -> None:
+    '''
+    Raises a ValueError unless `footer`, the decoded footer of a columnar
+    export (see `write_columnar`), describes columns that each lie between
+    `COLUMNAR_MAGIC` and `data_end`, the offset of the footer.
+    '''
+
+    try:
+        num_rows = footer['rows']
+        if not isinstance(num_rows, int) or num_rows < 0:
+            raise ValueError(f'Invalid number of rows: {num_rows!r}.')
+        for column in footer['columns']:
+            offset = column['offset']
+            length = num_rows * array(COLUMNAR_TYPES[column['kind']][0]).itemsize
+            if (not isinstance(offset, int)
+                or offset < len(COLUMNAR_MAGIC)
+                or offset + length > data_end):
+                raise ValueError(f'Column {column["name"]} is outside the data region.')
+    except (KeyError, TypeError) as error:
+        raise ValueError(f'Invalid footer: {error!r}.') from error
+
+def read_columnar(filename: str) -> list[ColumnarColumn]:
+    '''
+    Memory-maps the columnar export in the file named `filename` (see
+    `write_columnar`). Nothing is parsed except the footer, and the values
+    of each column are a view of the mapped file.
+
+    Returns the columns.
+    '''
+
+    if sys.byteorder == 'big':
+        raise ValueError('Columnar exports can only be read on little-endian machines.')
+    with open(filename, 'rb') as file:
+        mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        size = len(mapped)
+        if (size < 2 * len(COLUMNAR_MAGIC) + 8
+            or mapped[:len(COLUMNAR_MAGIC)] != COLUMNAR_MAGIC
+            or mapped[-len(COLUMNAR_MAGIC):] != COLUMNAR_MAGIC):
+            raise ValueError('Not a complete columnar export.')
+        footer_end = size - len(COLUMNAR_MAGIC) - 8
+        data_end = footer_end - int.from_bytes(mapped[footer_end:footer_end + 8], 'little')
+        if data_end < len(COLUMNAR_MAGIC):
+            raise ValueError('The footer size is larger than the file.')
+        footer = json.loads(mapped[data_end:footer_end])
+        check_columnar_footer(footer, data_end)
+    except ValueError as error:
+        mapped.close()
+        raise ValueError(f'{filename}: {error}') from error
+    # The footer has been checked, so nothing below can fail while views of `mapped` exist.
+    buffer = memoryview(mapped)
+    columns = []
+    for column in footer['columns']:
+        typecode = COLUMNAR_TYPES[column['kind']][0]
+        offset = column['offset']
+        length = footer['rows'] * array(typecode).itemsize
+        columns.append(ColumnarColumn(
+            column['name'],
+            column['kind'],
+            buffer[offset:offset + length].cast(typecode),
+            column.get('categories')))
+    return columns
+
+def add_command(db: StartupTimesDB, args) -> None:
+    '''
+    Handler for the 'add' command line command. (See command help for more
+    info.)
+    '''
+
+    batch_size = getattr(args, 'batch_size', None) or DEFAULT_BATCH_SIZE
+    if len(getattr(args, 'paths', None) or []) > 0 or getattr(args, 'logs', False):
+        add_files(db, args, batch_size)
+        return
+    input_file: TextIO
+    if hasattr(args, 'filename') and args.filename:
+        input_file = open(args.filename, encoding='utf-8')
+    else:
+        input_file = sys.stdin
+        print('Input entry JSON, then hit Ctrl+D:')
+    if getattr(args, 'jsonl', False):
+        entries = iter_json_lines_entries(input_file)
+    else:
+        entries = iter_json_entries(input_file)
+    try:
+        stats = db.insert_entries(map(validate_entry, entries), batch_size)
+    finally:
+        if isinstance(input_file, TextIOWrapper):
+            input_file.close()
+    print(stats)
+    if stats.skipped > 0:
+        print(f'{stats.skipped} entries were skipped due to already being present.')
+
+@contextmanager
+def progress_printer(format_message: Callable[..., str]) -> Iterator[Callable[..., None]]:
+    '''
+    Yields a progress callback that prints `format_message` of its arguments
+    to stderr, at most once every `PROGRESS_INTERVAL` seconds. On a terminal
+    each message overwrites the last one, and the line is ended on exit.
+    '''
+
+    # Progress overwrites itself on a terminal, but is printed one line at a time to a log file.
+    end = '\r' if sys.stderr.isatty() else '\n'
+    last_progress = time.perf_counter()
+    printed_progress = False
+
+    def on_progress(*args: Any) -> None:
+        nonlocal last_progress, printed_progress
+        now = time.perf_counter()
+        if now - last_progress >= PROGRESS_INTERVAL:
+            last_progress = now
+            printed_progress = True
+            print(format_message(*args), end=end, file=sys.stderr, flush=True)
+
+    try:
+        yield on_progress
+    finally:
+        if printed_progress and end == '\r':
+            print(file=sys.stderr)
+
+def add_files(db: StartupTimesDB, args, batch_size: int) -> None:
+    '''
+    Handles the 'add' command line command when it is given paths, parsing
+    the files in parallel (see `ingest_files`) and printing progress to
+    stderr. Exits with status 1 if any of the files could not be parsed.
+    '''
+
+    paths = args.paths + ([ args.filename ] if args.filename else [])
+    if len(paths) == 0:
+        print('--logs needs a filename or paths, since logs cannot be read from stdin.',
+              file=sys.stderr)
+        sys.exit(1)
+    try:
+        filenames = expand_paths(paths, LOG_EXTENSIONS if args.logs else INPUT_EXTENSIONS)
+    except ValueError as error:
+        print(error, file=sys.stderr)
+        sys.exit(1)
+
+    def progress_message(num_parsed: int, stats: IngestStats) -> str:
+        rate = stats.inserted / stats.seconds if stats.seconds > 0 else 0.0
+        return (f'{num_parsed}/{len(filenames)} files parsed, {stats.inserted} entries inserted '
+                f'({rate:.0f} entries/s)')
+
+    with progress_printer(progress_message) as on_progress:
+        (stats, failures) = ingest_files(
+            db, filenames, args.jsonl, args.logs, args.jobs, batch_size, on_progress)
+    print(f'{len(filenames)} files: {stats}')
+    if stats.skipped > 0:
+        print(f'{stats.skipped} entries were skipped due to already being present.')
+    if len(failures) > 0:
+        print(f'{len(failures)} files could not be parsed and were skipped from the first error:',
+              file=sys.stderr)
+        for (filename, error) in failures:
+            print(f'  {filename}: {error}', file=sys.stderr)
+        sys.exit(1)
+
+# pylint: disable-next=too-many-arguments,too-many-positional-arguments
+def print_report(
+    query: StartupTimesQuery,
+    args,
+    report_rows: list[Record],
+    column_keys: list[str],
+    available_columns: dict[str, tuple[str, Callable[[Any], str] | None]],
+    distribution_sql: tuple[str, str | None],
+    key_names: Sequence[str]
+) -> None:
+    '''
+    Prints `report_rows` as a text table with the columns in `column_keys`,
+    which are looked up in `available_columns`.
+
+    If any of the columns need distribution statistics, these are computed
+    from the entries matching `query` using `distribution_sql` (see
+    `StartupTimesQuery.distribution_stats`) and added to each row, matching
+    groups using the row values named in `key_names`.
+    '''
+
+    profiler = query.db.profiler
+    profiler.count('rows read', len(report_rows))
+    needs_bootstrap = not BOOTSTRAP_COLUMNS.isdisjoint(column_keys)
+    if needs_bootstrap or not DISTRIBUTION_COLUMNS.isdisjoint(column_keys):
+        iterations = getattr(args, 'bootstrap', 1000) if needs_bootstrap else 0
+        with profiler.phase('statistics'):
+            distribution_stats = query.distribution_stats(
+                iterations,
+                getattr(args, 'confidence', 0.95),
+                getattr(args, 'seed', None),
+                distribution_sql)
+        missing = { key: None for key in DISTRIBUTION_COLUMNS | BOOTSTRAP_COLUMNS }
+        for row in report_rows:
+            row.update(distribution_stats.get(tuple(row[name] for name in key_names), missing))
+    with profiler.phase('render'):
+        print('Results:')
+        TextTable(
+            report_rows,
+            [(key, available_columns[key][0]) for key in column_keys],
+            [available_columns[key][1] for key in column_keys]
+        ).write(sys.stdout)
+        print()
+
+def report_command(db: StartupTimesDB, args) -> None:
+    '''
+    Handler for the 'report' command line command. (See command help for
+    more info.)
+    '''
+
+    query = query_from_args(db, args)
+    shards = getattr(args, 'shards', None) or []
+    if len(shards) > 0:
+        if query.filtered:
+            print('Filters cannot be used with --db.', file=sys.stderr)
+            sys.exit(1)
+        try:
+            for filename in shards:
+                db.attach_shard(filename)
+        except ValueError as error:
+            print(error, file=sys.stderr)
+            sys.exit(1)
+    with db.profiler.phase('query'):
+        if len(shards) > 0:
+            rows = list(gen_federated_report_rows(db))
+            distribution_sql = (
+                db.federated_sql(FEDERATED_ENTRY_DISTRIBUTION_SQL, FEDERATED_ENTRIES_SQL), None)
+        else:
+            rows = list(query.report_rows())
+            distribution_sql = (ENTRY_DISTRIBUTION_SQL, ENTRY_ROLLUP_DISTRIBUTION_SQL)
+    print_report(
+        query,
+        args,
+        rows,
+        getattr(args, 'columns', None) or DEFAULT_REPORT_COLUMNS,
+        REPORT_COLUMNS,
+        distribution_sql,
+        ('deviceID', 'versionID'))
+
+def phases_command(db: StartupTimesDB, args) -> None:
+    '''
+    Handler for the 'phases' command line command. (See command help for
+    more info.)
+    '''
+
+    query = query_from_args(db, args)
+    with db.profiler.phase('query'):
+        rows = list(query.phase_rows())
+    print_report(
+        query,
+        args,
+        rows,
+        args.columns or DEFAULT_PHASE_COLUMNS,
+        PHASE_COLUMNS,
+        (PHASE_DISTRIBUTION_SQL, PHASE_ROLLUP_DISTRIBUTION_SQL),
+        ('deviceID', 'versionID', 'actionID'))
+
+def regressions_command(db: StartupTimesDB, args) -> None:
+    '''
+    Handler for the 'regressions' command line command. (See command help
+    for more info.)
+    '''
+
+    profiler = db.profiler
+    cur = db.cursor()
+    versions = dict(cur.execute('SELECT id, name FROM Version').fetchall())
+    actions = dict(cur.execute('SELECT id, name FROM Action').fetchall())
+
+    def named_groups(groups: Iterable[tuple[tuple, array]]) -> Iterator[tuple[tuple, array]]:
+        # find_regressions needs the version names to order the versions.
+        for ((device_id, version_id, *action_id), values) in profiler.timed_iter('query', groups):
+            profiler.count('rows read', len(values))
+            phase = actions[action_id[0]] if len(action_id) > 0 else '(totalTime)'
+            yield ((device_id, versions[version_id], phase), values)
+
+    query = query_from_args(db, args)
+    with profiler.phase('statistics'):
+        regressions = list(find_regressions(
+            named_groups(query.distribution_groups()), args.alpha, args.min_change,
+            args.min_samples))
+        if not args.total_only:
+            regressions.extend(find_regressions(
+                named_groups(query.distribution_groups(
+                    PHASE_DISTRIBUTION_SQL, PHASE_ROLLUP_DISTRIBUTION_SQL)),
+                args.alpha, args.min_change, args.min_samples))
+    if len(regressions) == 0:
+        print('No significant regressions found.')
+        return
+    cur.execute('SELECT id, modelID, systemName, systemVersion FROM Device')
+    devices = { row[0]: (row[1], f'{row[2]} {row[3]}') for row in cur }
+    for regression in regressions:
+        (regression['modelID'], regression['osVersion']) = devices[regression['deviceID']]
+    regressions.sort(key=lambda regression: (regression['modelID'], regression['deviceID']))
+    columns = [
+        ('modelID', 'Device'),
+        ('osVersion', 'OS Ver'),
+        ('phase', 'Phase'),
+        ('oldVersion', 'Old Ver'),
+        ('newVersion', 'New Ver'),
+        ('oldMedian', 'Old Median'),
+        ('newMedian', 'New Median'),
+        ('change', 'Change'),
+        ('pValue', 'p-value'),
+        ('samples', 'Samples')
+    ]
+    formatters = [
+        None, None, None, None, None, TextTable.elapsed_string, TextTable.elapsed_string, None,
+        None, None
+    ]
+    with profiler.phase('render'):
+        print('Regressions:')
+        TextTable(regressions, columns, formatters).write(sys.stdout)
+        print()
+    sys.exit(1)
+
+def trend_chart_groups(
+    rows: list[Record],
+    bucket_size: str,
+    width: int
+) -> tuple[dict[tuple[int, int], Record], int]:
+    '''
+    Groups the trend `rows` of each (deviceID, versionID) combination for
+    the chart of the trend command, with a sparkline of the average startup
+    time at most `width` characters wide. `bucket_size` is the size of the
+    buckets of `rows`: 'day', 'week', or 'month'.
+
+    Returns the groups and the number of buckets per character of the
+    sparklines.
+    '''
+
+    def bucket_number(bucket: str) -> int:
+        # Consecutive buckets have consecutive numbers. Weeks start on Monday, as does day 1.
+        day = date.fromisoformat(bucket)
+        if bucket_size == 'month':
+            return day.year * 12 + day.month
+        return (day.toordinal() - 1) // (7 if bucket_size == 'week' else 1)
+
+    numbers = [bucket_number(row['bucket']) for row in rows]
+    first_number = min(numbers)
+    # Downsample to at most width characters by merging neighbouring buckets.
+    per_char = -(-(max(numbers) - first_number + 1) // max(width, 1))
+    num_chars = (max(numbers) - first_number) // per_char + 1
+    groups: dict[tuple[int, int], Record] = {}
+    for (row, number) in zip(rows, numbers):
+        group = groups.get((row['deviceID'], row['versionID']))
+        if group is None:
+            group = groups[(row['deviceID'], row['versionID'])] = {
+                'modelID': row['modelID'],
+                'osVersion': row['osVersion'],
+                'iTwinVersion': row['iTwinVersion'],
+                'from': row['bucket'],
+                'samples': 0,
+                'minTime': row['averageTime'],
+                'maxTime': row['averageTime'],
+                'counts': [0] * num_chars,
+                'sums': [0.0] * num_chars
+            }
+        group['to'] = row['bucket']
+        group['samples'] += row['samples']
+        group['minTime'] = min(group['minTime'], row['averageTime'])
+        group['maxTime'] = max(group['maxTime'], row['averageTime'])
+        group['latestTime'] = row['averageTime']
+        char = (number - first_number) // per_char
+        group['counts'][char] += row['samples']
+        group['sums'][char] += row['averageTime'] * row['samples']
+    for group in groups.values():
+        group['trend'] = sparkline([
+            total / count if count > 0 else None
+            for (count, total) in zip(group['counts'], group['sums'])
+        ])
+    return (groups, per_char)
+
+def trend_command(db: StartupTimesDB, args) -> None:
+    '''
+    Handler for the 'trend' command line command. (See command help for more
+    info.)
+    '''
+
+    profiler = db.profiler
+    with profiler.phase('query'):
+        rows = list(query_from_args(db, args).trend_rows(args.bucket))
+    profiler.count('rows read', len(rows))
+    if args.format != 'chart':
+        (columns, _, chunks) = gen_export_rows(rows)
+        with profiler.phase('render'):
+            (write_csv if args.format == 'csv' else write_ndjson)(sys.stdout, columns, chunks)
+        return
+    if len(rows) == 0:
+        print('No entries found.')
+        return
+
+    (groups, per_char) = trend_chart_groups(rows, args.bucket, args.width)
+    columns = [
+        ('modelID', 'Device'),
+        ('osVersion', 'OS Ver'),
+        ('iTwinVersion', 'iTwin Ver'),
+        ('from', 'From'),
+        ('to', 'To'),
+        ('samples', 'Samples'),
+        ('minTime', 'Min Avg'),
+        ('maxTime', 'Max Avg'),
+        ('latestTime', 'Last Avg'),
+        ('trend', 'Trend')
+    ]
+    formatters = [
+        None, None, None, None, None, None, TextTable.elapsed_string, TextTable.elapsed_string,
+        TextTable.elapsed_string, None
+    ]
+    scale = '' if per_char == 1 else f', {per_char} {args.bucket}s per character'
+    buckets = [row['bucket'] for row in rows]
+    with profiler.phase('render'):
+        print(f'Average startup time per {args.bucket} from {min(buckets)} to {max(buckets)}'
+              f'{scale}:')
+        TextTable(groups.values(), columns, formatters).write(sys.stdout)
+        print()
+
+def rebuild_summaries_command(db: StartupTimesDB, args) -> None:
+    '''
+    Handler for the 'rebuild-summaries' command line command. (See command
+    help for more info.)
+    '''
+
+    if not args.check_only:
+        db.rebuild_summaries()
+        print('Summary tables rebuilt.')
+    problems = db.check_summaries()
+    for problem in problems:
+        print(problem)
+    if len(problems) > 0:
+        print(f'{len(problems)} summary groups do not match the raw data.')
+        sys.exit(1)
+    print('Summary tables match the raw data.')
+
+def merge_command(db: StartupTimesDB, args) -> None:
+    '''
+    Handler for the 'merge' command line command. (See command help for more
+    info.)
+    '''
+
+    failures = 0
+    for filename in args.filenames:
+        try:
+            stats = db.merge(filename)
+        except ValueError as error:
+            print(error, file=sys.stderr)
+            failures += 1
+            continue
+        print(f'{filename}: {stats}')
+        if stats.skipped > 0:
+            print(f'{stats.skipped} entries were skipped due to already being present.')
+    if failures > 0:
+        print(f'{failures} databases could not be merged.', file=sys.stderr)
+        sys.exit(1)
+
+def compact_command(db: StartupTimesDB, args) -> None:
+    '''
+    Handler for the 'compact' command line command. (See command help for
+    more info.)
+    '''
+
+    if args.keep_days < 0:
+        print('--keep_days cannot be negative.', file=sys.stderr)
+        sys.exit(1)
+    before = (datetime.now(timezone.utc).date() - timedelta(days=args.keep_days)).isoformat()
+    compacted_before = db.compacted_before
+    if compacted_before is not None and compacted_before > before:
+        print(f'Entries from before {compacted_before} have already been compacted.')
+        before = compacted_before
+    if args.dry_run:
+        cur = db.cursor()
+        cur.execute('''
+            SELECT COUNT(*) FROM Entry WHERE epochMillis < strftime('%s', ?) * 1000
+        ''', [ before ])
+        print(f'{cur.fetchone()[0]} entries from before {before} would be compacted.')
+        return
+
+    def file_size() -> int:
+        return sum(
+            os.path.getsize(filename)
+            for filename in (db.filename, f'{db.filename}-wal') if os.path.exists(filename))
+
+    def progress_message(num_entries: int, num_checkpoints: int) -> str:
+        return f'{num_entries} entries and {num_checkpoints} checkpoints compacted'
+
+    old_size = file_size()
+    start = time.perf_counter()
+    with db.profiler.phase('compact'), progress_printer(progress_message) as on_chunk:
+        (num_entries, num_checkpoints) = db.compact(before, args.chunk_size, on_chunk)
+    print(f'Compacted {num_entries} entries and {num_checkpoints} checkpoints from before {before} '
+          f'in {time.perf_counter() - start:.3f}s.')
+    if not args.no_vacuum:
+        with db.profiler.phase('vacuum'):
+            db.vacuum()
+        print(f'Database size: {old_size:,} bytes before, {file_size():,} bytes after.')
+
+def migrate_command(db: StartupTimesDB, args) -> None:
+    '''
+    Handler for the 'migrate' command line command. (See command help for
+    more info.)
+    '''
+
+    pending = db.pending_migrations()
+    if len(pending) == 0:
+        print(f'Database schema is up to date (version {db.schema_version}).')
+        return
+    if args.dry_run:
+        print(f'Database schema version is {db.schema_version}. Pending migrations:')
+        for migration in pending:
+            print(f'  {migration.version}: {migration.description}')
+        return
+
+    def on_applied(migration: Migration, seconds: float) -> None:
+        print(f'Applied {migration.version}: {migration.description} ({seconds:.3f}s)')
+
+    backup_filename = db.migrate(not args.no_backup, on_applied)
+    if backup_filename is not None:
+        print(f'Backup of the original database written to {backup_filename}.')
+
+def export_command(db: StartupTimesDB, args) -> None:
+    '''
+    Handler for the 'export' command line command. (See command help for
+    more info.)
+    '''
+
+    to_stdout = args.output is None or args.output == '-'
+    if args.format == 'columnar' and to_stdout:
+        print('The columnar format must be written to a file. Use --output.', file=sys.stderr)
+        sys.exit(1)
+    profiler = db.profiler
+    query = query_from_args(db, args)
+    with profiler.phase('query'):
+        if args.data in EXPORT_SOURCES:
+            (columns, num_rows, chunks) = gen_export_source(
+                query, args.data, args.format == 'columnar')
+        else:
+            (columns, num_rows, chunks) = gen_export_report(query, args.data)
+    profiler.count('rows read', num_rows)
+    # The rows are read from the database while they are being written.
+    timed_chunks = profiler.timed_iter('query', chunks)
+    try:
+        with profiler.phase('render'):
+            if args.format == 'columnar':
+                with open(args.output, 'wb') as binary_file:
+                    write_columnar(binary_file, columns, num_rows, timed_chunks)
+            else:
+                write = write_csv if args.format == 'csv' else write_ndjson
+                if to_stdout:
+                    write(sys.stdout, columns, timed_chunks)
+                else:
+                    with open(args.output, 'w', encoding='utf-8', newline='') as file:
+                        write(file, columns, timed_chunks)
+    finally:
+        chunks.close()
+    if not to_stdout:
+        print(f'Exported {num_rows} rows to {args.output}.')
+
+def serve_command(db: StartupTimesDB, args) -> None:
+    '''
+    Handler for the 'serve' command line command. (See command help for
+    more info.)
+    '''
+
+    # `db` has already created the database or checked that its schema is current. The server
+    # opens its own connection on its writer thread.
+    server = IngestServer(
+        getattr(args, 'db_filename', None) or 'StartupTimes.db',
+        args.queue_size,
+        args.batch_size or DEFAULT_BATCH_SIZE,
+        args.busy_timeout,
+        db.profiler)
+    asyncio.run(server.run(
+        args.host,
+        args.port,
+        lambda address, port: print(f'Serving on http://{address}:{port}/ (Ctrl+C to stop)',
+                                    flush=True)))
+
+def parse_columns(
+    available_columns: dict[str, tuple[str, Callable[[Any], str] | None]],
+    value: str
+) -> list[str]:
+    '''
+    Parses the comma-separated list of column keys in `value`, each of which
+    must be a key in `available_columns`.
+
+    Returns the list of keys.
+    '''
+
+    keys = [key.strip() for key in value.split(',') if key.strip()]
+    for key in keys:
+        if key not in available_columns:
+            raise argparse.ArgumentTypeError(
+                f"invalid column '{key}' (choose from {', '.join(available_columns)})")
+    return keys
+
+def add_statistics_arguments(
+    parser: argparse.ArgumentParser,
+    available_columns: dict[str, tuple[str, Callable[[Any], str] | None]],
+    default_columns: list[str]
+) -> None:
+    '''
+    Adds the column selection and bootstrap arguments shared by the report
+    commands to `parser`.
+    '''
+
+    parser.add_argument(
+        '-c',
+        '--columns',
+        dest='columns',
+        type=partial(parse_columns, available_columns),
+        help=f'Comma-separated list of columns to show. Default is {",".join(default_columns)}. '
+             f'Available columns: {", ".join(available_columns)}.',
+        required=False)
+    parser.add_argument(
+        '--bootstrap',
+        dest='bootstrap',
+        type=int,
+        default=1000,
+        help='Number of bootstrap resamples used for the confidence interval columns. '
+             'Default is 1000. Use 0 to leave the confidence interval columns empty.')
+    parser.add_argument(
+        '--confidence',
+        dest='confidence',
+        type=float,
+        default=0.95,
+        help='Confidence level of the confidence interval columns. Default is 0.95.')
+    parser.add_argument(
+        '--seed',
+        dest='seed',
+        type=int,
+        help='Random seed for the bootstrap, for reproducible confidence intervals.',
+        required=False)
+
+def add_filter_arguments(parser: argparse.ArgumentParser) -> None:
+    '''
+    Adds the entry filter arguments (see `StartupTimesQuery`) shared by the
+    commands that read entries to `parser`.
+    '''
+
+    parser.add_argument(
+        '--since',
+        dest='since',
+        help='Only include entries recorded at or after this UTC date or time, for example '
+             '2024-01-01 or 2024-01-01T12:00:00Z.',
+        required=False)
+    parser.add_argument(
+        '--until',
+        dest='until',
+        help='Only include entries recorded before this UTC date or time.',
+        required=False)
+    parser.add_argument(
+        '--model',
+        dest='model_ids',
+        action='append',
+        metavar='MODEL_ID',
+        help='Only include entries from devices with this modelID. May be given more than once.',
+        required=False)
+    parser.add_argument(
+        '--system_version',
+        dest='system_versions',
+        action='append',
+        metavar='SYSTEM_VERSION',
+        help='Only include entries from devices with this OS version. May be given more than once.',
+        required=False)
+    parser.add_argument(
+        '--title',
+        dest='titles',
+        action='append',
+        metavar='TITLE',
+        help='Only include entries with this title. May be given more than once.',
+        required=False)
+    remote_group = parser.add_mutually_exclusive_group()
+    remote_group.add_argument(
+        '--remote',
+        dest='using_remote_server',
+        action='store_const',
+        const=True,
+        help='Only include entries that used a remote server.')
+    remote_group.add_argument(
+        '--local',
+        dest='using_remote_server',
+        action='store_const',
+        const=False,
+        help='Only include entries that did not use a remote server.')
+
+def query_from_args(db: StartupTimesDB, args) -> StartupTimesQuery:
+    '''
+    Creates a query over the entries in `db` with the filters given by the
+    arguments added by `add_filter_arguments`.
+
+    Returns the query.
+    '''
+
+    query = StartupTimesQuery(db)
+    if getattr(args, 'since', None) is not None:
+        query = query.since(args.since)
+    if getattr(args, 'until', None) is not None:
+        query = query.until(args.until)
+    if getattr(args, 'model_ids', None):
+        query = query.model_ids(*args.model_ids)
+    if getattr(args, 'system_versions', None):
+        query = query.system_versions(*args.system_versions)
+    if getattr(args, 'titles', None):
+        query = query.titles(*args.titles)
+    if getattr(args, 'using_remote_server', None) is not None:
+        query = query.using_remote_server(args.using_remote_server)
+    if query.filtered and not query.by_day:
+        note_compacted(db, 'Results filtered by title, remote server, or time of day')
+    return query
+
+def note_compacted(db: StartupTimesDB, what: str) -> None:
+    '''
+    If `db` has been compacted, prints a note to stderr that `what` only
+    includes the entries that have not been compacted.
+    '''
+
+    compacted_before = db.compacted_before
+    if compacted_before is not None:
+        print(
+            f'Note: {what} only include entries from {compacted_before} on. Older entries have '
+            'been compacted.',
+            file=sys.stderr)
+
+def write_profile(profiler: Profiler, filename: str) -> None:
+    '''
+    Writes the summary of `profiler` as JSON to the file named `filename`, or
+    to stdout if `filename` is '-'.
+    '''
+
+    summary = { 'command': sys.argv[1:], **profiler.summary() }
+    if filename == '-':
+        json.dump(summary, sys.stdout, indent=2)
+        print()
+    else:
+        with open(filename, 'w', encoding='utf-8') as file:
+            json.dump(summary, file, indent=2)
+            file.write('\n')
+
+# The arguments that do not change the output of a report command, which are left out of its key
+# in the report cache.
+REPORT_CACHE_IGNORED_ARGS = {
+    'func', 'read_only', 'cache', 'no_cache', 'cache_size', 'busy_timeout', 'profile',
+    'profile_output', 'trace_sql', 'cprofile', 'db_filename'
+}
+
+def script_digest() -> str:
+    '''
+    Returns the SHA-256 digest of the contents of this script. Unlike its
+    modification time, this does not change when the script is checked out
+    or copied again, and it always changes when the script is edited.
+    '''
+
+    with open(__file__, 'rb') as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+def report_cache_key(args) -> str | None:
+    '''
+    Returns the key for the output of the command given by `args` in the
+    report cache (see `ReportCache`), or None if its output cannot be cached.
+    The key includes a digest of this script (see `script_digest`), so that
+    changes to how reports are computed or printed are not hidden by cached
+    output.
+    '''
+
+    if args.no_cache or not getattr(args, 'cache', not hasattr(args, 'func')):
+        return None
+    if len(getattr(args, 'shards', None) or []) > 0:
+        # Only the change token of the main database is checked.
+        return None
+    return json.dumps({
+        'command': getattr(args, 'func', report_command).__name__,
+        'script': script_digest(),
+        **{
+            name: value for (name, value) in vars(args).items()
+            if name not in REPORT_CACHE_IGNORED_ARGS
+        }
+    }, sort_keys=True, default=str)
+
+def run_cached(
+    db_filename: str,
+    key: str,
+    cache_size: int,
+    profiler: Profiler,
+    command: Callable[[], None]
+) -> None:
+    '''
+    Prints the output of `command`, a report command whose key in the report
+    cache of the database named `db_filename` is `key`, from the cache if the
+    database has not changed since it was cached. Otherwise, runs `command`
+    and caches its output, including the exit status if it calls sys.exit.
+    The cache holds up to `cache_size` reports (see `ReportCache`).
+    '''
+
+    with profiler.phase('cache'):
+        token = ReportCache.change_token(db_filename)
+        cache = None
+        if token is not None:
+            try:
+                cache = ReportCache(db_filename, cache_size)
+                report = cache.get(key, token)
+            except sqlite3.Error:
+                # The report can still be computed without the cache, for example if the directory
+                # of the database is read-only.
+                cache = None
+            if cache is not None and report is not None:
+                cache.close()
+                sys.stderr.write(report.stderr)
+                sys.stdout.write(report.stdout)
+                if report.status != 0:
+                    sys.exit(report.status)
+                return
+    stdout = StringIO()
+    stderr = StringIO()
+    status = None
+    try:
+        with redirect_stdout(stdout), redirect_stderr(stderr):
+            command()
+        status = 0
+    except SystemExit as error:
+        if error.code is None or isinstance(error.code, int):
+            status = error.code or 0
+        raise
+    finally:
+        sys.stderr.write(stderr.getvalue())
+        sys.stdout.write(stdout.getvalue())
+        if cache is not None:
+            if status is not None:
+                with profiler.phase('cache'):
+                    report = CachedReport(stdout.getvalue(), stderr.getvalue(), status)
+                    try:
+                        cache.put(key, token, report)
+                    except sqlite3.Error:
+                        # Another process may be holding the cache. The next call will cache it.
+                        pass
+            cache.close()
+
+# Each command and option is one add_parser or add_argument statement.
+# pylint: disable-next=too-many-locals,too-many-statements
+def main() -> None:
+    '''
+    The startuptimes main program.
+    '''
+
+    parser = argparse.ArgumentParser(
+        description='Script for interacting with iTwin Mobile SDK samples startup times database.',
+        epilog=textwrap.dedent('''
+            When run with no arguments, runs the report command.
+
+            Any number of processes can add entries to the same database while
+            others run reports. The database uses write-ahead logging, the report,
+            phases, and regressions commands open it read-only, and a process that
+            has to wait too long for another one is retried with backoff.
+
+            With --profile, a summary of where the time went is printed to stderr
+            when the command finishes: the wall time of each phase (setup, which
+            includes connecting and migrating, parse, lock, lookup, insert,
+            summarize, commit, query, statistics, and render), the number of SQL
+            statements of each kind, and counts of the entries and rows processed.
+            Files given to add are parsed by worker processes, so its parse phase is
+            the time spent waiting for them. --profile_output writes the summary as
+            JSON instead, --trace_sql also writes every SQL statement to stderr, and
+            --cprofile writes cProfile statistics that can be read with
+            'python -m pstats'.
+
+            The output of the report, phases, regressions, and trend commands is
+            cached in <db_filename>.reportcache, keyed on the command and its
+            arguments. Running the same command again prints the cached output
+            without opening the database, as long as no entries have been added,
+            merged, or compacted and the summaries have not been rebuilt since.
+            The --cache_size most recently used reports are kept. Use --no_cache
+            to bypass the cache. Reports across several databases (report --db)
+            are not cached.
+            '''),
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument(
+        '-d',
+        '--db_filename',
+        dest='db_filename',
+        help='Filename of the SQLite database to use for entries. Default is ./StartupTimes.db.',
+        required=False)
+    parser.add_argument(
+        '--busy_timeout',
+        dest='busy_timeout',
+        type=float,
+        default=DEFAULT_BUSY_TIMEOUT,
+        help='Seconds to wait for other processes using the database before retrying. Default is '
+             f'{DEFAULT_BUSY_TIMEOUT:g}.')
+    parser.add_argument(
+        '--profile',
+        dest='profile',
+        action='store_true',
+        help='Print a summary of where the time went to stderr.')
+    parser.add_argument(
+        '--profile_output',
+        dest='profile_output',
+        metavar='FILENAME',
+        help='Write the profile summary as JSON to FILENAME (or - for stdout) instead of printing '
+             'it. Implies --profile.')
+    parser.add_argument(
+        '--trace_sql',
+        dest='trace_sql',
+        action='store_true',
+        help='Write each SQL statement to stderr as it runs. Implies --profile.')
+    parser.add_argument(
+        '--cprofile',
+        dest='cprofile',
+        metavar='FILENAME',
+        help='Run the command under cProfile and write the statistics to FILENAME.')
+    parser.add_argument(
+        '--no_cache',
+        dest='no_cache',
+        action='store_true',
+        help='Compute the report even if it is in the report cache, and do not cache it.')
+    parser.add_argument(
+        '--cache_size',
+        dest='cache_size',
+        type=int,
+        default=DEFAULT_REPORT_CACHE_SIZE,
+        help='Maximum number of reports to keep in the report cache. Default is '
+             f'{DEFAULT_REPORT_CACHE_SIZE}.')
+    sub_parsers=parser.add_subparsers(title='Commands', metavar='')
+
+    parser_add = sub_parsers.add_parser(
+        'add',
+        help='Add one or more entries from files or from stdin.',
+        description=textwrap.dedent('''
+            If a filename is specified, that filename is parsed as JSON. If no
+            filename or paths are specified, the user is prompted to enter JSON.
+            The record or records in the JSON are inserted into the database.
+
+            Either way, the input may contain any number of JSON values, one after
+            the other (typically with blank lines between them). So, to add multiple
+            entries, you can either put them into a JSON array, or simply put them
+            sequentially with blank lines between them. The input is read and
+            parsed incrementally, so arbitrarily large files can be added.
+
+            With --jsonl, the input is instead treated as JSON Lines, with exactly
+            one JSON value on each line.
+
+            Any number of paths may also be given. Each can be a file, a directory
+            (whose .json and .jsonl files are added, including those in
+            subdirectories), or a glob pattern. Files ending in .jsonl are always
+            treated as JSON Lines. The files are parsed and validated in parallel
+            by a pool of processes while the entries are inserted in batches, with
+            progress printed to stderr. Memory use does not depend on the size of
+            the files. If a file cannot be parsed, the entries before the error are
+            added, the rest of the file is skipped and reported at the end, and the
+            exit status is 1. Entries that are already present are skipped, so the
+            file can simply be added again once it is fixed.
+
+            With --logs, the files are instead raw device or console logs (such as
+            ITMApplication log files, Xcode console output, or logcat output), and
+            directories are searched for .log and .txt files. Each entry that
+            ActivityTimer logged as STARTUP TIMES is extracted and added, and the
+            rest of the log is ignored. There is no need to strip the logs first.
+            '''),
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser_add.set_defaults(func=add_command)
+    parser_add.add_argument(
+        'paths',
+        nargs='*',
+        metavar='PATH',
+        help='Files, directories, or glob patterns (quoted, with ** to match subdirectories) of '
+             'files containing JSON entries')
+    parser_add.add_argument(
+        '-f',
         '--filename',
         dest='filename',
         help='Filename containing JSON for entry or entries',
         required=False)
+    parser_add.add_argument(
+        '--jsonl',
+        dest='jsonl',
+        action='store_true',
+        help='Treat the input as JSON Lines (one JSON value per line)')
+    parser_add.add_argument(
+        '--logs',
+        dest='logs',
+        action='store_true',
+        help=f'Scan raw device or console logs for the entries logged as "{LOG_TITLE}"')
+    parser_add.add_argument(
+        '-b',
+        '--batch_size',
+        dest='batch_size',
+        type=int,
+        help=f'Number of entries to insert per transaction. Default is {DEFAULT_BATCH_SIZE}.',
+        required=False)
+    parser_add.add_argument(
+        '-j',
+        '--jobs',
+        dest='jobs',
+        type=int,
+        help='Number of processes used to parse files when paths are given. Default is the '
+             'number of CPUs.',
+        required=False)
 
     parser_report = sub_parsers.add_parser(
         'report',
         help='Print report using data in database.',
         description=textwrap.dedent('''
             Prints a report in text-only table format based on the data in the database.
+
+            By default, the report shows the average startup time and number of
+            samples for each device and iTwin version. Use --columns to pick other
+            columns, including the min, max, median (medianTime), 90th and 99th
+            percentiles (p90Time, p99Time), standard deviation (stdDevTime), and a
+            confidence interval for the average (ciLowTime, ciHighTime). The interval
+            is a bootstrap one for groups of up to 500 entries, and a normal one for
+            larger groups.
+
+            Use --since, --until, --model, --system_version, --title, --remote, or
+            --local to only include some of the entries. Without filters, the
+            report is read from the summary tables. With filters, it is computed
+            from the matching entries, which are found using indexes.
+
+            Use --db once for each database to report on several databases at
+            once, such as those kept by different labs, without merging them.
+            The databases are attached read-only, and their summary tables are
+            added up for each device and iTwin version, matching devices and
+            versions by their values. The database given with -d is included
+            too; without -d, the first --db database is used in its place. Up to
+            ten databases can be added with --db, and filters cannot be used. An
+            entry that is in more than one of the databases is counted once for
+            each. Use the merge command to combine databases without duplicates.
+            '''),
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser_report.set_defaults(func=report_command, read_only=True, cache=True)
+    add_statistics_arguments(parser_report, REPORT_COLUMNS, DEFAULT_REPORT_COLUMNS)
+    add_filter_arguments(parser_report)
+    parser_report.add_argument(
+        '--db',
+        dest='shards',
+        action='append',
+        metavar='FILENAME',
+        help='Also report the entries in this database. Can be used more than once.')
+
+    parser_phases = sub_parsers.add_parser(
+        'phases',
+        help='Print per-checkpoint phase breakdown report using data in database.',
+        description=textwrap.dedent('''
+            Prints a report in text-only table format that breaks down the startup
+            time of each device and iTwin version into its phases. Each row shows
+            statistics for the step time of one checkpoint action (for example
+            "After backend load"), which shows which phase of startup changed.
+
+            The same columns as the report command are available, plus the action
+            column. The time columns describe the step time of each checkpoint.
+            The same filters as the report command are also available.
+            '''),
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser_phases.set_defaults(func=phases_command, read_only=True, cache=True)
+    add_statistics_arguments(parser_phases, PHASE_COLUMNS, DEFAULT_PHASE_COLUMNS)
+    add_filter_arguments(parser_phases)
+
+    parser_migrate = sub_parsers.add_parser(
+        'migrate',
+        help='Upgrade the database schema.',
+        description=textwrap.dedent('''
+            Applies any pending schema migrations to the database, each in its own
+            transaction, after writing a backup copy of the database next to it
+            (named <db_filename>.<old schema version>.bak).
+
+            Other commands refuse to use a database with pending migrations, since
+            upgrading can take a long time and the backup is as large as the
+            database. Use --dry_run to see what would change. New databases are
+            created at the current schema version.
+            '''),
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser_migrate.set_defaults(func=migrate_command, allow_outdated=True)
+    parser_migrate.add_argument(
+        '-n',
+        '--dry_run',
+        dest='dry_run',
+        action='store_true',
+        help='List the pending migrations without applying them.')
+    parser_migrate.add_argument(
+        '--no_backup',
+        dest='no_backup',
+        action='store_true',
+        help='Do not back up the database before migrating it.')
+
+    parser_rebuild_summaries = sub_parsers.add_parser(
+        'rebuild-summaries',
+        help='Rebuild the summary tables used by the reports.',
+        description=textwrap.dedent('''
+            Recomputes the EntrySummary and CheckpointSummary tables, which hold
+            running statistics for each device and iTwin version that the report
+            and phases commands read instead of the raw data, and the
+            EntryDaySummary table, which holds the same for each day and is read
+            by the trend command. Then checks them against the raw Entry and
+            Checkpoint tables. Exits with status 1 if the check fails.
+            '''),
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser_rebuild_summaries.set_defaults(func=rebuild_summaries_command)
+    parser_rebuild_summaries.add_argument(
+        '--check_only',
+        dest='check_only',
+        action='store_true',
+        help='Only check the summary tables against the raw data, without rebuilding them.')
+
+    parser_compact = sub_parsers.add_parser(
+        'compact',
+        help='Roll up and delete old entries to keep the database small.',
+        description=textwrap.dedent('''
+            Rolls up the entries from before the last --keep_days UTC days (not
+            counting today) into per-day totals and sorted times for each device
+            and iTwin version, and for each checkpoint action, then deletes the
+            raw entries and their checkpoints. The entries are compacted in transactions of
+            --chunk_size entries, so if the command is interrupted, running it
+            again carries on where it stopped. Finally, the free space is given
+            back to the file system. The first time a database created before
+            this command existed is compacted, this rewrites the whole file once.
+
+            The report, phases, trend, and regressions commands give the same
+            results as before for the compacted days, without filters or with
+            --since and --until given as plain dates and --model or
+            --system_version. Exported entries and the --title, --remote, and
+            time-of-day filters only use the entries that have not been compacted.
+
+            Once a database has been compacted, entries from before the compacted
+            days are skipped by the add, serve, and merge commands, since they
+            cannot be told apart from entries that were compacted. Compacted
+            databases cannot be merged into other databases.
+            '''),
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser_compact.set_defaults(func=compact_command)
+    parser_compact.add_argument(
+        '-k',
+        '--keep_days',
+        dest='keep_days',
+        type=int,
+        required=True,
+        help='Number of whole UTC days before today whose entries are kept, along with today\'s.')
+    parser_compact.add_argument(
+        '--chunk_size',
+        dest='chunk_size',
+        type=int,
+        default=DEFAULT_COMPACT_CHUNK_SIZE,
+        help='Number of entries to compact in each transaction. Default is '
+             f'{DEFAULT_COMPACT_CHUNK_SIZE}.')
+    parser_compact.add_argument(
+        '-n',
+        '--dry_run',
+        dest='dry_run',
+        action='store_true',
+        help='Print the number of entries that would be compacted without compacting them.')
+    parser_compact.add_argument(
+        '--no_vacuum',
+        dest='no_vacuum',
+        action='store_true',
+        help='Do not give the free space back to the file system afterwards.')
+
+    parser_merge = sub_parsers.add_parser(
+        'merge',
+        help='Merge the entries from other databases into the database.',
+        description=textwrap.dedent('''
+            Copies the entries in each of the given startuptimes databases that
+            are not already in the database, along with their checkpoints. Each
+            database is attached and copied in a single transaction, using a
+            fixed number of SQL statements no matter how many entries it has.
+            Devices, iTwin versions, and actions are matched by their values, and
+            an entry is already present if there is one for the same device with
+            the same timestamp. The summary tables are updated in the same
+            transaction.
+
+            The databases to merge must be at the current schema version. (Use
+            the migrate command on them first if necessary.) Exits with status 1
+            if any of them could not be merged.
+            '''),
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser_merge.set_defaults(func=merge_command)
+    parser_merge.add_argument(
+        'filenames',
+        metavar='FILENAME',
+        nargs='+',
+        help='Database to merge.')
+
+    parser_regressions = sub_parsers.add_parser(
+        'regressions',
+        help='Find statistically significant startup time regressions.',
+        description=textwrap.dedent('''
+            Compares every pair of consecutive iTwin versions on each device, both
+            for the total startup time and for the step time of each checkpoint,
+            using a one-sided Mann-Whitney U test. Only the comparisons where the
+            newer version is significantly slower are printed.
+
+            Exits with status 1 if any regressions are found, so that this can be
+            used to gate CI.
+            '''),
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser_regressions.set_defaults(func=regressions_command, read_only=True, cache=True)
+    parser_regressions.add_argument(
+        '--alpha',
+        dest='alpha',
+        type=float,
+        default=0.01,
+        help='Significance threshold for the p-value of the test. Default is 0.01.')
+    parser_regressions.add_argument(
+        '--min_change',
+        dest='min_change',
+        type=float,
+        default=0.05,
+        help='Minimum relative increase of the median to report, as a fraction. Default is 0.05.')
+    parser_regressions.add_argument(
+        '--min_samples',
+        dest='min_samples',
+        type=int,
+        default=5,
+        help='Minimum number of samples a version needs to be compared. Default is 5.')
+    parser_regressions.add_argument(
+        '--total_only',
+        dest='total_only',
+        action='store_true',
+        help='Only compare the total startup time, not the checkpoint step times.')
+    add_filter_arguments(parser_regressions)
+
+    parser_trend = sub_parsers.add_parser(
+        'trend',
+        help='Print how startup times changed over time.',
+        description=textwrap.dedent('''
+            Groups the entries of each device and iTwin version into UTC days,
+            weeks (starting on Monday), or months, and prints one row for each
+            device and iTwin version with the first and last bucket, the number of
+            samples, the smallest, largest, and latest bucket average, and a
+            sparkline of the bucket averages. Taller characters are slower, from
+            '_' for the fastest bucket of that row to '@' for the slowest, and a
+            space means there were no entries. When there are more buckets than
+            fit in --width characters, neighbouring buckets are merged.
+
+            Use --format csv or ndjson to print one row per bucket instead, with
+            the same statistics as the report command.
+
+            The same filters as the report command are available. Without
+            filters, or with --since and --until given as plain dates and --model
+            or --system_version, the buckets are added up from daily summaries, so
+            the time taken depends on the number of days rather than the number
+            of entries.
+            '''),
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser_trend.set_defaults(func=trend_command, read_only=True, cache=True)
+    parser_trend.add_argument(
+        '-b',
+        '--bucket',
+        dest='bucket',
+        choices=TREND_BUCKETS,
+        default='week',
+        help='Size of each bucket. Default is week.')
+    parser_trend.add_argument(
+        '-f',
+        '--format',
+        dest='format',
+        choices=[ 'chart', 'csv', 'ndjson' ],
+        default='chart',
+        help='Output format. Default is chart.')
+    parser_trend.add_argument(
+        '-w',
+        '--width',
+        dest='width',
+        type=int,
+        default=60,
+        help='Maximum number of characters in each sparkline. Default is 60.')
+    add_filter_arguments(parser_trend)
+
+    parser_export = sub_parsers.add_parser(
+        'export',
+        help='Export reports or raw data as CSV, NDJSON, or columnar binary.',
+        description=textwrap.dedent('''
+            Exports the report, the phases report, or the raw devices, entries, or
+            checkpoints for analysis in other tools. Raw data is read and written in
+            chunks, so memory use stays flat however many rows are exported, and
+            all rows come from one consistent snapshot of the database.
+
+            The same filters as the report command are available. With filters,
+            only the matching entries, their checkpoints, and the devices that
+            recorded them are exported.
+
+            The csv format has a header row of column names, with NULL values
+            written as empty fields. The ndjson format has one JSON object per row.
+            Both write timestamps as they were recorded.
+
+            The columnar format must be written to a file with --output. It holds
+            one little-endian array per column, aligned to 64 bytes, followed by a
+            JSON footer giving the number of rows and each column's name, kind,
+            NumPy dtype, and offset. Integer and float columns are int64 and
+            float64, timestamps are int64 milliseconds since the Unix epoch, and
+            strings are int32 indexes into the column's "categories" list in the
+            footer (-1 for NULL). read_columnar() in this script memory-maps the
+            file without parsing it:
+
+                import numpy
+                from startuptimes import read_columnar
+                columns = { column.name: numpy.asarray(column.values)
+                            for column in read_columnar('checkpoints.stcol') }
+
+            Each array is a view of the mapped file, so nothing is copied.
+            Timestamps can be viewed with .view('datetime64[ms]').
+            '''),
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser_export.set_defaults(func=export_command, read_only=True)
+    parser_export.add_argument(
+        'data',
+        choices=[ *EXPORT_REPORTS, *EXPORT_SOURCES ],
+        help='What to export.')
+    parser_export.add_argument(
+        '-f',
+        '--format',
+        dest='format',
+        choices=EXPORT_FORMATS,
+        default='csv',
+        help='Output format. Default is csv.')
+    parser_export.add_argument(
+        '-o',
+        '--output',
+        dest='output',
+        help='Output filename. Default is stdout.',
+        required=False)
+    add_filter_arguments(parser_export)
+
+    parser_serve = sub_parsers.add_parser(
+        'serve',
+        help='Run an HTTP server that accepts entries from test devices.',
+        description=textwrap.dedent('''
+            Runs an HTTP server that test devices can POST their ActivityTimer JSON
+            to, instead of someone copying it into the add command.
+
+            POST /entries accepts a single entry, an array of entries, or NDJSON.
+            Valid entries are queued in memory and answered with 202, and a single
+            writer inserts the queued entries in batched transactions. If the queue
+            is full, the request is rejected with 503 and a Retry-After header, so
+            clients should retry later. A request with more entries than the queue
+            can hold is rejected with 413, and a request containing an invalid entry
+            is rejected with 400, without queueing any of its entries.
+
+            GET /report returns the report rows as JSON, and GET /metrics returns
+            counters and the queue depth in the Prometheus text format. Both are
+            served from aggregates refreshed after each batch is written.
+
+            On SIGINT (Ctrl+C) or SIGTERM, the server stops accepting requests and
+            writes all of the queued entries before exiting.
             '''),
         formatter_class=argparse.RawDescriptionHelpFormatter)
-    parser_report.set_defaults(func=report_command)
+    parser_serve.set_defaults(func=serve_command)
+    parser_serve.add_argument(
+        '--host',
+        dest='host',
+        default='127.0.0.1',
+        help='Address to listen on. Default is 127.0.0.1. Use 0.0.0.0 to accept devices on the '
+             'network.')
+    parser_serve.add_argument(
+        '-p',
+        '--port',
+        dest='port',
+        type=int,
+        default=DEFAULT_PORT,
+        help=f'Port to listen on, or 0 for any free port. Default is {DEFAULT_PORT}.')
+    parser_serve.add_argument(
+        '-q',
+        '--queue_size',
+        dest='queue_size',
+        type=int,
+        default=DEFAULT_QUEUE_SIZE,
+        help=f'Maximum number of queued entries. Default is {DEFAULT_QUEUE_SIZE}.')
+    parser_serve.add_argument(
+        '-b',
+        '--batch_size',
+        dest='batch_size',
+        type=int,
+        help=(
+            'Maximum number of entries to insert per transaction. '
+            f'Default is {DEFAULT_BATCH_SIZE}.'),
+        required=False)
 
     args = parser.parse_args()
     # For some reason, getattr returns None when db_filename doesn't exist, instead of returning
@@ -579,14 +6158,67 @@ def main() -> None:
     # documented to throw an exception if the given attribute does not exist. Since I don't know
     # why it doesn't throw an exception without the default argument, I am providing it just in
     # case. And the 'or 'StartupTimes.db'' on the end is there because getattr is returning None.
-    db = StartupTimesDB(getattr(args, 'db_filename', 'StartupTimes.db') or 'StartupTimes.db')
+    profiler = Profiler(
+        args.profile or args.profile_output is not None or args.trace_sql,
+        sys.stderr if args.trace_sql else None)
+    c_profile = cProfile.Profile() if args.cprofile else None
+    if c_profile is not None:
+        c_profile.enable()
+    db_filename = getattr(args, 'db_filename', 'StartupTimes.db')
+    if not db_filename and len(getattr(args, 'shards', None) or []) > 0:
+        # Without -d, report --db uses the first of its databases as the main one.
+        db_filename = args.shards.pop(0)
+    db_filename = db_filename or 'StartupTimes.db'
+
+    def run_command() -> None:
+        # Only a new database is migrated implicitly, to the current schema version. Upgrading an
+        # existing one can take a long time and writes a backup as large as the database, so every
+        # other command leaves that to the migrate command.
+        is_new = not os.path.exists(db_filename) or os.path.getsize(db_filename) == 0
+        try:
+            # The commands that only read the database (including the default report command) open
+            # it read-only, so they never block or get blocked by the processes adding entries.
+            db = StartupTimesDB(
+                db_filename,
+                is_new,
+                getattr(args, 'read_only', not hasattr(args, 'func')),
+                args.busy_timeout,
+                profiler)
+        except ValueError as error:
+            print(error, file=sys.stderr)
+            sys.exit(1)
+        if not getattr(args, 'allow_outdated', False):
+            try:
+                db.require_current_schema()
+            except ValueError as error:
+                db.close()
+                print(error, file=sys.stderr)
+                sys.exit(1)
+        try:
+            if hasattr(args, 'func'):
+                args.func(db, args)
+            else:
+                report_command(db, args)
+        finally:
+            db.close()
+
     try:
-        if hasattr(args, 'func'):
-            args.func(db, args)
+        cache_key = report_cache_key(args)
+        if cache_key is None:
+            run_command()
         else:
-            report_command(db, args)
+            run_cached(db_filename, cache_key, args.cache_size, profiler, run_command)
     finally:
-        db.close()
+        # This also runs when a command exits with an error, which is when a profile is most
+        # needed.
+        if c_profile is not None:
+            c_profile.disable()
+            c_profile.dump_stats(args.cprofile)
+        if args.profile_output is not None:
+            write_profile(profiler, args.profile_output)
+        elif profiler.enabled:
+            sys.stdout.flush()
+            profiler.write(sys.stderr)
 
 if __name__ == '__main__':
     main()
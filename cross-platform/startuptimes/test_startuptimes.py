@@ -0,0 +1,1563 @@
+#!/usr/bin/env python3
+
+#---------------------------------------------------------------------------------------------
+# Copyright (c) Bentley Systems, Incorporated. All rights reserved.
+# See LICENSE.md in the project root for license terms and full copyright notice.
+#---------------------------------------------------------------------------------------------
+
+# pylint: disable=too-many-lines
+
+'''
+Tests for the startuptimes script. Run them with `python3 -m unittest` in
+this directory. The timing benchmarks are in benchmark.py.
+'''
+
+import csv
+import hashlib
+import http.client
+import itertools
+import json
+import math
+import multiprocessing
+import os
+import random
+import shutil
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from io import StringIO
+from typing import Callable, Iterable, Iterator, Optional
+
+from benchmark import (
+    ACTIONS,
+    CACHE_CASES,
+    COMPACT_BEFORE,
+    count_rows,
+    create_legacy_db,
+    database_size,
+    disjoint_shard_entries,
+    generated_entries,
+    GENERATED_DEVICES,
+    iso_timestamp,
+    legacy_table_string,
+    spread_entries,
+    START_TIME,
+    stress_reader,
+    stress_writer,
+    synthetic_table_rows,
+    TABLE_COLUMNS,
+    TABLE_FORMATTERS,
+    TABLE_WIDTHS,
+    varied_entries
+)
+from startuptimes import (
+    EntryRow,
+    Record,
+    StartupTimesDB,
+    StartupTimesQuery,
+    TextTable,
+    describe,
+    gen_distribution_stats,
+    gen_federated_report_rows,
+    gen_report_rows,
+    ingest_files,
+    iter_log_entries,
+    parse_files,
+    read_columnar,
+    ReportCache,
+    BOOTSTRAP_MAX_VALUES,
+    COLUMNAR_MAGIC,
+    ENTRY_DISTRIBUTION_SQL,
+    PHASE_DISTRIBUTION_SQL,
+    PHASE_ROLLUP_DISTRIBUTION_SQL,
+    QUERY_PHASE_REPORT_SQL,
+    QUERY_REPORT_SQL
+)
+
+def make_entries(
+    count: int,
+    start: int = 0,
+    num_devices: int = 4,
+    interval: timedelta = timedelta(minutes=1)
+) -> Iterator[Record]:
+    '''
+    Generates `count` entries shaped like the JSON written by ActivityTimer,
+    starting with entry number `start`, spread over `num_devices` devices and
+    two iTwin versions, with each entry `interval` after the previous one.
+    The same arguments always generate the same entries.
+    '''
+
+    for i in range(start, start + count):
+        start_time = START_TIME + i * interval
+        steps = [ 0.1 + (i * 7 + index * 3) % 10 / 10 for index in range(len(ACTIONS)) ]
+        totals = list(itertools.accumulate(steps))
+        total = totals[-1]
+        checkpoints = [
+            {
+                'action': action,
+                'timestamp': iso_timestamp(start_time + timedelta(seconds=checkpoint_total)),
+                'step': step,
+                'total': checkpoint_total
+            }
+            for (action, step, checkpoint_total) in zip(ACTIONS, steps, totals)
+        ]
+        device_index = i % num_devices
+        yield {
+            'checkpoints': checkpoints,
+            'device': {
+                'cpuCores': 6,
+                'memory': 4 << 30,
+                'model': 'iPad',
+                'modelID': f'iPad13,{device_index}',
+                'modelIDRefURL': 'https://www.theiphonewiki.com/wiki/Models',
+                'systemName': 'iPadOS',
+                'systemVersion': f'17.{device_index}'
+            },
+            'iTwinVersion': [ '4.0.5', '4.1.3' ][i // num_devices % 2],
+            'timestamp': iso_timestamp(start_time + timedelta(seconds=total)),
+            'title': 'STARTUP TIMES',
+            'totalTime': total,
+            'usingRemoteServer': False
+        }
+
+def write_entries(filename: str, entries: Iterable[Record], jsonl: bool = False) -> None:
+    '''
+    Writes `entries` to the file named `filename` the way ActivityTimer logs
+    them (pretty-printed JSON separated by blank lines), or one per line if
+    `jsonl` is True.
+    '''
+
+    with open(filename, 'w', encoding='utf-8') as output_file:
+        for entry in entries:
+            if jsonl:
+                output_file.write(json.dumps(entry) + '\n')
+            else:
+                output_file.write(json.dumps(entry, indent=2) + '\n\n')
+
+def rows_match(rows: list[Record], other_rows: list[Record]) -> bool:
+    '''
+    Returns True if `rows` and `other_rows` have the same values, allowing
+    for rounding in float values.
+    '''
+
+    return len(rows) == len(other_rows) and all(
+        row.keys() == other_row.keys() and all(
+            math.isclose(value, other_row[key]) if isinstance(value, float)
+            else value == other_row[key]
+            for (key, value) in row.items())
+        for (row, other_row) in zip(rows, other_rows))
+
+class DatabaseTestCase(unittest.TestCase):
+    '''
+    A test case with a temporary directory for its databases.
+    '''
+
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir)
+
+    def path(self, name: str) -> str:
+        '''
+        Returns the path of the file named `name` in the temporary directory.
+        '''
+
+        return os.path.join(self.temp_dir, name)
+
+    def run_startuptimes(
+        self,
+        *args: str,
+        name: str = 'StartupTimes.db'
+    ) -> subprocess.CompletedProcess:
+        '''
+        Runs startuptimes.py with the command line `args` on the database
+        named `name` in a new process, capturing its output.
+        '''
+
+        return subprocess.run([
+            sys.executable,
+            os.path.join(os.path.dirname(os.path.abspath(__file__)), 'startuptimes.py'),
+            '-d', self.path(name),
+            *args
+        ], capture_output=True, text=True, check=False)
+
+    def open_db(self, filename: str, **kwargs) -> StartupTimesDB:
+        '''
+        Opens the database named `filename` (see `StartupTimesDB`), which is
+        closed at the end of the test.
+        '''
+
+        db = StartupTimesDB(filename, **kwargs)
+        self.addCleanup(db.close)
+        return db
+
+    def create_db(self, entries: Iterable[Record], name: str = 'StartupTimes.db') -> str:
+        '''
+        Creates a database named `name` in the temporary directory containing
+        `entries`.
+
+        Returns the filename of the database.
+        '''
+
+        filename = self.path(name)
+        db = StartupTimesDB(filename)
+        try:
+            db.insert_entries(entries)
+        finally:
+            db.close()
+        return filename
+
+class DistributionTests(DatabaseTestCase):
+    '''
+    Tests of the distribution statistics and confidence intervals.
+    '''
+
+    def test_describe(self) -> None:
+        '''
+        Checks the median, 90th percentile, and standard deviation of a small
+        group.
+        '''
+
+        stats = describe([ 1.0, 2.0, 3.0, 4.0, 5.0 ])
+        self.assertEqual(stats['medianTime'], 3.0)
+        self.assertAlmostEqual(stats['p90Time'], 4.6)
+        self.assertAlmostEqual(stats['stdDevTime'], 2.5 ** 0.5)
+
+    def test_no_interval_without_iterations(self) -> None:
+        '''
+        Checks that there is no confidence interval without bootstrap
+        iterations.
+        '''
+
+        stats = describe([ 1.0, 2.0, 3.0 ], 0)
+        self.assertIsNone(stats['ciLowTime'])
+        self.assertIsNone(stats['ciHighTime'])
+
+    def test_intervals_contain_the_mean(self) -> None:
+        '''
+        Checks that the bootstrap and normal confidence intervals contain the
+        mean, and that they are about as wide for large groups.
+        '''
+
+        rand = random.Random(0)
+        for count in [ 10, BOOTSTRAP_MAX_VALUES, BOOTSTRAP_MAX_VALUES + 1, 10000 ]:
+            values = sorted(rand.gauss(5.0, 1.0) for _ in range(count))
+            stats = describe(values, 200, 0.95, random.Random(1))
+            mean = sum(values) / count
+            self.assertLess(stats['ciLowTime'], mean)
+            self.assertGreater(stats['ciHighTime'], mean)
+            if count >= BOOTSTRAP_MAX_VALUES:
+                # Bootstrap and normal intervals of large groups are about the same width.
+                width = stats['ciHighTime'] - stats['ciLowTime']
+                expected = 2 * 1.96 * stats['stdDevTime'] / count ** 0.5
+                self.assertAlmostEqual(width, expected, delta=expected * 0.15)
+
+    def test_distribution_stats(self) -> None:
+        '''
+        Checks that gen_distribution_stats computes an interval for every
+        device and iTwin version.
+        '''
+
+        db = self.open_db(self.create_db(make_entries(40)))
+        stats = gen_distribution_stats(db, 100, 0.95, 0)
+        self.assertEqual(len(stats), 8)
+        for values in stats.values():
+            self.assertLessEqual(values['ciLowTime'], values['ciHighTime'])
+
+    def test_report_without_bootstrap(self) -> None:
+        '''
+        Checks that the report leaves the confidence interval columns empty
+        with --bootstrap 0.
+        '''
+
+        self.create_db(make_entries(40))
+        process = self.run_startuptimes(
+            'report', '-c', 'modelID,iTwinVersion,ciLowTime,ciHighTime', '--bootstrap', '0')
+        self.assertEqual(process.returncode, 0, process.stderr)
+        rows = process.stdout.splitlines()[3:-1]
+        self.assertEqual(len(rows), 8)
+        for row in rows:
+            self.assertEqual([ value.strip() for value in row.split('|')[2:] ], [ '-', '-' ])
+
+class MigrationTests(DatabaseTestCase):
+    '''
+    Tests of the schema migrations.
+    '''
+
+    def test_migrate_legacy_database(self) -> None:
+        '''
+        Checks that migrating a database with the original schema keeps every
+        row, backs it up first, and records every migration.
+        '''
+
+        filename = self.path('Legacy.db')
+        create_legacy_db(filename, 100)
+        counts = count_rows(filename)
+        db = self.open_db(filename, migrate=False)
+        self.assertEqual(db.schema_version, StartupTimesDB.BASE_SCHEMA_VERSION)
+        applied = []
+        backup_filename = db.migrate(on_applied=lambda migration, _: applied.append(migration))
+        self.assertEqual(applied, StartupTimesDB.MIGRATIONS)
+        self.assertEqual(db.schema_version, StartupTimesDB.SCHEMA_VERSION)
+        self.assertEqual(db.pending_migrations(), [])
+        self.assertEqual(db.check_summaries(), [])
+        self.assertEqual(count_rows(filename), counts)
+        self.assertIsNotNone(backup_filename)
+        self.assertEqual(count_rows(backup_filename), counts)
+        versions = {
+            name for (name,) in db.cursor().execute(
+                "SELECT name FROM Props WHERE name LIKE 'migration.%'")
+        }
+        self.assertEqual(
+            versions,
+            { f'migration.{migration.version}' for migration in StartupTimesDB.MIGRATIONS })
+
+    def test_migrate_to_target(self) -> None:
+        '''
+        Checks that migrating to a target version stops there.
+        '''
+
+        filename = self.path('Legacy.db')
+        create_legacy_db(filename, 10)
+        db = self.open_db(filename, migrate=False)
+        target = StartupTimesDB.MIGRATIONS[0].version
+        self.assertIsNone(db.migrate(backup=False, target=target))
+        self.assertEqual(db.schema_version, target)
+        self.assertEqual(db.pending_migrations(), StartupTimesDB.MIGRATIONS[1:])
+
+    def test_commands_require_migrate(self) -> None:
+        '''
+        Checks that commands other than migrate refuse an outdated database
+        without changing or backing it up, and that add creates a new database
+        at the current schema version.
+        '''
+
+        create_legacy_db(self.path('StartupTimes.db'), 10)
+        entries_filename = self.path('entries.json')
+        write_entries(entries_filename, make_entries(5))
+        for command in [ [ 'add', entries_filename ], [ 'report' ] ]:
+            with self.subTest(command[0]):
+                result = self.run_startuptimes(*command)
+                self.assertEqual(result.returncode, 1)
+                self.assertIn('Use the migrate command', result.stderr)
+        self.assertEqual(
+            [ name for name in os.listdir(self.temp_dir) if name.endswith('.bak') ], [])
+        result = self.run_startuptimes('migrate')
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertTrue(os.path.exists(self.path('StartupTimes.db.1.0.bak')))
+        self.assertEqual(self.run_startuptimes('add', entries_filename).returncode, 0)
+        result = self.run_startuptimes('add', entries_filename, name='New.db')
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(
+            self.open_db(self.path('New.db'), read_only=True).schema_version,
+            StartupTimesDB.SCHEMA_VERSION)
+
+    def test_new_database_is_current(self) -> None:
+        '''
+        Checks that a new database is created at the current schema version.
+        '''
+
+        db = self.open_db(self.create_db(make_entries(10)))
+        self.assertEqual(db.schema_version, StartupTimesDB.SCHEMA_VERSION)
+        self.assertIsNone(db.migrate())
+
+class IngestTests(DatabaseTestCase):
+    '''
+    Tests of adding files with a pool of parse processes.
+    '''
+
+    def test_parse_files_in_batches(self) -> None:
+        '''
+        Checks that parse_files yields every entry of each file in batches of
+        at most the batch size, followed by the end of the file.
+        '''
+
+        filenames = [ self.path('a.json'), self.path('b.jsonl') ]
+        write_entries(filenames[0], make_entries(25))
+        write_entries(filenames[1], make_entries(15, 25), True)
+        entries: dict[str, list[Record]] = { filename: [] for filename in filenames }
+        finished = []
+        for (filename, result) in parse_files(filenames, False, jobs=2, batch_size=10):
+            self.assertNotIn(filename, finished)
+            if result is None:
+                finished.append(filename)
+            else:
+                self.assertIsInstance(result, list)
+                self.assertLessEqual(len(result), 10)
+                entries[filename].extend(result)
+        self.assertCountEqual(finished, filenames)
+        self.assertEqual(entries[filenames[0]], list(make_entries(25)))
+        self.assertEqual(entries[filenames[1]], list(make_entries(15, 25)))
+
+    def test_ingest_files(self) -> None:
+        '''
+        Checks that ingest_files inserts the entries of every file, and skips
+        them when they are added again.
+        '''
+
+        filenames = [ self.path(f'device{i}.json') for i in range(4) ]
+        for (i, filename) in enumerate(filenames):
+            write_entries(filename, make_entries(30, i * 30))
+        db = self.open_db(self.path('StartupTimes.db'))
+        (stats, failures) = ingest_files(db, filenames, jobs=2, batch_size=7)
+        self.assertEqual((stats.inserted, stats.skipped, failures), (120, 0, []))
+        self.assertEqual(db.check_summaries(), [])
+        (stats, failures) = ingest_files(db, filenames, jobs=2)
+        self.assertEqual((stats.inserted, stats.skipped, failures), (0, 120, []))
+
+    def test_ingest_files_with_errors(self) -> None:
+        '''
+        Checks that the entries before an error in a file are inserted, and
+        that the file is reported as a failure.
+        '''
+
+        good_filename = self.path('good.json')
+        bad_filename = self.path('bad.jsonl')
+        write_entries(good_filename, make_entries(10))
+        write_entries(bad_filename, make_entries(12, 10), True)
+        with open(bad_filename, 'a', encoding='utf-8') as bad_file:
+            bad_file.write('{ "not": "an entry" }\n')
+        missing_filename = self.path('missing.json')
+        db = self.open_db(self.path('StartupTimes.db'))
+        (stats, failures) = ingest_files(
+            db, [ good_filename, bad_filename, missing_filename ], jobs=2, batch_size=5)
+        # The entries before the error are inserted.
+        self.assertEqual(stats.inserted, 22)
+        self.assertEqual(
+            sorted((filename, type(error)) for (filename, error) in failures),
+            [ (bad_filename, ValueError), (missing_filename, FileNotFoundError) ])
+
+    def test_add_paths(self) -> None:
+        '''
+        Checks that the add command adds the files in a directory, and fails
+        for a file with an invalid entry.
+        '''
+
+        os.mkdir(self.path('entries'))
+        write_entries(self.path('entries/a.json'), make_entries(20))
+        write_entries(self.path('entries/b.jsonl'), make_entries(20, 20), True)
+        process = self.run_startuptimes('add', self.path('entries'), '--jobs', '2')
+        self.assertEqual(process.returncode, 0, process.stderr)
+        self.assertIn('2 files: 40 entries', process.stdout)
+        write_entries(self.path('bad.json'), [ { 'title': 'STARTUP TIMES' } ])
+        process = self.run_startuptimes('add', self.path('bad.json'))
+        self.assertEqual(process.returncode, 1)
+        self.assertIn('bad.json', process.stderr)
+
+class LogTests(DatabaseTestCase):
+    '''
+    Tests of extracting entries from raw device and console logs.
+    '''
+
+    def write_log(self, name: str, parts: list[str]) -> str:
+        '''
+        Writes a log file named `name` made of `parts`, with noise lines
+        between them.
+
+        Returns the filename.
+        '''
+
+        filename = self.path(name)
+        with open(filename, 'w', encoding='utf-8') as log_file:
+            for (index, part) in enumerate(parts):
+                log_file.write(f'12:00:00.{index:03d} ITMLogger: [Info] Loading tile {index}\n')
+                log_file.write(part)
+        return filename
+
+    def test_console_log(self) -> None:
+        '''
+        Checks that entries logged as-is, as in the Xcode console, are found.
+        '''
+
+        entries = list(make_entries(3))
+        filename = self.write_log('console.log', [
+            f'STARTUP TIMES:\n{json.dumps(entry, indent=2)}\n' for entry in entries
+        ])
+        self.assertEqual(list(iter_log_entries(filename)), entries)
+
+    def test_logcat_prefixes(self) -> None:
+        '''
+        Checks that entries whose lines all have the same logcat prefix are
+        found.
+        '''
+
+        entries = list(make_entries(2))
+        prefix = '01-01 12:00:00.000  1234  1250 I ActivityTimer: '
+        filename = self.write_log('logcat.txt', [
+            ''.join(f'{prefix}{line}\n'
+                    for line in f'STARTUP TIMES:\n{json.dumps(entry, indent=2)}'.split('\n'))
+            for entry in entries
+        ])
+        self.assertEqual(list(iter_log_entries(filename)), entries)
+
+    def test_invalid_blocks_are_ignored(self) -> None:
+        '''
+        Checks that text tables, cut off JSON, and invalid entries after the
+        title are ignored, and that an entry on the title's line is found.
+        '''
+
+        (entry, other_entry) = make_entries(2)
+        text = json.dumps(entry, indent=2)
+        filename = self.write_log('device.log', [
+            'STARTUP TIMES:\nDevice | Total\n------+------\niPad  | 1.2s\n',
+            f'STARTUP TIMES:\n{text[:len(text) // 2]}\n',
+            'STARTUP TIMES:\n{ "title": "STARTUP TIMES" }\n',
+            f'STARTUP TIMES: {json.dumps(other_entry)}\n'
+        ])
+        self.assertEqual(list(iter_log_entries(filename)), [ other_entry ])
+
+    def test_empty_log(self) -> None:
+        '''
+        Checks that an empty log has no entries.
+        '''
+
+        self.assertEqual(list(iter_log_entries(self.write_log('empty.log', []))), [])
+
+    def test_add_logs(self) -> None:
+        '''
+        Checks that the add command extracts the entries from the logs in a
+        directory with --logs.
+        '''
+
+        os.mkdir(self.path('logs'))
+        for index in range(2):
+            self.write_log(f'logs/device{index}.log', [
+                f'STARTUP TIMES:\n{json.dumps(entry, indent=2)}\n'
+                for entry in make_entries(5, index * 5)
+            ])
+        process = self.run_startuptimes('add', '--logs', self.path('logs'))
+        self.assertEqual(process.returncode, 0, process.stderr)
+        self.assertIn('2 files: 10 entries', process.stdout)
+
+class ConcurrencyTests(DatabaseTestCase):
+    '''
+    Tests of concurrent writer and reader processes on one database.
+    '''
+
+    def test_wal_mode(self) -> None:
+        '''
+        Checks that databases use write-ahead logging.
+        '''
+
+        db = self.open_db(self.create_db(make_entries(1)))
+        self.assertEqual(db.cursor().execute('PRAGMA journal_mode').fetchone()[0], 'wal')
+
+    def test_read_only_needs_a_database(self) -> None:
+        '''
+        Checks that a missing database cannot be opened read-only.
+        '''
+
+        with self.assertRaises(ValueError):
+            StartupTimesDB(self.path('missing.db'), read_only=True)
+
+    def test_concurrent_writers_and_readers(self) -> None:
+        '''
+        Checks that writers adding overlapping entries in several processes,
+        while a reader reads the report, insert each entry exactly once.
+        '''
+
+        (num_writers, num_entries) = (3, 200)
+        filename = self.path('StartupTimes.db')
+        with multiprocessing.Manager() as manager, ProcessPoolExecutor(num_writers + 1) as executor:
+            done = manager.Event()
+            reader = executor.submit(stress_reader, filename, done)
+            writers = [
+                executor.submit(stress_writer, filename, index, num_entries, 10)
+                for index in range(num_writers)
+            ]
+            results = [ writer.result() for writer in writers ]
+            done.set()
+            # The reader raises if it ever fails, for example with "database is locked".
+            reader.result()
+        # Every writer adds the same first half of its entries, and its own second half.
+        for (inserted, skipped) in results:
+            self.assertEqual(inserted + skipped, num_entries)
+        expected = num_entries // 2 + num_writers * (num_entries - num_entries // 2)
+        self.assertEqual(sum(inserted for (inserted, _) in results), expected)
+        self.assertEqual(count_rows(filename)[:2], (8, expected))
+        self.assertEqual(self.open_db(filename).check_summaries(), [])
+
+class ServeTests(DatabaseTestCase):
+    '''
+    Tests of the HTTP ingestion server run by the serve command.
+    '''
+
+    def setUp(self) -> None:
+        super().setUp()
+        # The server runs until stop_server, which is registered as a cleanup.
+        # pylint: disable-next=consider-using-with
+        self.server = subprocess.Popen([
+            sys.executable,
+            os.path.join(os.path.dirname(os.path.abspath(__file__)), 'startuptimes.py'),
+            '-d', self.path('StartupTimes.db'),
+            'serve',
+            '--port', '0',
+            '--queue_size', '5'
+        ], stdout=subprocess.PIPE, text=True)
+        self.addCleanup(self.stop_server)
+        line = self.server.stdout.readline()
+        self.assertTrue(line.startswith('Serving on http://'), line)
+        self.port = int(line.split('/')[2].rsplit(':', 1)[1])
+
+    def stop_server(self) -> int:
+        '''
+        Stops the server with SIGTERM, which makes it write the queued
+        entries before exiting.
+
+        Returns the exit status of the server.
+        '''
+
+        if self.server.poll() is None:
+            self.server.terminate()
+        status = self.server.wait(30)
+        self.server.stdout.close()
+        return status
+
+    def request(
+        self,
+        method: str,
+        path: str,
+        body: bytes = b''
+    ) -> tuple[int, dict[str, str], bytes]:
+        '''
+        Sends one request to the server.
+
+        Returns the status, the headers with lowercase names, and the body.
+        '''
+
+        connection = http.client.HTTPConnection('127.0.0.1', self.port, timeout=30)
+        try:
+            connection.request(method, path, body)
+            response = connection.getresponse()
+            headers = { name.lower(): value for (name, value) in response.getheaders() }
+            return (response.status, headers, response.read())
+        finally:
+            connection.close()
+
+    def raw_request(self, head: bytes) -> int:
+        '''
+        Sends `head` as the head of a request to the server.
+
+        Returns the response status.
+        '''
+
+        with socket.create_connection(('127.0.0.1', self.port), timeout=30) as connection:
+            connection.sendall(head)
+            return int(connection.makefile('rb').readline().split()[1])
+
+    def test_post_entries(self) -> None:
+        '''
+        Checks that entries posted singly and as JSON Lines are all written
+        before the server exits.
+        '''
+
+        entries = list(make_entries(5))
+        (status, _, body) = self.request('POST', '/entries', json.dumps(entries[0]).encode())
+        self.assertEqual((status, json.loads(body)), (202, { 'queued': 1 }))
+        body = '\n'.join(json.dumps(entry) for entry in entries[1:]).encode()
+        self.assertEqual(self.request('POST', '/entries', body)[0], 202)
+        self.assertEqual(self.stop_server(), 0)
+        db = self.open_db(self.path('StartupTimes.db'), read_only=True)
+        self.assertEqual(db.cursor().execute('SELECT COUNT(*) FROM Entry').fetchone()[0], 5)
+        self.assertEqual(db.check_summaries(), [])
+
+    def test_report_and_metrics(self) -> None:
+        '''
+        Checks the content types and contents of the metrics and report
+        responses.
+        '''
+
+        body = json.dumps(list(make_entries(2))).encode()
+        self.assertEqual(self.request('POST', '/entries', body)[0], 202)
+        (status, headers, body) = self.request('GET', '/metrics')
+        self.assertEqual(status, 200)
+        self.assertTrue(headers['content-type'].startswith('text/plain'))
+        self.assertIn('startuptimes_entries_received_total 2', body.decode())
+        (status, headers, body) = self.request('GET', '/report')
+        self.assertEqual((status, headers['content-type']), (200, 'application/json'))
+        self.assertIsInstance(json.loads(body), list)
+
+    def test_rejected_requests(self) -> None:
+        '''
+        Checks the status of requests with unknown routes, unsupported
+        methods, invalid bodies, and missing or malformed lengths, and that
+        none of their entries are written.
+        '''
+
+        self.assertEqual(self.request('GET', '/missing')[0], 404)
+        self.assertEqual(self.request('GET', '/entries')[0], 405)
+        self.assertEqual(self.request('POST', '/entries', b'{ "title": 1 }')[0], 400)
+        self.assertEqual(self.request('POST', '/entries', b'[ {')[0], 400)
+        # More entries than the queue can ever hold.
+        body = json.dumps(list(make_entries(6))).encode()
+        (status, headers, _) = self.request('POST', '/entries', body)
+        self.assertEqual(status, 413)
+        self.assertNotIn('retry-after', headers)
+        self.assertEqual(self.raw_request(b'POST /entries HTTP/1.1\r\n\r\n'), 411)
+        for length in [ b'abc', b'-1', b'1_0' ]:
+            head = b'POST /entries HTTP/1.1\r\nContent-Length: ' + length + b'\r\n\r\n'
+            self.assertEqual(self.raw_request(head), 400)
+        self.assertEqual(self.stop_server(), 0)
+        db = self.open_db(self.path('StartupTimes.db'), read_only=True)
+        self.assertEqual(db.cursor().execute('SELECT COUNT(*) FROM Entry').fetchone()[0], 0)
+
+class TextTableTests(unittest.TestCase):
+    '''
+    Tests of TextTable.
+    '''
+
+    def test_matches_legacy_rendering(self) -> None:
+        '''
+        Checks that str() renders the same text as the original row-by-row
+        implementation.
+        '''
+
+        rows = list(synthetic_table_rows(500))
+        table = TextTable(rows, TABLE_COLUMNS, TABLE_FORMATTERS)
+        self.assertEqual(str(table), legacy_table_string(rows))
+
+    def test_write_matches_str(self) -> None:
+        '''
+        Checks that write() writes the same text that str() returns.
+        '''
+
+        rows = list(synthetic_table_rows(2500))
+        table = TextTable(rows, TABLE_COLUMNS, TABLE_FORMATTERS)
+        output = StringIO()
+        table.write(output)
+        self.assertEqual(output.getvalue(), str(table))
+
+    def test_fixed_widths(self) -> None:
+        '''
+        Checks the column widths of a table of a generator with fixed widths,
+        and that the generator is only consumed once.
+        '''
+
+        table = TextTable(
+            synthetic_table_rows(2500), TABLE_COLUMNS, TABLE_FORMATTERS, TABLE_WIDTHS)
+        lines = str(table).splitlines()
+        self.assertEqual(len(lines), 2502)
+        titles = [ title.strip() for title in lines[0].split(' | ') ]
+        self.assertEqual(titles, [ title for (_, title) in TABLE_COLUMNS ])
+        # Each column is as wide as its width or its title, whichever is longer.
+        widths = [
+            max(width, len(title)) for (width, (_, title)) in zip(TABLE_WIDTHS, TABLE_COLUMNS)
+        ]
+        self.assertEqual(list(map(len, lines[1].split('-+-'))), widths)
+        # A generator can only be iterated once, so the table can only be written once.
+        self.assertEqual(str(table), '')
+
+    def test_long_values_are_not_truncated(self) -> None:
+        '''
+        Checks that values longer than their fixed width widen their row
+        instead of being truncated.
+        '''
+
+        rows = [ { 'name': 'a much longer value', 'count': 12345 } ]
+        table = TextTable(rows, [ ('name', 'Name'), ('count', 'Count') ], widths=[ 4, 2 ])
+        self.assertEqual(str(table).splitlines(), [
+            'Name | Count',
+            '-----+------',
+            'a much longer value | 12345'
+        ])
+
+    def test_empty_table(self) -> None:
+        '''
+        Checks that a table without rows renders as an empty string.
+        '''
+
+        self.assertEqual(str(TextTable([], TABLE_COLUMNS)), '')
+        self.assertEqual(str(TextTable(iter([]), TABLE_COLUMNS, widths=TABLE_WIDTHS)), '')
+
+    def test_elapsed_string(self) -> None:
+        '''
+        Checks the formatting of durations and of missing durations.
+        '''
+
+        self.assertEqual(TextTable.elapsed_string(1.5), '1.500s')
+        self.assertEqual(TextTable.elapsed_string(None), '-')
+
+class ExportTests(DatabaseTestCase):
+    '''
+    Tests of the export command.
+    '''
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.create_db(make_entries(20))
+        db = self.open_db(self.path('StartupTimes.db'), read_only=True)
+        self.checkpoints = db.cursor().execute('''
+            SELECT Checkpoint.id, Action.name, Checkpoint.step, Checkpoint.total
+            FROM Checkpoint
+            JOIN Action ON Action.id = Checkpoint.actionID
+            ORDER BY Checkpoint.id
+            ''').fetchall()
+
+    def export(self, data: str, export_format: str) -> str:
+        '''
+        Exports `data` in `export_format` to a file.
+
+        Returns the filename.
+        '''
+
+        output = self.path(f'{data}.{export_format}')
+        result = self.run_startuptimes(
+            'export', data, '--format', export_format, '--output', output)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        return output
+
+    def test_csv(self) -> None:
+        '''
+        Checks the checkpoints exported as CSV, and that timestamps are in
+        UTC.
+        '''
+
+        with open(self.export('checkpoints', 'csv'), encoding='utf-8', newline='') as file:
+            rows = list(csv.DictReader(file))
+        self.assertEqual(
+            [
+                (int(row['id']), row['action'], float(row['step']), float(row['total']))
+                for row in rows
+            ],
+            self.checkpoints)
+        self.assertTrue(rows[0]['timestamp'].endswith('Z'))
+
+    def test_ndjson(self) -> None:
+        '''
+        Checks the checkpoints exported as NDJSON.
+        '''
+
+        with open(self.export('checkpoints', 'ndjson'), encoding='utf-8') as file:
+            rows = list(map(json.loads, file))
+        self.assertEqual(
+            [ (row['id'], row['action'], row['step'], row['total']) for row in rows ],
+            self.checkpoints)
+
+    def test_columnar(self) -> None:
+        '''
+        Checks the columns, strings, and timestamps of the checkpoints exported
+        in the columnar format.
+        '''
+
+        columns = { column.name: column for column in read_columnar(
+            self.export('checkpoints', 'columnar')) }
+        self.assertEqual(
+            list(columns),
+            [ 'id', 'entryID', 'arrayIndex', 'action', 'timestamp', 'step', 'total' ])
+        actions = columns['action']
+        self.assertEqual(
+            list(zip(
+                columns['id'].values.tolist(),
+                [ actions.categories[code] for code in actions.values.tolist() ],
+                columns['step'].values.tolist(),
+                columns['total'].values.tolist())),
+            self.checkpoints)
+        # The first checkpoint is 100 ms after the first entry's timestamp.
+        self.assertEqual(
+            columns['timestamp'].values[0], int(START_TIME.timestamp() * 1000) + 100)
+
+    def test_truncated_columnar(self) -> None:
+        '''
+        Checks that reading a truncated columnar export fails.
+        '''
+
+        output = self.export('checkpoints', 'columnar')
+        with open(output, 'r+b') as file:
+            file.truncate(os.path.getsize(output) - 1)
+        with self.assertRaises(ValueError):
+            read_columnar(output)
+
+    def rewrite_footer(self, output: str, change: Callable[[Record], None]) -> None:
+        '''
+        Applies `change` to the decoded footer of the columnar export named
+        `output` and writes the footer back.
+        '''
+
+        with open(output, 'rb') as file:
+            data = file.read()
+        footer_end = len(data) - len(COLUMNAR_MAGIC) - 8
+        footer_start = footer_end - int.from_bytes(data[footer_end:footer_end + 8], 'little')
+        footer = json.loads(data[footer_start:footer_end])
+        change(footer)
+        encoded = json.dumps(footer).encode()
+        with open(output, 'wb') as file:
+            file.write(data[:footer_start] + encoded + len(encoded).to_bytes(8, 'little'))
+            file.write(COLUMNAR_MAGIC)
+
+    def test_invalid_columnar_footer(self) -> None:
+        '''
+        Checks that reading a columnar export whose footer describes columns
+        outside the data region fails.
+        '''
+
+        output = self.export('checkpoints', 'columnar')
+        self.assertEqual(len(read_columnar(output)[0].values), len(self.checkpoints))
+        for (name, change) in [
+            ('double rows', lambda footer: footer.update(rows=footer['rows'] * 2)),
+            ('huge rows', lambda footer: footer.update(rows=1 << 40)),
+            ('negative rows', lambda footer: footer.update(rows=-1)),
+            ('negative offset', lambda footer: footer['columns'][0].update(offset=-8)),
+            ('missing kind', lambda footer: footer['columns'][0].pop('kind')),
+        ]:
+            with self.subTest(name):
+                self.export('checkpoints', 'columnar')
+                self.rewrite_footer(output, change)
+                with self.assertRaises(ValueError):
+                    read_columnar(output)
+        with open(output, 'r+b') as file:
+            file.seek(-len(COLUMNAR_MAGIC) - 8, os.SEEK_END)
+            file.write((1 << 40).to_bytes(8, 'little'))
+        with self.assertRaises(ValueError):
+            read_columnar(output)
+
+    def test_report_formats_agree(self) -> None:
+        '''
+        Checks that the report exported as CSV and as NDJSON has the same
+        rows.
+        '''
+
+        with open(self.export('report', 'csv'), encoding='utf-8', newline='') as file:
+            csv_rows = list(csv.DictReader(file))
+        with open(self.export('report', 'ndjson'), encoding='utf-8') as file:
+            ndjson_rows = list(map(json.loads, file))
+        self.assertEqual(len(csv_rows), len(ndjson_rows))
+        self.assertEqual(
+            [ (row['modelID'], float(row['averageTime'])) for row in csv_rows ],
+            [ (row['modelID'], row['averageTime']) for row in ndjson_rows ])
+
+    def test_columnar_needs_output(self) -> None:
+        '''
+        Checks that a columnar export without --output fails.
+        '''
+
+        result = self.run_startuptimes('export', 'checkpoints', '--format', 'columnar')
+        self.assertEqual(result.returncode, 1)
+        self.assertIn('--output', result.stderr)
+
+# Each filter checked by QueryTests: its name, a function that applies it to a query, the same
+# filter as a predicate on EntryRow, and the indexes that may drive the paged query and the
+# filtered aggregates. None accepts any index. The entries of QueryTests span about three days.
+QUERY_FILTERS: list[tuple[str,
+                          Callable[[StartupTimesQuery], StartupTimesQuery],
+                          Callable[[EntryRow], bool],
+                          Optional[tuple[str, ...]],
+                          Optional[tuple[str, ...]]]] = [
+    (
+        'since',
+        lambda query: query.since('2024-01-02'),
+        lambda entry: entry.timestamp >= '2024-01-02',
+        ('Entry_timestamp',),
+        ('Entry_timestamp',)
+    ),
+    (
+        'since, until',
+        lambda query: query.since('2024-01-02').until('2024-01-03'),
+        lambda entry: '2024-01-02' <= entry.timestamp < '2024-01-03',
+        ('Entry_timestamp',),
+        ('Entry_timestamp',)
+    ),
+    (
+        'since a time',
+        lambda query: query.since('2024-01-02T12:00:00Z'),
+        lambda entry: entry.timestamp >= '2024-01-02T12:00:00Z',
+        ('Entry_timestamp',),
+        ('Entry_timestamp',)
+    ),
+    (
+        'model',
+        lambda query: query.model_ids('iPad13,3', 'iPad13,9'),
+        lambda entry: entry.modelID in ('iPad13,3', 'iPad13,9'),
+        ('Entry_timestamp', 'Entry_lookup'),
+        ('Entry_deviceID_versionID', 'Entry_lookup')
+    ),
+    (
+        'system_version',
+        lambda query: query.system_versions('17.2'),
+        lambda entry: entry.systemVersion == '17.2',
+        ('Entry_timestamp', 'Entry_lookup'),
+        ('Entry_deviceID_versionID', 'Entry_lookup')
+    ),
+    (
+        'title',
+        lambda query: query.titles('CAMERA SAMPLE'),
+        lambda entry: entry.title == 'CAMERA SAMPLE',
+        ('Entry_title',),
+        ('Entry_title',)
+    ),
+    (
+        'remote',
+        lambda query: query.using_remote_server(True),
+        lambda entry: entry.usingRemoteServer,
+        ('Entry_usingRemoteServer',),
+        ('Entry_usingRemoteServer',)
+    ),
+    (
+        'local',
+        lambda query: query.using_remote_server(False),
+        lambda entry: not entry.usingRemoteServer,
+        ('Entry_usingRemoteServer',),
+        ('Entry_usingRemoteServer',)
+    ),
+    (
+        'combined',
+        lambda query: query.since('2024-01-02').model_ids('iPad13,3').using_remote_server(False),
+        lambda entry: (entry.timestamp >= '2024-01-02' and entry.modelID == 'iPad13,3'
+                       and not entry.usingRemoteServer),
+        None,
+        None
+    )
+]
+
+class QueryTests(DatabaseTestCase):
+    '''
+    Tests of the query plans and results of each StartupTimesQuery filter.
+    '''
+
+    NUM_ENTRIES = 4000
+    PAGE_SIZE = 100
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.filename = self.create_db(varied_entries(QueryTests.NUM_ENTRIES))
+
+    def check_plan(self, plan: list[str], table: str, indexes: Optional[tuple[str, ...]]) -> None:
+        '''
+        Checks that the query plan `plan` reads `table` using one of `indexes`
+        (or any index if `indexes` is None), and never scans `table` or
+        Checkpoint.
+        '''
+
+        self.assertFalse(
+            any(step in (f'SCAN {table}', 'SCAN Checkpoint') for step in plan), plan)
+        steps = [ step for step in plan if step.startswith(f'SEARCH {table} ') ]
+        self.assertNotEqual(steps, [], plan)
+        if indexes is not None:
+            self.assertTrue(
+                any(f'INDEX {index} ' in f'{step} ' for step in steps for index in indexes),
+                plan)
+
+    def check_filters(self) -> None:
+        '''
+        Checks the query plans of each of the `QUERY_FILTERS`.
+        '''
+
+        db = self.open_db(self.filename, read_only=True)
+        unfiltered = StartupTimesQuery(db)
+        all_entries = list(unfiltered.entries(QueryTests.PAGE_SIZE))
+        self.assertEqual(len(all_entries), QueryTests.NUM_ENTRIES)
+        after = all_entries[len(all_entries) // 2]
+        for (name, apply, _, page_indexes, aggregate_indexes) in QUERY_FILTERS:
+            with self.subTest(name):
+                query = apply(unfiltered)
+                self.check_plan(
+                    query.explain(*query.page_sql(QueryTests.PAGE_SIZE, after)),
+                    'Entry',
+                    page_indexes)
+                for sql in [
+                    QUERY_REPORT_SQL,
+                    QUERY_PHASE_REPORT_SQL,
+                    ENTRY_DISTRIBUTION_SQL,
+                    PHASE_DISTRIBUTION_SQL
+                ]:
+                    self.check_plan(
+                        query.explain(*query.restrict(sql)), 'main.Entry', aggregate_indexes)
+
+    def test_plans(self) -> None:
+        '''
+        Checks the query plans of each filter on a freshly created database.
+        '''
+
+        self.check_filters()
+
+    def test_plans_after_analyze(self) -> None:
+        '''
+        Checks the query plans of each filter after ANALYZE has given SQLite
+        statistics about the indexes.
+        '''
+
+        connection = sqlite3.connect(self.filename)
+        try:
+            connection.execute('ANALYZE')
+        finally:
+            connection.close()
+        self.check_filters()
+
+    def test_results(self) -> None:
+        '''
+        Checks that each filter selects the same entries, report rows, and
+        phase rows as filtering every entry with its predicate.
+        '''
+
+        db = self.open_db(self.filename, read_only=True)
+        unfiltered = StartupTimesQuery(db)
+        all_entries = list(unfiltered.entries(QueryTests.PAGE_SIZE))
+        for (name, apply, predicate, _, _) in QUERY_FILTERS:
+            with self.subTest(name):
+                query = apply(unfiltered)
+                expected = [ entry for entry in all_entries if predicate(entry) ]
+                self.assertNotEqual(expected, [])
+                self.assertEqual(list(query.entries(QueryTests.PAGE_SIZE)), expected)
+                groups: dict[tuple[int, str], list[float]] = {}
+                for entry in expected:
+                    groups.setdefault(
+                        (entry.deviceID, entry.iTwinVersion), []).append(entry.totalTime)
+                report = {
+                    (row['deviceID'], row['iTwinVersion']): row for row in query.report_rows()
+                }
+                self.assertEqual(report.keys(), groups.keys())
+                for (key, times) in groups.items():
+                    self.assertEqual(report[key]['samples'], len(times))
+                    self.assertTrue(
+                        math.isclose(report[key]['averageTime'], sum(times) / len(times)))
+                self.assertEqual(
+                    sum(row['samples'] for row in query.phase_rows()),
+                    len(ACTIONS) * len(expected))
+
+class TrendTests(DatabaseTestCase):
+    '''
+    Tests of the trend buckets, which are computed from the daily summaries
+    when the filters allow it and from the entries otherwise.
+    '''
+
+    NUM_ENTRIES = 3000
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.filename = self.create_db(spread_entries(TrendTests.NUM_ENTRIES))
+        self.query = StartupTimesQuery(self.open_db(self.filename, read_only=True))
+
+    def test_summaries_match_entries(self) -> None:
+        '''
+        Checks that the daily summaries match the entries.
+        '''
+
+        self.assertEqual(self.open_db(self.filename).check_summaries(), [])
+
+    def test_every_entry_is_counted(self) -> None:
+        '''
+        Checks that the buckets of each size count every entry once.
+        '''
+
+        for bucket in [ 'day', 'week', 'month' ]:
+            with self.subTest(bucket):
+                self.assertEqual(
+                    sum(row['samples'] for row in self.query.trend_rows(bucket)),
+                    TrendTests.NUM_ENTRIES)
+
+    def test_summary_and_entry_buckets_match(self) -> None:
+        '''
+        Checks that the buckets computed from the daily summaries match those
+        computed from the entries.
+        '''
+
+        # Filtering on the only title selects every entry, but the buckets have to be computed
+        # from Entry, since EntryDaySummary has no titles.
+        for bucket in [ 'day', 'week', 'month' ]:
+            with self.subTest(bucket):
+                self.assertTrue(rows_match(
+                    list(self.query.titles('STARTUP TIMES').trend_rows(bucket)),
+                    list(self.query.trend_rows(bucket))))
+
+    def test_filtered_buckets_match(self) -> None:
+        '''
+        Checks that filtered buckets computed from the daily summaries match
+        those computed from the entries.
+        '''
+
+        query = self.query.since('2026-01-01').model_ids('iPad13,3')
+        rows = list(query.trend_rows('week'))
+        self.assertNotEqual(rows, [])
+        self.assertTrue(rows_match(list(query.titles('STARTUP TIMES').trend_rows('week')), rows))
+
+    def test_trend_command(self) -> None:
+        '''
+        Checks that the trend command charts the filtered entries.
+        '''
+
+        result = self.run_startuptimes(
+            'trend', '--bucket', 'month', '--since', '2026-01-01', '--model', 'iPad13,3')
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertIn('iPad13,3', result.stdout)
+
+class ProfileTests(DatabaseTestCase):
+    '''
+    Tests of the profile summaries written by --profile_output.
+    '''
+
+    NUM_ENTRIES = 50
+
+    def test_profiles(self) -> None:
+        '''
+        Checks that the profile of each command reports its phases and counts,
+        and that its phase times add up to its total time.
+        '''
+
+        entries_dir = self.path('entries')
+        os.mkdir(entries_dir)
+        write_entries(
+            os.path.join(entries_dir, 'entries.json'), make_entries(ProfileTests.NUM_ENTRIES))
+        profile_filename = self.path('profile.json')
+        # Each command line, the phases that its profile must report, and the counters whose
+        # values are the number of entries.
+        cases = [
+            (
+                [ 'add', entries_dir ],
+                [ 'setup', 'parse', 'lock', 'lookup', 'insert', 'summarize', 'commit' ],
+                [ 'entries parsed', 'entries inserted' ]
+            ),
+            (
+                [ 'report', '-c', 'modelID,medianTime,p90Time' ],
+                [ 'setup', 'query', 'statistics', 'render' ],
+                []
+            ),
+            ([ 'trend', '-b', 'day' ], [ 'setup', 'query', 'render' ], []),
+            ([ 'export', 'entries' ], [ 'setup', 'query', 'render' ], [ 'rows read' ])
+        ]
+        for (command, phases, counters) in cases:
+            with self.subTest(command[0]):
+                # Cached reports would skip the work being profiled.
+                result = self.run_startuptimes(
+                    '--no_cache', '--profile_output', profile_filename, *command)
+                self.assertEqual(result.returncode, 0, result.stderr)
+                with open(profile_filename, encoding='utf-8') as profile_file:
+                    summary = json.load(profile_file)
+                for phase in phases:
+                    self.assertIn(phase, summary['phases'])
+                for counter in counters:
+                    self.assertEqual(summary['counts'].get(counter), ProfileTests.NUM_ENTRIES)
+                self.assertAlmostEqual(
+                    sum(phase['seconds'] for phase in summary['phases'].values()),
+                    summary['totalSeconds'],
+                    delta=0.001)
+                self.assertGreater(sum(summary['statements'].values()), 0)
+
+    def test_profile_to_stderr(self) -> None:
+        '''
+        Checks that --profile writes the summary to stderr rather than stdout.
+        '''
+
+        self.create_db(make_entries(5))
+        result = self.run_startuptimes('--profile', 'report')
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertIn('render', result.stderr)
+        self.assertNotIn('render', result.stdout)
+
+def natural_report_rows(rows: Iterable[Record]) -> list[Record]:
+    '''
+    Returns the report rows in `rows` without their device and version ids,
+    which differ between databases, sorted by device and iTwin version.
+    '''
+
+    return sorted(
+        ({ key: value for (key, value) in row.items() if key not in ('deviceID', 'versionID') }
+         for row in rows),
+        key=lambda row: (row['modelID'], row['osVersion'], row['iTwinVersion']))
+
+class MergeTests(DatabaseTestCase):
+    '''
+    Tests of merging databases and of federated reports across them.
+    '''
+
+    NUM_SHARDS = 3
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.shard_entries = disjoint_shard_entries(300, MergeTests.NUM_SHARDS)
+        self.shard_filenames = [
+            self.create_db(entries, f'Shard{index}.db')
+            for (index, entries) in enumerate(self.shard_entries)
+        ]
+        reference = self.open_db(
+            self.create_db(itertools.chain(*self.shard_entries), 'Reference.db'), read_only=True)
+        self.reference_rows = natural_report_rows(gen_report_rows(reference))
+
+    def test_merge(self) -> None:
+        '''
+        Checks that merging each database inserts all of its entries and gives
+        the same report as adding them all to one database.
+        '''
+
+        db = self.open_db(self.path('Merged.db'))
+        for (entries, shard_filename) in zip(self.shard_entries, self.shard_filenames):
+            stats = db.merge(shard_filename)
+            self.assertEqual((stats.inserted, stats.skipped), (len(entries), 0))
+        self.assertEqual(db.check_summaries(), [])
+        self.assertTrue(rows_match(natural_report_rows(gen_report_rows(db)), self.reference_rows))
+
+    def test_merge_again(self) -> None:
+        '''
+        Checks that merging a database a second time skips all of its
+        entries.
+        '''
+
+        db = self.open_db(self.path('Merged.db'))
+        db.merge(self.shard_filenames[0])
+        stats = db.merge(self.shard_filenames[0])
+        self.assertEqual((stats.inserted, stats.skipped), (0, len(self.shard_entries[0])))
+        self.assertEqual(db.check_summaries(), [])
+
+    def test_merge_command(self) -> None:
+        '''
+        Checks that the merge command merges the databases, and that it
+        reports skipped entries and fails when a database is missing.
+        '''
+
+        result = self.run_startuptimes('merge', *self.shard_filenames, name='Merged.db')
+        self.assertEqual(result.returncode, 0, result.stderr)
+        result = self.run_startuptimes(
+            'merge', self.shard_filenames[0], self.path('Missing.db'), name='Merged.db')
+        self.assertEqual(result.returncode, 1)
+        self.assertIn('already being present', result.stdout)
+        db = self.open_db(self.path('Merged.db'), read_only=True)
+        self.assertTrue(rows_match(natural_report_rows(gen_report_rows(db)), self.reference_rows))
+
+    def test_federated_report(self) -> None:
+        '''
+        Checks that a report across the attached databases matches the report
+        of one database with all of their entries.
+        '''
+
+        db = self.open_db(self.shard_filenames[0], read_only=True)
+        for shard_filename in self.shard_filenames[1:]:
+            db.attach_shard(shard_filename)
+        self.assertTrue(rows_match(
+            natural_report_rows(gen_federated_report_rows(db)), self.reference_rows))
+
+def compact_reports(db: StartupTimesDB) -> dict[str, list[Record]]:
+    '''
+    Returns the reports that must not change when `db` is compacted: the
+    report, phases, and trend reports, the distribution statistics, and the
+    groups of values compared by the regressions command, without filters
+    and with filters that select whole days of whole devices.
+    '''
+
+    def distribution(stats: dict[tuple, Record]) -> list[Record]:
+        return [{ 'key': key, **group_stats } for (key, group_stats) in stats.items()]
+
+    query = StartupTimesQuery(db)
+    filtered = (query.since('2024-03-01').until('2024-12-01')
+                .model_ids(GENERATED_DEVICES[0][0]['modelID'], GENERATED_DEVICES[2][0]['modelID']))
+    phase_sql = (PHASE_DISTRIBUTION_SQL, PHASE_ROLLUP_DISTRIBUTION_SQL)
+    return {
+        'distribution': distribution(query.distribution_stats(100, 0.95, 0)),
+        'phase distribution': distribution(query.distribution_stats(100, 0.95, 0, phase_sql)),
+        'filtered distribution': distribution(filtered.distribution_stats(100, 0.95, 0)),
+        'filtered phase distribution': distribution(
+            filtered.distribution_stats(100, 0.95, 0, phase_sql)),
+        'regression groups': [
+            { 'key': key, 'values': values.tolist() }
+            for (key, values) in filtered.distribution_groups(*phase_sql)
+        ],
+        'report': list(query.report_rows()),
+        'phases': list(query.phase_rows()),
+        'daily trend': list(query.trend_rows('day')),
+        'weekly trend': list(query.trend_rows('week')),
+        'filtered report': list(filtered.report_rows()),
+        'filtered phases': list(filtered.phase_rows()),
+        'filtered trend': list(filtered.trend_rows('month'))
+    }
+
+class CompactTests(DatabaseTestCase):
+    '''
+    Tests of compacting old entries into rollups.
+    '''
+
+    NUM_ENTRIES = 3000
+    CHUNK_SIZE = 100
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.entries = list(generated_entries(CompactTests.NUM_ENTRIES))
+        self.num_old = sum(1 for entry in self.entries if entry['timestamp'] < COMPACT_BEFORE)
+        self.filename = self.create_db(self.entries)
+        self.db = self.open_db(self.filename)
+        self.expected = compact_reports(self.db)
+
+    def check_reports(self) -> None:
+        '''
+        Checks that the summary tables match the raw and rolled up data, and
+        that the reports have not changed since the database was created.
+        '''
+
+        self.assertEqual(self.db.check_summaries(), [])
+        for (name, rows) in compact_reports(self.db).items():
+            with self.subTest(name):
+                self.assertTrue(rows_match(rows, self.expected[name]))
+
+    def test_interrupted_compaction(self) -> None:
+        '''
+        Checks that an interrupted compaction leaves the reports unchanged, and
+        that resuming it compacts the remaining old entries exactly once.
+        '''
+
+        class Interrupted(Exception):
+            '''
+            Stops the compaction once about half of the old entries are compacted.
+            '''
+
+        num_interrupted = 0
+
+        def interrupt(num_entries: int, _: int) -> None:
+            nonlocal num_interrupted
+            num_interrupted = num_entries
+            if num_entries >= self.num_old // 2:
+                raise Interrupted()
+
+        with self.assertRaises(Interrupted):
+            self.db.compact(COMPACT_BEFORE, CompactTests.CHUNK_SIZE, interrupt)
+        self.assertLess(num_interrupted, self.num_old)
+        self.check_reports()
+        (num_resumed, _) = self.db.compact(COMPACT_BEFORE, CompactTests.CHUNK_SIZE)
+        self.assertEqual(num_interrupted + num_resumed, self.num_old)
+        self.check_reports()
+        self.assertEqual(self.db.compact(COMPACT_BEFORE, CompactTests.CHUNK_SIZE), (0, 0))
+
+    def test_vacuum(self) -> None:
+        '''
+        Checks that vacuuming after compaction shrinks the database and leaves
+        no free pages.
+        '''
+
+        old_size = database_size(self.db)
+        self.db.compact(COMPACT_BEFORE, CompactTests.CHUNK_SIZE)
+        self.db.vacuum()
+        self.assertLess(database_size(self.db), old_size)
+        self.assertEqual(self.db.cursor().execute('PRAGMA freelist_count').fetchone()[0], 0)
+        self.check_reports()
+
+    def test_rebuild_and_add_again(self) -> None:
+        '''
+        Checks that rebuilding the summaries keeps the rollups, and that adding
+        the compacted entries again skips them.
+        '''
+
+        self.db.compact(COMPACT_BEFORE, CompactTests.CHUNK_SIZE)
+        self.db.rebuild_summaries()
+        self.check_reports()
+        stats = self.db.insert_entries(self.entries)
+        self.assertEqual((stats.inserted, stats.skipped), (0, CompactTests.NUM_ENTRIES))
+        self.check_reports()
+
+    def test_compacted_database_cannot_be_merged(self) -> None:
+        '''
+        Checks that merging a compacted database fails.
+        '''
+
+        self.db.compact(COMPACT_BEFORE, CompactTests.CHUNK_SIZE)
+        with self.assertRaises(ValueError):
+            self.open_db(self.path('Merged.db')).merge(self.filename)
+
+    def test_legacy_database_is_converted(self) -> None:
+        '''
+        Checks that vacuuming converts a database without auto vacuum to
+        incremental auto vacuum.
+        '''
+
+        # A database created before compaction existed does not use incremental auto vacuum.
+        cur = self.db.cursor()
+        cur.execute('PRAGMA auto_vacuum = NONE')
+        cur.execute('VACUUM')
+        old_size = database_size(self.db)
+        self.db.compact(COMPACT_BEFORE, CompactTests.CHUNK_SIZE)
+        self.db.vacuum()
+        self.assertEqual(cur.execute('PRAGMA auto_vacuum').fetchone()[0], 2)
+        self.assertLess(database_size(self.db), old_size)
+        self.check_reports()
+
+class CacheTests(DatabaseTestCase):
+    '''
+    Tests of the report cache.
+    '''
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.entries = list(generated_entries(502))
+        self.filename = self.create_db(self.entries[:500])
+
+    def run_report(self, *args: str) -> tuple[str, int]:
+        '''
+        Runs startuptimes.py with the command line `args`.
+
+        Returns the output and the exit status.
+        '''
+
+        result = self.run_startuptimes(*args)
+        return (result.stdout + result.stderr, result.returncode)
+
+    def cached_commands(self) -> list[str]:
+        '''
+        Returns the names of the command handlers whose reports are cached.
+        '''
+
+        cache_db = sqlite3.connect(f'{self.filename}.reportcache')
+        try:
+            return sorted(
+                json.loads(key)['command'] for (key,) in cache_db.execute('SELECT key FROM Report'))
+        finally:
+            cache_db.close()
+
+    def test_cached_output(self) -> None:
+        '''
+        Checks that each cached report prints the same output as running the
+        command without the cache, both when it is cached and when it is read
+        from the cache.
+        '''
+
+        self.assertIsNotNone(ReportCache.change_token(self.filename))
+        for command in CACHE_CASES:
+            with self.subTest(command[0]):
+                expected = self.run_report('--no_cache', *command)
+                self.assertEqual(self.run_report(*command), expected)
+                self.assertEqual(self.run_report(*command), expected)
+        self.assertEqual(len(self.cached_commands()), len(CACHE_CASES))
+
+    def test_script_in_key(self) -> None:
+        '''
+        Checks that cached reports are keyed on the contents of the script,
+        not on when it was last written.
+        '''
+
+        self.run_report(*CACHE_CASES[0])
+        cache_db = sqlite3.connect(f'{self.filename}.reportcache')
+        try:
+            (key,) = cache_db.execute('SELECT key FROM Report').fetchone()
+        finally:
+            cache_db.close()
+        script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'startuptimes.py')
+        with open(script, 'rb') as file:
+            self.assertEqual(json.loads(key)['script'], hashlib.sha256(file.read()).hexdigest())
+
+    def test_invalidation(self) -> None:
+        '''
+        Checks that adding entries bumps the change counter, so that cached
+        reports are recomputed.
+        '''
+
+        for command in CACHE_CASES[:2]:
+            self.run_report(*command)
+        db = StartupTimesDB(self.filename)
+        try:
+            old_counter = db.change_counter
+            db.insert_entries(self.entries[-2:])
+            self.assertGreater(db.change_counter, old_counter)
+        finally:
+            db.close()
+        for command in CACHE_CASES[:2]:
+            with self.subTest(command[0]):
+                self.assertEqual(self.run_report(*command), self.run_report('--no_cache', *command))
+
+    def test_cache_size(self) -> None:
+        '''
+        Checks that only the --cache_size most recently used reports are kept.
+        '''
+
+        for command in CACHE_CASES:
+            self.run_report('--cache_size', '2', *command)
+        self.assertEqual(self.cached_commands(), [ 'regressions_command', 'trend_command' ])
+
+if __name__ == '__main__':
+    unittest.main()